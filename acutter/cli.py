@@ -1,25 +1,57 @@
+import glob
+import importlib
 import json
 import os
 import pprint
 import shutil
 import subprocess
-import tempfile
+import sys
+import time
 from collections import OrderedDict
-from functools import wraps
+from contextlib import contextmanager
+from functools import lru_cache, wraps
 
 import click
-import pkg_resources
-import slugify
-import toml
-from cookiecutter.main import cookiecutter
-from toml import TomlArraySeparatorEncoder, TomlEncoder
+
+from acutter import trace
+
+# heavy dependencies (cookiecutter, jinja, toml, pkg_resources...) are imported
+# only inside the commands that need them; `acutter --help` should stay fast.
+# These names are still reachable as attributes of this module
+LAZY_ATTRIBUTES = {
+    "merge_old_new": "acutter.merge",
+    "CustomEncoder": "acutter.merge",
+    "dumps": "acutter.merge",
+}
 
 TEMPLATEDIR = os.path.join(
     os.path.abspath(os.path.dirname(__file__) + "/.."), "templates"
 )
+# same as acutter.bundle.EXTENSION (without importing jinja)
+BUNDLE_EXTENSION = ".acutter"
+# sphinx environment (kept between builds of the docs)
+DOCTREES = os.path.join(".docs", ".doctrees")
+
+
+def __getattr__(name):
+    if name in LAZY_ATTRIBUTES:
+        module = importlib.import_module(LAZY_ATTRIBUTES[name])
+        return getattr(module, name)
+    raise AttributeError("module {} has no attribute {}".format(__name__, name))
 
 
 def get_templatedir(template):
+    """Location of the template: path of its directory, or an opened bundle
+    (see pack-template) when one is given explicitly - either its path or the
+    name of the template with the extension, e.g. python_package.acutter.
+    The bundle is opened once; pass it on (build_context, Renderer...)"""
+    if template.endswith(BUNDLE_EXTENSION):
+        path = template
+        if not os.path.isfile(path):
+            path = os.path.join(TEMPLATEDIR, template)
+        if not os.path.isfile(path):
+            raise Exception("Template bundle {} not found".format(template))
+        return bundle_or_source(os.path.abspath(path))
     templatedir = os.path.join(TEMPLATEDIR, template)
     if not os.path.exists(templatedir):
         raise Exception(
@@ -30,6 +62,23 @@ def get_templatedir(template):
     return templatedir
 
 
+def bundle_or_source(path):
+    """The opened bundle; its template directory instead when the top level
+    of the directory changed since the bundle was packed"""
+    from acutter import bundle
+
+    source = bundle.Bundle(path)
+    templatedir = source.stale_source()
+    if templatedir:
+        print(
+            "Template bundle {} is older than {}, using the directory "
+            "(re-run pack-template)".format(path, templatedir)
+        )
+        return templatedir
+    print("Using template bundle: {}".format(path))
+    return source
+
+
 def inprojhome(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
@@ -43,45 +92,171 @@ def inprojhome(f):
 
 
 @click.group()
-def cli():
-    pass
+@click.option(
+    "--trace",
+    "trace_file",
+    type=click.Path(dir_okay=False),
+    help="Record a timeline of the command (Chrome trace-event JSON) into this file",
+)
+@click.option(
+    "--timings",
+    default=False,
+    is_flag=True,
+    help="Print how long the phases and subprocesses of the command took",
+)
+@click.pass_context
+def cli(ctx, trace_file, timings):
+    if trace_file or timings:
+        recorder = trace.enable()
+        name = "acutter {}".format(ctx.invoked_subcommand)
+        ctx.call_on_close(lambda: trace.finish(recorder, name, trace_file))
 
 
-@inprojhome
 @cli.command()
-def docs():
-    """Re-Generate documentation"""
-    subprocess.check_call(["sphinx-build", "docs", ".docs"])
+@click.option(
+    "--jobs",
+    "-j",
+    default="auto",
+    help="Number of parallel processes (default: one per core)",
+)
+@click.option(
+    "--watch",
+    default=False,
+    is_flag=True,
+    help="Keep watching the sources and rebuild pages that changed",
+)
+@click.option(
+    "--fresh",
+    default=False,
+    is_flag=True,
+    help="Rebuild everything (discard the cached doctrees)",
+)
+@inprojhome
+def docs(jobs, watch, fresh):
+    """Re-Generate documentation
+
+    Doctrees are kept inside .docs/.doctrees, so only pages whose sources
+    changed since the last build are rebuilt.
+    """
+    build_docs(".", jobs=jobs, fresh=fresh)
+    if not watch:
+        return
+
+    from acutter import watch as watcher
+
+    print("Watching for changes (Ctrl+C to stop)")
+    try:
+        for changed in watcher.watch(docs_watch_paths(".")):
+            print("Changed: {}".format(", ".join(sorted(changed)[:5])))
+            try:
+                build_docs(".", jobs=jobs)
+            except subprocess.CalledProcessError as e:
+                print("Build failed: {}".format(e))
+    except KeyboardInterrupt:
+        pass
+
+
+def docs_watch_paths(cwd):
+    """Directories the docs are built from: docs/ and the package (for the
+    autodoc pages), when pyproject.toml tells which one it is"""
+    import toml
+
+    paths = [os.path.join(cwd, "docs")]
+    try:
+        tomldata = toml.load(os.path.join(cwd, "pyproject.toml"))
+        package = extract_project_context(tomldata, {}).get("package_name")
+        if not package:
+            package = tomldata["project"]["name"].replace("-", "_")
+    except (OSError, ValueError, LookupError, AttributeError, TypeError):
+        return paths
+    if package and os.path.isdir(os.path.join(cwd, package)):
+        paths.append(os.path.join(cwd, package))
+    return paths
+
+
+def build_docs(cwd, jobs="auto", fresh=False):
+    """Runs sphinx-build docs -> .docs (incrementally, unless `fresh`)"""
+    args = ["sphinx-build", "-j", str(jobs), "-d", DOCTREES, "docs", ".docs"]
+    if fresh:
+        args.insert(1, "-E")
+    start = time.time()
+    run_cmd(args, cwd=cwd)
+    print("Docs built in {:.2f}s".format(time.time() - start))
+
+
+# answers of the questions for new projects (unless given otherwise)
+CREATE_CONTEXT = {
+    "initial_commit": "y",
+    "setup_github": "n",
+    "setup_pre_commit": "y",
+    "private_or_public": "public",
+    "run_virtualenv_install": "y",
+}
+
+
+# answers used by `acutter dev` for the sample project (no side effects)
+DEV_CONTEXT = {
+    "project_name": "sample-project",
+    "initial_commit": "n",
+    "setup_github": "n",
+    "setup_pre_commit": "n",
+    "run_virtualenv_install": "n",
+}
 
 
 @cli.command()
-@click.argument("folder", type=click.Path())
+@click.argument("folder", type=click.Path(), required=False)
 @click.option("--force", default=False, help="force creation even if the folder exists")
 @click.option("--template", default="python_package", help="Project template to use")
-def create(folder, force, template):
+@click.option(
+    "--from",
+    "manifest",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Create all projects listed in this JSON/CSV file (non-interactive)",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    default=4,
+    type=int,
+    help="Number of post-gen hooks run in parallel (with --from)",
+)
+def create(folder, force, template, manifest, jobs):
     """
     Create a new project inside a new folder (project name will be the basedir)
+
+    With --from, many projects are created at once; every row of the file
+    gives the folder (or the project_name) and answers of the questions.
     """
 
+    if manifest:
+        if folder:
+            raise Exception("Give either the folder or --from, not both")
+        results = create_projects(
+            load_create_manifest(manifest), template, force=force, jobs=jobs
+        )
+        failed = print_update_summary(results, done="Created")
+        if failed:
+            raise Exception("{} out of {} projects failed".format(failed, len(results)))
+        return
+    if not folder:
+        raise Exception("Please tell me the folder of the new project (or use --from)")
+
     if os.path.exists(folder):
         if not force:
             raise Exception("The {} already exists".format(folder))
 
+    from acutter import render
+
     outdir = os.path.dirname(os.path.abspath(folder))
-    context = {
-        "initial_commit": "y",
-        "setup_github": "n",
-        "setup_pre_commit": "y",
-        "private_or_public": "public",
-        "run_virtualenv_install": "y",
-        "project_name": os.path.basename(folder),
-    }
-    cookiecutter(
-        get_templatedir(template),
-        no_input=False,
-        extra_context=context,
-        overwrite_if_exists=force,
-        output_dir=outdir,
+    context = dict(CREATE_CONTEXT, project_name=os.path.basename(folder))
+    templatedir = get_templatedir(template)
+    # the render is the base of the first (three-way) update
+    render.render_project(
+        templatedir,
+        render.build_context(templatedir, extra_context=context, no_input=False),
+        outdir,
+        keep_base=True,
     )
 
 
@@ -102,42 +277,43 @@ def provision(folder, template):
         )
 
     print(
-        "First, we'll generate new cookiecutter - please answer these questions"
+        "First, we'll render new pyproject.toml - please answer these questions"
         "(do not worry, original repository will be unchanged"
     )
-    # first run cookiecutter
+    from acutter import render
+
+    # render only the pyproject.toml (in memory)
     templatedir = get_templatedir(template)
-    tmpdir = tempfile.mkdtemp()
     context = {
         "initial_commit": "n",
         "setup_github": "n",
         "setup_pre_commit": "n",
         "private_or_public": "private",
         "run_virtualenv_install": "n",
-        "project_name": os.path.basename(folder),
+        "project_name": os.path.basename(os.path.abspath(folder)),
     }
-    result = cookiecutter(
+    result = render.render_files(
         templatedir,
-        no_input=False,
-        extra_context=context,
-        overwrite_if_exists=True,
-        output_dir=tmpdir,
+        render.build_context(templatedir, extra_context=context, no_input=False),
+        ["pyproject.toml"],
     )
 
-    # now grab the generated pyproject.toml and copy it
-    newtoml = os.path.join(result, "pyproject.toml")
-
-    if os.path.exists(newtoml):
-        shutil.copyfile(newtoml, inputfile)
+    if "pyproject.toml" in result:
+        with open(inputfile, "wb") as fo:
+            fo.write(result["pyproject.toml"])
         print("New config written into: {}".format(inputfile))
     else:
         print("Process interrupted; no configuration generated")
-        print(result)
 
 
 @cli.command()
 @click.argument("folder", type=click.Path(exists=True))
-@click.option("--dry-run", default=False)
+@click.option(
+    "--dry-run",
+    default=False,
+    is_flag=True,
+    help="Show the diff of what would be updated; nothing is written",
+)
 @click.option("--template", default="python_package", help="Project template to use")
 @click.option(
     "--force",
@@ -145,76 +321,472 @@ def provision(folder, template):
     is_flag=True,
     help="Force update based on a different template",
 )
-def update(folder, dry_run, template, force):
+@click.option(
+    "--full",
+    default=False,
+    is_flag=True,
+    help="Re-render all files, not only those changed since the previous update",
+)
+@click.option(
+    "--overwrite",
+    default=False,
+    is_flag=True,
+    help="Overwrite local changes instead of merging the changes of the template",
+)
+def update(folder, dry_run, template, force, full, overwrite):
     """Update repository which contains pyproject.toml
 
     When given path pointing to a repository (that was previously) created
     using our cookie cutter template, it will read info off that repo and
     regenerate the project; effectively updating the files.
 
-    CAREFUL: you must manually review the changes and revert those that
-    should not be accepted: i.e. use `git checkout -- <path>` to get them back
+    Only the changes of the template (since the last update) are applied;
+    local changes of the files are kept. Where both changed the same lines,
+    the file contains conflict markers - review them (and the changes in
+    general) before committing.
 
     """
+    update_project(
+        folder,
+        template=template,
+        force=force,
+        dry_run=dry_run,
+        full=full,
+        three_way=not overwrite,
+    )
 
-    inputfile = check_pyproject(folder)
 
-    # find out on what template this project has been based
-    tomldata = toml.load(inputfile)
-    try:
-        ptemplate = tomldata["tool"]["acutter"]["template"]
-    except KeyError:
-        ptemplate = template
+@cli.command("update-all")
+@click.argument("folders", nargs=-1, type=click.Path())
+@click.option(
+    "--manifest",
+    type=click.Path(exists=True),
+    help="File listing project folders (or glob patterns), one per line",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    default=os.cpu_count() or 1,
+    type=int,
+    help="Number of projects updated in parallel",
+)
+@click.option("--template", default="python_package", help="Project template to use")
+@click.option(
+    "--force",
+    default=False,
+    is_flag=True,
+    help="Force update based on a different template",
+)
+def update_all(folders, manifest, jobs, template, force):
+    """Update many repositories (which contain pyproject.toml) in parallel
 
-    if ptemplate == "":
+    Folders can be given as arguments, glob patterns or inside a manifest
+    file. Every project is updated the same way as with the `update` command;
+    a failure in one project doesn't stop the others.
+    """
+
+    projects = collect_folders(folders, manifest)
+    if not projects:
+        raise Exception("No project folders were given (or matched)")
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    results = []
+    if jobs <= 1:
+        _init_update_worker(template)
+        for folder in projects:
+            results.append(_update_worker(folder, template, force))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_init_update_worker,
+            initargs=(template,),
+        ) as executor:
+            futures = [
+                executor.submit(_update_worker, folder, template, force)
+                for folder in projects
+            ]
+            for future in as_completed(futures):
+                results.append(future.result())
+
+    failed = print_update_summary(results)
+    if failed:
         raise Exception(
-            "Please tell me what template to base this project on. tool.acutter doesn't contain that info"
+            "{} out of {} projects failed to update".format(failed, len(results))
         )
 
-    if ptemplate != template:
-        if force:
-            ptemplate = template
-        else:
+
+@cli.command("pack-template")
+@click.argument("template", default="python_package")
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False),
+    help="Where to write the bundle (default: next to the template directory)",
+)
+@click.option(
+    "--check",
+    default=False,
+    is_flag=True,
+    help="Don't pack, list the files that changed since the bundle was packed",
+)
+def pack_template(template, output, check):
+    """Pack the template into a single file (bundle)
+
+    Use the bundle with --template <path of the bundle>, or
+    --template <name>.acutter when it sits next to the template directory.
+    """
+    from acutter import bundle
+
+    templatedir = os.path.join(TEMPLATEDIR, template)
+    if not os.path.isdir(templatedir):
+        raise Exception(
+            "Cookiecutter template={} not found inside templatedir={}".format(
+                template, TEMPLATEDIR
+            )
+        )
+    output = output or templatedir + bundle.EXTENSION
+    if check:
+        if not os.path.isfile(output):
+            raise Exception("Template bundle {} not found".format(output))
+        changed = bundle.changed_files(bundle.Bundle(output))
+        for relpath in changed:
+            print("    {}".format(relpath))
+        if changed:
             raise Exception(
-                "The project template differs from your argument; use --force to override. project={}, passed={}".format(
-                    ptemplate, template
+                "{} file(s) changed since {} was packed; re-run pack-template".format(
+                    len(changed), output
                 )
             )
+        print("Template bundle {} is up to date".format(output))
+        return
+    count = bundle.pack(templatedir, output)
+    print("Packed {} file(s) into: {}".format(count, output))
 
-    templatedir = get_templatedir(ptemplate)
-    context = get_project_context(inputfile, templatedir)
-    output_dir = os.path.abspath(os.path.join(folder, ".."))
 
-    basename = os.path.basename(os.path.abspath(folder))
-    if context["project_name"] != basename:
-        print(
-            "project_name differs from the location on disk; will use location: {} -> {}".format(
-                context["project_name"], basename
+@cli.command("lint-template")
+@click.argument("template", default="python_package")
+@click.option(
+    "--jobs",
+    "-j",
+    default=None,
+    type=int,
+    help="Number of files scanned in parallel",
+)
+def lint_template(template, jobs):
+    """Bake the template and check the output for unreplaced variables"""
+    from acutter import lint
+
+    problems = lint.lint_template(get_templatedir(template), jobs=jobs)
+    for path, lineno, line in problems:
+        print("{}:{}: {}".format(path, lineno, line))
+    if problems:
+        raise Exception(
+            "{} unreplaced variable(s) in {} file(s)".format(
+                len(problems), len(set(x[0] for x in problems))
             )
         )
-        context["project_name"] = basename
+    print("No unreplaced variables found")
 
-    if not dry_run:
-        oldtoml = toml.load(inputfile, _dict=OrderedDict)
-        cookiecutter(
-            templatedir,
-            no_input=True,
-            extra_context=context,
-            overwrite_if_exists=True,
-            output_dir=output_dir,
+
+@cli.command("bake-matrix")
+@click.argument("template", default="python_package")
+@click.option(
+    "--sample",
+    type=int,
+    help="Bake only a random sample of this many combinations",
+)
+@click.option("--seed", default=0, type=int, help="Seed of the random sample")
+@click.option(
+    "--jobs",
+    "-j",
+    default=os.cpu_count() or 1,
+    type=int,
+    help="Number of combinations baked in parallel",
+)
+def bake_matrix(template, sample, seed, jobs):
+    """Bake the template with every combination of its choices
+
+    Every combination is rendered in memory (hooks are rendered and
+    compiled, but not run) and checked for unreplaced variables.
+    """
+    from acutter import matrix
+
+    templatedir = get_templatedir(template)
+    variables = matrix.choice_variables(templatedir)
+    combos = matrix.combinations(variables, sample=sample, seed=seed)
+    print(
+        "Baking {} combination(s) of: {}".format(
+            len(combos), ", ".join(sorted(variables))
         )
-        merge_old_new(oldtoml, inputfile)
-    else:
-        print("Would have called cookiecutter with:")
-        pprint.pprint(
-            dict(
-                templatedir=templatedir,
-                no_input=True,
-                extra_context=context,
-                overwrite_if_exists=True,
-                output_dir=output_dir,
+    )
+    start = time.time()
+    results = matrix.bake_matrix(templatedir, combos, jobs=jobs)
+
+    failed = 0
+    print("-" * 80)
+    for combination, error, duration, count in results:
+        answers = " ".join("{}={}".format(k, v) for k, v in sorted(combination.items()))
+        if error:
+            failed += 1
+            print("FAILED {} ({:.2f}s): {}".format(answers, duration, error))
+        else:
+            print("OK     {} ({:.2f}s, {} files)".format(answers, duration, count))
+    print("-" * 80)
+    print(
+        "Baked: {}, failed: {} in {:.2f}s".format(
+            len(results) - failed, failed, time.time() - start
+        )
+    )
+    if failed:
+        raise Exception("{} out of {} combinations failed".format(failed, len(results)))
+
+
+@cli.command()
+@click.argument("template")
+@click.argument("output", type=click.Path(file_okay=False))
+@click.option(
+    "--interval",
+    default=0.5,
+    type=float,
+    help="How often (seconds) the template is checked for changes",
+)
+def dev(template, output, interval):
+    """Keep a sample project (inside OUTPUT) rendered from the TEMPLATE
+
+    TEMPLATE is the name of a template, or the path of its directory. On
+    every change only the affected files are rendered; the post-gen hook
+    runs again only when the hook or cookiecutter.json changes.
+    """
+    from acutter import dev as devmode
+    from acutter import watch
+
+    if template.endswith(BUNDLE_EXTENSION):
+        raise Exception(
+            "Template {} is a bundle, develop its directory instead".format(template)
+        )
+    templatedir = template if os.path.isdir(template) else get_templatedir(template)
+    templatedir = os.path.abspath(templatedir)
+    output = os.path.abspath(output)
+
+    state = watch.snapshot([templatedir], hidden=True)
+    start = time.time()
+    renderer, project_dir, written = devmode.render_all(
+        templatedir, output, DEV_CONTEXT
+    )
+    print(
+        "Rendered {} ({} file(s) written) in {:.2f}s".format(
+            project_dir, len(written), time.time() - start
+        )
+    )
+    print("Watching {} for changes (Ctrl+C to stop)".format(templatedir))
+    try:
+        for changed in watch.watch([templatedir], interval, state, hidden=True):
+            start = time.time()
+            try:
+                renderer, result = devmode.apply_changes(
+                    renderer, output, DEV_CONTEXT, changed
+                )
+            except Exception as e:
+                print("Failed: {}: {}".format(e.__class__.__name__, e))
+                continue
+            for path in result["written"]:
+                print("    written: {}".format(os.path.relpath(path, output)))
+            for path in result["removed"]:
+                print("    removed: {}".format(os.path.relpath(path, output)))
+            print(
+                "Updated in {:.2f}s{}".format(
+                    time.time() - start,
+                    " (post-gen hook ran)" if result["hook"] else "",
+                )
             )
+    except KeyboardInterrupt:
+        pass
+
+
+@cli.command("index")
+@click.argument("root", type=click.Path(exists=True, file_okay=False))
+@click.option(
+    "--db",
+    type=click.Path(dir_okay=False),
+    help="Location of the index (default: inside acutter's cache)",
+)
+@click.option(
+    "--no-scan",
+    default=False,
+    is_flag=True,
+    help="Only query the index, don't look for changes",
+)
+@click.option("--template", help="List projects based on this template")
+@click.option(
+    "--template-version",
+    help="List projects rendered from this template version (or its prefix)",
+)
+@click.option(
+    "--depends",
+    help="List projects that depend on this package (e.g. click or click==8.0.3)",
+)
+@click.option(
+    "--versions",
+    default=False,
+    is_flag=True,
+    help="Show how many projects are on each version of a template",
+)
+def index_projects(root, db, no_scan, template, template_version, depends, versions):
+    """Index projects below ROOT (incrementally) and query the index"""
+    from acutter import index
+
+    conn = index.connect(db)
+    try:
+        if not no_scan:
+            start = time.time()
+            stats = index.scan(conn, root)
+            print(
+                "Indexed {} in {:.2f}s".format(
+                    ", ".join("{}: {}".format(k, v) for k, v in stats.items()),
+                    time.time() - start,
+                )
+            )
+        if versions:
+            for name, version, count in index.template_versions(conn, root):
+                print("{:<20} {:<14} {:>6}".format(name, (version or "-")[:12], count))
+        if template or template_version or depends:
+            rows = index.query(
+                conn,
+                root=root,
+                template=template,
+                template_version=template_version,
+                depends=depends,
+            )
+            for row, requirement in rows:
+                print(
+                    "{}  {} {}  {}@{}{}".format(
+                        row["path"],
+                        row["name"],
+                        row["version"],
+                        row["template"] or "-",
+                        (row["template_version"] or "-")[:12],
+                        "  " + requirement if requirement else "",
+                    )
+                )
+            print("{} project(s)".format(len(rows)))
+    finally:
+        conn.close()
+
+
+@cli.command()
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False),
+    help="Unix socket to listen on (default: serve.sock inside acutter's cache)",
+)
+@click.option(
+    "--tcp",
+    default=False,
+    is_flag=True,
+    help="Listen on --host:--port instead (no authentication!)",
+)
+@click.option("--host", default="127.0.0.1", help="Address to listen on (--tcp)")
+@click.option("--port", default=8642, type=int, help="Port to listen on (--tcp)")
+@click.option(
+    "--jobs",
+    "-j",
+    default=os.cpu_count() or 1,
+    type=int,
+    help="Number of jobs run in parallel",
+)
+@click.option(
+    "--template",
+    "templates",
+    multiple=True,
+    default=["python_package"],
+    help="Template(s) to load at start",
+)
+def serve(socket_path, tcp, host, port, jobs, templates):
+    """Keep templates loaded and render/update projects on request
+
+    Jobs are posted as JSON to /render or /update (see acutter.server);
+    only the templates loaded at start are served
+    """
+    from acutter import server
+    from acutter.utils import get_cache_dir
+
+    if tcp:
+        if socket_path:
+            raise Exception("Use either --socket or --tcp")
+    elif not socket_path:
+        socket_path = get_cache_dir("serve.sock")
+        os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+
+    service = server.Service(jobs=jobs)
+    for template in templates:
+        service.renderers.preload(template)
+    httpd = server.make_server(service, host, port, socket_path)
+    print(
+        "Listening on {}".format(
+            socket_path or "http://{}:{}".format(*httpd.server_address[:2])
+        )
+    )
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        service.shutdown()
+
+
+@cli.group()
+def cache():
+    """Manage acutter's cache (compiled templates, virtualenvs)"""
+    pass
+
+
+@cache.command("info")
+def cache_info():
+    """Show location and size of the cache"""
+    from acutter import threeway, venvcache
+    from acutter.utils import get_cache_dir
+
+    directory = get_cache_dir("bytecode")
+    entries = os.listdir(directory) if os.path.exists(directory) else []
+    size = sum(os.path.getsize(os.path.join(directory, x)) for x in entries)
+    print("Compiled templates: {}".format(directory))
+    print("Entries: {}, size: {} bytes".format(len(entries), size))
+    print("Virtualenvs: {}".format(venvcache.snapshot_dir()))
+    print("Entries: {}".format(len(venvcache.list_snapshots())))
+    count, size, old = threeway.stats()
+    print("Rendered files (bases of updates): {}".format(get_cache_dir("renders")))
+    print(
+        "Entries: {}, size: {} bytes, unused for {} days (pruned by cache clear): {}".format(
+            count, size, threeway.RENDERS_MAX_AGE // (24 * 3600), old
         )
+    )
+
+
+@cache.command("clear")
+@click.option(
+    "--venvs", default=False, is_flag=True, help="Remove also cached virtualenvs"
+)
+@click.option(
+    "--renders",
+    default=False,
+    is_flag=True,
+    help="Remove all stored renders, not only the unused ones (locally changed "
+    "files won't get template changes on their next update)",
+)
+def cache_clear(venvs, renders):
+    """Remove all compiled templates and unused renders (and virtualenvs)"""
+    from acutter import render, threeway, venvcache
+
+    removed = render.clear_bytecode_cache()
+    print("Removed {} compiled template(s)".format(removed))
+    if venvs:
+        print("Removed {} virtualenv(s)".format(venvcache.clear()))
+    if renders:
+        print("Removed {} rendered file(s)".format(threeway.clear()))
+    else:
+        print("Removed {} unused rendered file(s)".format(threeway.prune()))
 
 
 @cli.command()
@@ -225,7 +797,19 @@ def update(folder, dry_run, template, force):
     is_flag=True,
     help="Will continue even if .env is detected",
 )
-def setup_virtualenv(folder, force):
+@click.option(
+    "--sequential",
+    default=False,
+    is_flag=True,
+    help="Install .[dev], .[docs] and the project one after another (slow)",
+)
+@click.option(
+    "--no-cache",
+    default=False,
+    is_flag=True,
+    help="Build the virtualenv from scratch (don't clone it from the cache)",
+)
+def setup_virtualenv(folder, force, sequential, no_cache):
     """
     Helper function you can call to setup python virtualenv for the project
     It will do the following:
@@ -239,15 +823,21 @@ def setup_virtualenv(folder, force):
     venv = os.path.join(os.path.abspath(folder), ".venv")
     if os.path.exists(venv) and not force:
         raise Exception("{} already exists, use --force to continue".format(venv))
-    install_virtualenv(folder)
+    install_virtualenv(folder, sequential=sequential, cache=not no_cache)
     setup_pre_commit(folder)
 
 
 # -------------------------------------------------------------------------
 
 
-def run_cmd(args, **kwargs):
-    return subprocess.run(args, check=True, **kwargs)
+def run_cmd(args, cwd=None, capture_output=False, timeout=None, prefix=None):
+    """Runs the command (output is streamed, see acutter.runner); raises
+    CalledProcessError or TimeoutExpired"""
+    from acutter import runner
+
+    return runner.run(
+        args, cwd=cwd, prefix=prefix, timeout=timeout, capture_output=capture_output
+    )
 
 
 def run_pip(args, cwd=None):
@@ -257,23 +847,69 @@ def run_pip(args, cwd=None):
 
 
 def check_command_exists(cmd, cwd=None):
-    try:
-        run_cmd([cmd, "-h"], capture_output=True, cwd=cwd)
-    except (subprocess.CalledProcessError, FileNotFoundError):
+    from acutter import runner
+
+    if not runner.command_exists(cmd, cwd=cwd):
         print(f"{cmd} command is not installed")
         return False
     return True
 
 
-def install_virtualenv(cwd):
+@contextmanager
+def timed(step, timings):
+    start = time.time()
+    try:
+        with trace.span(step, "setup"):
+            yield
+    finally:
+        timings.append((step, time.time() - start))
+
+
+def print_timings(timings):
+    print("Timings:")
+    for step, duration in timings:
+        print("    {:<50} {:>8.2f}s".format(step, duration))
+
+
+def install_virtualenv(cwd, sequential=False, cache=True):
+    """Creates <cwd>/.venv and installs the project (editable) together
+    with its dev and docs dependencies in one pip run; meanwhile pre-commit
+    hook environments are being built (if pre-commit is available)
+
+    With `cache`, the dependencies come from a snapshot of a previously
+    built virtualenv (see acutter.venvcache)"""
     if not check_command_exists("virtualenv"):
         return
 
-    run_cmd(["virtualenv", ".venv"], cwd=cwd)
-    run_pip(["install", ".[dev]"], cwd=cwd)
-    run_pip(["install", ".[docs]"], cwd=cwd)
-    run_pip(["install", "-e", "."], cwd=cwd)  # should be last to get proper scripts
+    from acutter import venvcache
+
+    timings = []
+    if sequential:
+        with timed("virtualenv .venv", timings):
+            run_cmd(["virtualenv", ".venv"], cwd=cwd)
+        for args in (
+            ["install", ".[dev]"],
+            ["install", ".[docs]"],
+            ["install", "-e", "."],  # should be last to get proper scripts
+        ):
+            with timed("pip " + " ".join(args), timings):
+                run_pip(args, cwd=cwd)
+    else:
+        from concurrent.futures import ThreadPoolExecutor
 
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            hooks = executor.submit(install_pre_commit_hooks, cwd, timings)
+            if cache and venvcache.enabled():
+                install_cached_virtualenv(cwd, timings)
+            else:
+                with timed("virtualenv .venv", timings):
+                    run_cmd(["virtualenv", ".venv"], cwd=cwd)
+                target = venvcache.editable_target()
+                with timed("pip install -e {}".format(target), timings):
+                    run_pip(["install", "-e", target], cwd=cwd)
+            hooks.result()
+
+    print_timings(timings)
     print(
         """Virtualenv created inside {folder}/.venv
 
@@ -281,25 +917,427 @@ def install_virtualenv(cwd):
 
     cd {folder}
     source .venv/bin/activate
-    pip install .
-    pip install -e .[dev]
-    pip install .[docs]
+    pip install -e .[dev,docs]
     """.format(
             folder=os.path.abspath(cwd)
         )
     )
 
 
+def install_cached_virtualenv(cwd, timings):
+    """Clones the virtualenv with the same set of dependencies from the
+    cache; or builds it (and stores it in the cache)"""
+    from acutter import venvcache
+
+    deps = venvcache.dependency_set(cwd)
+    key = venvcache.environment_key(deps)
+    venv = os.path.join(os.path.abspath(cwd), ".venv")
+
+    snapshot = venvcache.lookup(key)
+    if snapshot:
+        if os.path.exists(venv):
+            shutil.rmtree(venv)
+        with timed("clone cached virtualenv {}".format(key[:12]), timings):
+            venvcache.clone(snapshot, venv)
+    else:
+        with timed("virtualenv .venv", timings):
+            run_cmd(["virtualenv", ".venv"], cwd=cwd)
+        if deps:
+            with timed("pip install {} dependencies".format(len(deps)), timings):
+                run_pip(["install"] + deps, cwd=cwd)
+        with timed("store virtualenv {} in cache".format(key[:12]), timings):
+            venvcache.publish(venv, key, deps)
+
+    with timed("pip install -e . --no-deps", timings):
+        run_pip(["install", "-e", ".", "--no-deps"], cwd=cwd)
+
+
+def install_pre_commit_hooks(cwd, timings=None):
+    """Builds environments of the pre-commit hooks (so that the first commit
+    doesn't have to); they are shared by all projects with the same hooks
+    config. Needs pre-commit outside of the project virtualenv"""
+    from acutter import precommit
+
+    config = os.path.join(cwd, ".pre-commit-config.yaml")
+    with timed("pre-commit hook environments", timings if timings is not None else []):
+        try:
+            precommit.prewarm(config)
+        except (subprocess.SubprocessError, OSError) as e:
+            print("Failed to install pre-commit hook environments: {}".format(e))
+
+
 def setup_pre_commit(cwd):
-    if check_command_exists(".venv/bin/pre-commit", cwd=cwd):
-        # Run pre-commit install
-        run_cmd([".venv/bin/pre-commit", "install"])
-        run_cmd([".venv/bin/pre-commit", "install", "--hook-type", "commit-msg"])
+    from acutter import runner
+
+    for cmd in (".venv/bin/pre-commit", "pre-commit"):
+        if runner.command_exists(cmd, cwd=cwd):
+            break
+    else:
+        print("pre-commit command is not installed")
+        return
+
+    # both hooks are installed at once
+    results = runner.run_many(
+        [
+            ("pre-commit", [cmd, "install"], cwd),
+            ("commit-msg", [cmd, "install", "--hook-type", "commit-msg"], cwd),
+        ]
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+
+
+def update_project(
+    folder,
+    template="python_package",
+    force=False,
+    dry_run=False,
+    verbose=True,
+    full=False,
+    three_way=True,
+    renderer=None,
+):
+    """Regenerate the project inside `folder` from its template; returns
+    the path of the updated project
+
+    Only files whose template source (or the context) changed since the
+    last update are rendered, unless `full` is set. Changes of the template
+    are merged with local changes (unless `three_way` is off; then the files
+    are overwritten). A `renderer` of the template may be shared by updates
+    """
+
+    import toml
+
+    from acutter import render
+    from acutter.merge import merge_old_new
+
+    inputfile = check_pyproject(folder)
+
+    # find out on what template this project has been based
+    tomldata = toml.load(inputfile)
+    try:
+        ptemplate = tomldata["tool"]["acutter"]["template"]
+    except KeyError:
+        ptemplate = template
+
+    if ptemplate == "":
+        raise Exception(
+            "Please tell me what template to base this project on. tool.acutter doesn't contain that info"
+        )
+
+    if ptemplate != template:
+        if force:
+            ptemplate = template
+        else:
+            raise Exception(
+                "The project template differs from your argument; use --force to override. project={}, passed={}".format(
+                    ptemplate, template
+                )
+            )
+
+    # a shared renderer has the template opened already
+    templatedir = renderer.source if renderer else get_templatedir(ptemplate)
+    context = get_project_context(inputfile, templatedir, verbose=verbose)
+    output_dir = os.path.abspath(os.path.join(folder, ".."))
+
+    basename = os.path.basename(os.path.abspath(folder))
+    if context["project_name"] != basename:
+        print(
+            "project_name differs from the location on disk; will use location: {} -> {}".format(
+                context["project_name"], basename
+            )
+        )
+        context["project_name"] = basename
+
+    oldtoml = toml.load(inputfile, _dict=OrderedDict)
+    manifest = render.load_manifest(folder)
+    if not dry_run:
+        project_dir, manifest, written, stats = render.render_project(
+            templatedir,
+            render.build_context(templatedir, extra_context=context),
+            output_dir,
+            manifest=manifest,
+            three_way=three_way,
+            renderer=renderer,
+            full=full,
+        )
+        with trace.span("merge pyproject.toml", "merge"):
+            merge_old_new(oldtoml, inputfile)
+        if verbose:
+            print(
+                "{} file(s) updated out of {} (compiled templates cache: {} hits, {} misses)".format(
+                    len(written),
+                    len(manifest["files"]),
+                    stats["hits"],
+                    stats["misses"],
+                )
+            )
+            for path in written:
+                print("    {}".format(os.path.relpath(path, project_dir)))
+        if stats.get("conflicts"):
+            print(
+                "Local changes conflict with the template in {} file(s); resolve the conflict markers:".format(
+                    len(stats["conflicts"])
+                )
+            )
+            for path in stats["conflicts"]:
+                print("    {}".format(os.path.relpath(path, project_dir)))
+        if stats.get("unmerged"):
+            print(
+                "Template changes were not applied to {} locally changed file(s); the render they were updated from isn't in the cache:".format(
+                    len(stats["unmerged"])
+                )
+            )
+            for path in stats["unmerged"]:
+                print("    {}".format(os.path.relpath(path, project_dir)))
+        return project_dir
+    else:
+        changed = dry_run_project(
+            folder,
+            templatedir,
+            render.build_context(templatedir, extra_context=context),
+            oldtoml,
+            manifest,
+            three_way=three_way,
+            full=full,
+        )
+        print("{} file(s) would be updated".format(changed))
+        return os.path.abspath(folder)
+
+
+def dry_run_project(
+    folder, templatedir, context, oldtoml, manifest=None, three_way=True, full=False
+):
+    """Renders the project in memory (merging pyproject.toml the same way as
+    update does) and prints the diff against the files inside `folder`;
+    nothing is written (not even into the cache). Returns the number of
+    files that would change
+
+    Files with local changes which update would merge with the template
+    are not merged (that needs git and temporary files); they are listed on
+    stderr together with the changes of the template"""
+    from acutter import render, threeway
+    from acutter.merge import merge_text
+    from acutter.utils import unified_diff
+
+    renderer = render.Renderer(templatedir, context, bytecode_cache=False)
+    output_dir = os.path.abspath(os.path.join(folder, ".."))
+    old_files = (manifest or {}).get("files", {})
+    changed = 0
+    for relpath, entry, content in render.iter_rendered(
+        renderer, output_dir, None if full else manifest
+    ):
+        if content is None:
+            continue
+        name = entry["path"].split(os.sep, 1)[1].replace(os.sep, "/")
+        target = os.path.join(folder, name)
+        old = None
+        if os.path.exists(target):
+            with open(target, "rb") as fi:
+                old = fi.read()
+
+        if three_way:
+            new, status = threeway.apply(
+                name, old, old_files.get(relpath), entry, content, dry_run=True
+            )
+            if status == "merge":
+                changed += 1
+                base = threeway.load(old_files[relpath]["output"], touch=False)
+                print(
+                    "{}: has local changes, update would merge these changes "
+                    "of the template into it:".format(name),
+                    file=sys.stderr,
+                )
+                sys.stderr.writelines(unified_diff(name, base, content))
+                sys.stderr.flush()
+                continue
+            if status == "unmerged":
+                print(
+                    "{}: has local changes, the render it was updated from "
+                    "isn't in the cache; update would keep it".format(name),
+                    file=sys.stderr,
+                    flush=True,
+                )
+            if new is None:
+                continue
+            content = new
+        if name == "pyproject.toml":
+            text, _ = merge_text(oldtoml, content.decode("utf-8"))
+            content = text.encode("utf-8")
+        if old == content:
+            continue
+        changed += 1
+        sys.stdout.writelines(unified_diff(name, old, content))
+    return changed
+
+
+def collect_folders(folders, manifest=None):
+    """Expand folder arguments, glob patterns and manifest entries into
+    a de-duplicated list of paths (in the order they were given)"""
+
+    patterns = list(folders)
+    if manifest:
+        with open(manifest, "r") as fi:
+            for line in fi:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    patterns.append(line)
+
+    out = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for folder in matches:
+            key = os.path.abspath(folder)
+            if key not in seen:
+                seen.add(key)
+                out.append(folder)
+    return out
 
-    elif check_command_exists("pre-commit", cwd=cwd):
-        # Run pre-commit install
-        run_cmd(["pre-commit", "install"])
-        run_cmd(["pre-commit", "install", "--hook-type", "commit-msg"])
+
+def load_create_manifest(path):
+    """Rows (dicts) of a JSON (list of objects) or CSV (with a header) file;
+    every row must have the folder or the project_name"""
+    if path.endswith(".csv"):
+        import csv
+
+        with open(path, "r", newline="") as fi:
+            rows = [
+                {k: v for k, v in row.items() if k and v not in (None, "")}
+                for row in csv.DictReader(fi)
+            ]
+    else:
+        with open(path, "r") as fi:
+            rows = json.load(fi)
+        if not isinstance(rows, list):
+            raise Exception("{} must contain a list of objects".format(path))
+    for i, row in enumerate(rows):
+        if not row.get("folder") and not row.get("project_name"):
+            raise Exception(
+                "Row {} of {} has neither folder nor project_name".format(i + 1, path)
+            )
+    return rows
+
+
+def render_new_project(
+    folder, answers, templatedir, force=False, renderer=None, post_hook=True
+):
+    """Renders a new project (non-interactively) into `folder`; answers of
+    the questions are given as a dict. Returns tuple (project_dir, context)"""
+    from acutter import render
+
+    if os.path.exists(folder) and not force:
+        raise Exception("The {} already exists".format(folder))
+    context = dict(CREATE_CONTEXT, project_name=os.path.basename(folder))
+    context.update(answers)
+    context = render.build_context(templatedir, extra_context=context)
+    project_dir, _, _, _ = render.render_project(
+        templatedir,
+        context,
+        os.path.dirname(folder),
+        renderer=renderer,
+        post_hook=post_hook,
+        keep_base=True,
+    )
+    return project_dir, context
+
+
+def create_projects(rows, template="python_package", force=False, jobs=4):
+    """Creates projects (non-interactively) from rows of a manifest; all of
+    them are rendered with one renderer, the post-gen hooks run concurrently.
+    Raises an exception (before creating anything) when a folder is listed
+    more than once
+
+    Returns list of (folder, error or None, duration)
+    """
+    from collections import Counter
+    from concurrent.futures import ThreadPoolExecutor
+
+    from acutter import render
+
+    rows = [dict(row) for row in rows]
+    folders = [
+        os.path.abspath(row.pop("folder", None) or row["project_name"]) for row in rows
+    ]
+    duplicates = sorted(x for x, n in Counter(folders).items() if n > 1)
+    if duplicates:
+        raise Exception("Listed more than once: {}".format(", ".join(duplicates)))
+
+    templatedir = get_templatedir(template)
+    renderer = render.Renderer(templatedir, render.build_context(templatedir))
+    results = {}
+    rendered = []
+    for folder, row in zip(folders, rows):
+        start = time.time()
+        try:
+            project_dir, context = render_new_project(
+                folder, row, templatedir, force, renderer, post_hook=False
+            )
+            rendered.append((folder, project_dir, context, time.time() - start))
+        except Exception as e:
+            error = "{}: {}".format(e.__class__.__name__, e)
+            results[folder] = (folder, error, time.time() - start)
+
+    def post_gen(folder, project_dir, context, duration):
+        start = time.time()
+        try:
+            renderer.run_hook("post_gen_project", project_dir, context)
+        except Exception as e:
+            error = "{}: {}".format(e.__class__.__name__, e)
+            return folder, error, duration + time.time() - start
+        return folder, None, duration + time.time() - start
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        for result in executor.map(lambda x: post_gen(*x), rendered):
+            results[result[0]] = result
+    # in the order of the rows
+    return [results[x] for x in folders]
+
+
+# renderer of the template shared by all updates of a worker (see update-all)
+_worker_renderer = None
+
+
+def _init_update_worker(template):
+    # every worker loads the template (and cookiecutter) and sets up the
+    # renderer (jinja environment, compiled templates) only once
+    global _worker_renderer
+    from acutter import render
+
+    templatedir = get_templatedir(template)
+    load_template_config(templatedir)
+    _worker_renderer = render.Renderer(templatedir, render.build_context(templatedir))
+
+
+def _update_worker(folder, template, force):
+    start = time.time()
+    try:
+        update_project(
+            folder,
+            template=template,
+            force=force,
+            verbose=False,
+            renderer=_worker_renderer,
+        )
+    except Exception as e:
+        return folder, "{}: {}".format(e.__class__.__name__, e), time.time() - start
+    return folder, None, time.time() - start
+
+
+def print_update_summary(results, done="Updated"):
+    """Prints one line per project; returns number of failures"""
+    failed = 0
+    print("-" * 80)
+    for folder, error, duration in sorted(results):
+        if error:
+            failed += 1
+            print("FAILED {} ({:.2f}s): {}".format(folder, duration, error))
+        else:
+            print("OK     {} ({:.2f}s)".format(folder, duration))
+    print("-" * 80)
+    print("{}: {}, failed: {}".format(done, len(results) - failed, failed))
+    return failed
 
 
 def check_pyproject(folder):
@@ -314,83 +1352,49 @@ def check_pyproject(folder):
 # ---------------------------------------------------------------------------------
 
 
-def merge_old_new(oldtoml, inputfile):
-    """
-    Newly generated toml has overwritten things that we want to preserve
-    (such as dependencies); in this function we try to put back the old
-    and keep the new
-    """
+@lru_cache(maxsize=None)
+def load_template_config(templatedir, template="cookiecutter.json"):
+    """Reads (and caches) the cookiecutter json of a template"""
+    from acutter import bundle
 
-    updated = 0
-    newtoml = toml.load(inputfile, _dict=OrderedDict)
-    for getter in (
-        lambda x: x["project"]["dependencies"],
-        lambda x: x["project"]["optional-dependencies"]["dev"],
-        lambda x: x["project"]["optional-dependencies"]["docs"],
-    ):
-        try:
-            old = list(pkg_resources.parse_requirements(getter(oldtoml)))
-            new = list(pkg_resources.parse_requirements(getter(newtoml)))
-
-            newkeys = set([x.name for x in new])
-            oldkeys = set([x.name for x in old])
-
-            # if a package is present in the template but missing from the
-            # 'old' pyproject.toml we assume it was removed by a developer
-            to_keep = []
-            for dep in new:
-                if dep.name in oldkeys:
-                    to_keep.append(str(dep))
-
-            if len(to_keep) != len(new):
-                getter(newtoml).clear()
-                getter(newtoml).extend(to_keep)
-                updated += len(to_keep)
-
-            for dep in old:
-                if dep.name not in newkeys:
-                    getter(newtoml).append(str(dep))
-                    updated += 1
-        except KeyError:
-            pass
-
-    # keep values from the original
-    for getter in (
-        lambda x: x["xsetup"]["entry_points"]["console_scripts"],
-        lambda x: x["xsetup"]["console_scripts"],
-    ):
-        try:
-            old = getter(oldtoml)
-            new = getter(newtoml)
-            if str(old) != str(new):
-                new.clear()
-                new.extend(old)
-        except KeyError:
-            pass
+    return json.loads(bundle.open_source(templatedir).read(template).decode("utf-8"))
 
-    # only if changed, to preserve potential comments otherwise
-    if updated > 0:
-        with open(inputfile, "w") as fo:
-            fo.write(dumps(newtoml, CustomEncoder()))
 
-
-def get_project_context(inputfile, templatedir, template="cookiecutter.json"):
+def get_project_context(
+    inputfile, templatedir, template="cookiecutter.json", verbose=True
+):
+    import toml
 
     # <project>/pyproject.toml
     tomldata = toml.load(inputfile)
 
     # cookiecutter json stuff
-    with open(os.path.join(templatedir, template), "r") as fi:
-        jdata = json.load(fi)
+    jdata = load_template_config(templatedir, template)
 
-    project = tomldata["project"]
-    print("Settings loaded from: {}\n".format(inputfile))
-    pprint.pprint(project)
-    print("-" * 80)
+    if verbose:
+        print("Settings loaded from: {}\n".format(inputfile))
+        pprint.pprint(tomldata["project"])
+        print("-" * 80)
+
+        print("Current cookicutter template defaults:\n")
+        pprint.pprint(jdata)
+        print("-" * 80)
+
+    out = extract_project_context(tomldata, jdata)
+
+    if verbose:
+        print("And this is what we'll use:\n")
+        pprint.pprint(out)
+        print("-" * 80)
+    return out
 
-    print("Current cookicutter template defaults:\n")
-    pprint.pprint(jdata)
-    print("-" * 80)
+
+def extract_project_context(tomldata, defaults):
+    """Template context of an existing project: values from its (parsed)
+    pyproject.toml, the rest from `defaults` (the template config)"""
+    import slugify
+
+    project = tomldata["project"]
 
     # those things should not be changed (in existing repository)
     out = {
@@ -403,10 +1407,10 @@ def get_project_context(inputfile, templatedir, template="cookiecutter.json"):
 
     # take the first entry name
     out["email"] = project.get("authors", [{"email": None}])[0].get(
-        "email", jdata["email"]
+        "email", defaults.get("email")
     )
     out["full_name"] = project.get("authors", [{"name": None}])[0].get(
-        "name", jdata["full_name"]
+        "name", defaults.get("full_name")
     )
     repo = project.get("repository", None)
     if repo:
@@ -423,87 +1427,21 @@ def get_project_context(inputfile, templatedir, template="cookiecutter.json"):
     out["open_source_license"] = project.get(
         "license", {"text": "Not open source"}
     ).get("text")
-    out["version"] = project.get("version", jdata["version"])
+    out["version"] = project.get("version", defaults.get("version"))
     out["project_short_description"] = project.get(
-        "description", jdata["project_short_description"]
+        "description", defaults.get("project_short_description")
     )
-
-    print("And this is what we'll use:\n")
-    pprint.pprint(out)
-    print("-" * 80)
     return out
 
 
-class CustomEncoder(TomlArraySeparatorEncoder):
-    def __init__(self, _dict=OrderedDict, preserve=True, separator=",\n"):
-        super(CustomEncoder, self).__init__(_dict, preserve)
-        if separator.strip() == "":
-            separator = "," + separator
-        elif separator.strip(" \t\n\r,"):
-            raise ValueError("Invalid separator for arrays")
-        self.separator = separator
-
-    def dump_list(self, v):
-        t = []
-        retval = "[\n"
-        for u in v:
-            t.append(self.dump_value(u))
-        while t != []:
-            s = []
-            for u in t:
-                if isinstance(u, list):
-                    for r in u:
-                        s.append(r)
-                else:
-                    retval += "    " + str(u) + self.separator
-            t = s
-        retval += "]\n"
-        return retval
-
-
-def dumps(o, encoder=None, prefix=""):
-    """Modified version of toml.dumps()
-    https://github.com/uiri/toml/blob/59d83d0d51a976f11a74991fa7d220fc630d8bae/toml/encoder.py#L34
-
-    In here we dump the sections in order; the original logic of the toml.dumps()
-    is rather convoluted - instead of recursively build the sections, from bottom up,
-    it collects sections and those that are new, are processed last. Our version
-    may not be the best either - but we'll dump sections on the first encounter
-    """
-
-    retval = ""
-    if encoder is None:
-        encoder = TomlEncoder(o.__class__)
-    addtoretval, sections = encoder.dump_sections(o, "")
-    if prefix and addtoretval:
-        retval += "[{}]\n{}".format(prefix, addtoretval)
-    else:
-        retval += addtoretval
-    outer_objs = [id(o)]
-
-    section_ids = [id(section) for section in sections.values()]
-    for outer_obj in outer_objs:
-        if outer_obj in section_ids:
-            raise ValueError("Circular reference detected")
-    outer_objs += section_ids
-
-    for section in sections:
-        addtoretval, addtosections = encoder.dump_sections(sections[section], section)
-
-        if addtoretval or (not addtoretval and not addtosections):
-            if retval and retval[-2:] != "\n\n":
-                retval += "\n"
-            retval += "[" + (prefix and prefix + "." or "") + section + "]\n"
-            if addtoretval:
-                retval += addtoretval
-        for s in addtosections:
-            if prefix:
-                p = prefix + "." + section + "." + s
-            else:
-                p = section + "." + s
-            retval += dumps(addtosections[s], encoder=encoder, prefix=p)
-
-    return retval
+def extract_dependencies(tomldata):
+    """List of (group, requirement line) of the (parsed) pyproject.toml; group
+    is "" for the main dependencies, otherwise the name of the extra"""
+    project = tomldata.get("project", {})
+    out = [("", x) for x in project.get("dependencies", [])]
+    for group, lines in sorted(project.get("optional-dependencies", {}).items()):
+        out.extend((group, x) for x in lines)
+    return out
 
 
 if __name__ == "__main__":
@@ -0,0 +1,129 @@
+"""
+Template development: keeps a sample project rendered from a template
+
+The template (a directory) is watched; on every change only the output
+files of the changed template files are rendered again (and written, when
+their content differs). The whole template is rendered again only when the
+context may have changed (cookiecutter.json) or the change is outside of
+the project template (e.g. a file included by other templates). The
+post-gen hook runs again only when the hook itself or cookiecutter.json
+changes.
+"""
+
+import os
+
+from acutter import render
+
+CONFIG = "cookiecutter.json"
+
+
+def classify(renderer, changed):
+    """Sorts the changed paths (absolute) out; returns tuple (set of template
+    files to render, whether to render everything, whether to run the hook)"""
+    files = set()
+    full = False
+    hook = False
+    prefix = renderer.project_template + os.sep
+    for path in changed:
+        relpath = os.path.relpath(path, renderer.templatedir)
+        if relpath == CONFIG:
+            full = hook = True
+        elif relpath.startswith(prefix):
+            files.add(relpath)
+        elif os.path.dirname(relpath) == "hooks":
+            if os.path.splitext(os.path.basename(relpath))[0] == "post_gen_project":
+                hook = True
+        else:
+            full = True
+    return files, full, hook
+
+
+def render_files(renderer, output_dir, relpaths):
+    """Renders the given template files into the project (files that no
+    longer exist in the template are removed from it) and updates its
+    manifest; returns tuple (project dir, written files, removed files)"""
+    project_dir = os.path.join(
+        output_dir, renderer.render_path(renderer.project_template)
+    )
+    manifest = render.load_manifest(project_dir)
+    files = manifest.setdefault("files", {})
+    written = []
+    removed = []
+    for relpath in sorted(relpaths):
+        old = files.pop(relpath, None)
+        if old:
+            old_target = os.path.join(output_dir, old["path"])
+        exists = os.path.isfile(os.path.join(renderer.templatedir, relpath))
+        if exists:
+            renderer.forget(relpath)
+            source = renderer.read_source(relpath)
+            content = renderer.render(relpath, source)
+            entry = {
+                "source": render.file_hash(relpath.encode("utf-8") + source),
+                "path": renderer.render_path(relpath),
+                "output": render.file_hash(content),
+            }
+            files[relpath] = entry
+            target = os.path.join(output_dir, entry["path"])
+            current = None
+            if os.path.exists(target):
+                with open(target, "rb") as fi:
+                    current = fi.read()
+            if current != content:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, "wb") as fo:
+                    fo.write(content)
+                written.append(target)
+            os.chmod(target, renderer.source_mode(relpath))
+        if old and (not exists or old["path"] != entry["path"]):
+            if os.path.exists(old_target):
+                os.remove(old_target)
+                removed.append(old_target)
+
+    manifest["template_version"] = render.template_version(files)
+    render.save_manifest(project_dir, manifest)
+    return project_dir, written, removed
+
+
+def render_all(templatedir, output_dir, extra_context, post_hook=True):
+    """(Re)creates the renderer (the context may have changed) and renders
+    the whole template; returns tuple (renderer, project dir, written files)"""
+    context = render.build_context(templatedir, extra_context)
+    renderer = render.Renderer(templatedir, context)
+    project_dir = os.path.join(
+        output_dir, renderer.render_path(renderer.project_template)
+    )
+    project_dir, _, written, _ = render.render_project(
+        templatedir,
+        context,
+        output_dir,
+        manifest=render.load_manifest(project_dir),
+        renderer=renderer,
+        post_hook=post_hook,
+    )
+    return renderer, project_dir, written
+
+
+def apply_changes(renderer, output_dir, extra_context, changed):
+    """Brings the sample project up to date with the changed template files;
+    returns tuple (renderer - a new one after a full render, dict with lists
+    of "written" and "removed" files and whether the hook "ran")"""
+    files, full, hook = classify(renderer, changed)
+    result = {"written": [], "removed": [], "hook": False}
+    if full:
+        renderer, project_dir, written = render_all(
+            renderer.templatedir, output_dir, extra_context, post_hook=False
+        )
+        result["written"] = written
+    elif files:
+        project_dir, result["written"], result["removed"] = render_files(
+            renderer, output_dir, files
+        )
+    else:
+        project_dir = os.path.join(
+            output_dir, renderer.render_path(renderer.project_template)
+        )
+    if hook:
+        renderer.run_hook("post_gen_project", project_dir)
+        result["hook"] = True
+    return renderer, result
@@ -0,0 +1,282 @@
+"""
+Index (catalog) of acutter-managed projects
+
+Walks a directory tree, finds projects (pyproject.toml with a [project]
+table) and stores what get_project_context would extract from them, their
+[tool.acutter] settings, the version of the template they were last
+rendered from (see render.MANIFEST) and their dependencies in a SQLite
+database. Rescans are incremental: only projects whose pyproject.toml or
+manifest changed (mtime, size) are parsed again.
+
+    acutter index ~/workspace
+    acutter index ~/workspace --no-scan --depends click==8.0.3
+"""
+
+import json
+import os
+import sqlite3
+import time
+
+from acutter import cli, render, requirements, utils
+
+SCHEMA_VERSION = 1
+# directories that never contain projects we care about
+SKIP_DIRS = {"node_modules", "__pycache__", "build", "dist", "venv", "site-packages"}
+
+SCHEMA = """
+CREATE TABLE projects (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER,
+    size INTEGER,
+    manifest_mtime_ns INTEGER,
+    manifest_size INTEGER,
+    name TEXT,
+    version TEXT,
+    description TEXT,
+    template TEXT,
+    template_version TEXT,
+    project_name TEXT,
+    github_username TEXT,
+    package_name TEXT,
+    license TEXT,
+    full_name TEXT,
+    email TEXT,
+    context TEXT,
+    error TEXT,
+    indexed REAL
+);
+CREATE INDEX projects_template ON projects (template, template_version);
+CREATE TABLE dependencies (
+    project TEXT,
+    grp TEXT,
+    name TEXT,
+    specifier TEXT,
+    requirement TEXT
+);
+CREATE INDEX dependencies_name ON dependencies (name, specifier);
+CREATE INDEX dependencies_project ON dependencies (project);
+"""
+
+COLUMNS = (
+    "path",
+    "mtime_ns",
+    "size",
+    "manifest_mtime_ns",
+    "manifest_size",
+    "name",
+    "version",
+    "description",
+    "template",
+    "template_version",
+    "project_name",
+    "github_username",
+    "package_name",
+    "license",
+    "full_name",
+    "email",
+    "context",
+    "error",
+    "indexed",
+)
+
+
+def default_path():
+    return utils.get_cache_dir("index.sqlite")
+
+
+def connect(path=None):
+    """Opens (creates, or recreates when the schema changed) the index"""
+    path = path or default_path()
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    db = sqlite3.connect(path)
+    db.row_factory = sqlite3.Row
+    if db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        db.executescript(
+            "DROP TABLE IF EXISTS projects; DROP TABLE IF EXISTS dependencies;"
+        )
+        db.executescript(SCHEMA)
+        db.execute("PRAGMA user_version = {}".format(SCHEMA_VERSION))
+        db.commit()
+    return db
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None, None
+    return st.st_mtime_ns, st.st_size
+
+
+def find_projects(root):
+    """Yields directories (below root) with a pyproject.toml"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [
+            x for x in dirnames if not x.startswith(".") and x not in SKIP_DIRS
+        ]
+        if "pyproject.toml" in filenames:
+            yield dirpath
+
+
+def extract(project_dir):
+    """Returns tuple (projects row as dict, list of dependency rows) or None
+    when it isn't a project (no [project] table)"""
+    import toml
+
+    tomldata = toml.load(os.path.join(project_dir, "pyproject.toml"))
+    if not isinstance(tomldata.get("project"), dict):
+        return None
+    project = tomldata["project"]
+    context = cli.extract_project_context(tomldata, {})
+    manifest = render.load_manifest(project_dir)
+    row = {
+        "name": project.get("name"),
+        "version": context["version"],
+        "description": context["project_short_description"],
+        "template": tomldata.get("tool", {}).get("acutter", {}).get("template"),
+        "template_version": manifest.get("template_version"),
+        "project_name": context.get("project_name"),
+        "github_username": context.get("github_username"),
+        "package_name": context.get("package_name"),
+        "license": context["open_source_license"],
+        "full_name": context["full_name"],
+        "email": context["email"],
+        "context": json.dumps(context, sort_keys=True, default=str),
+    }
+    deps = []
+    for group, line in cli.extract_dependencies(tomldata):
+        try:
+            req = requirements.Requirement(line)
+            name, specifier = req.key, req.specifier or (req.url and "@" + req.url)
+        except ValueError:
+            name, specifier = None, None
+        deps.append((project_dir, group, name, specifier or "", line))
+    return row, deps
+
+
+def scan(db, root):
+    """Indexes projects below root; returns stats dict (added, updated,
+    unchanged, removed, errors)"""
+    root = os.path.realpath(root)
+    known = {
+        x["path"]: (
+            x["mtime_ns"],
+            x["size"],
+            x["manifest_mtime_ns"],
+            x["manifest_size"],
+        )
+        for x in db.execute(
+            "SELECT path, mtime_ns, size, manifest_mtime_ns, manifest_size "
+            "FROM projects"
+        )
+    }
+    stats = dict(added=0, updated=0, unchanged=0, removed=0, errors=0)
+    seen = set()
+    rows = []
+    deps = []
+    now = time.time()
+    for project_dir in find_projects(root):
+        key = _stat(os.path.join(project_dir, "pyproject.toml")) + _stat(
+            os.path.join(project_dir, render.MANIFEST)
+        )
+        seen.add(project_dir)
+        if known.get(project_dir) == key:
+            stats["unchanged"] += 1
+            continue
+        row = dict.fromkeys(COLUMNS)
+        try:
+            found = extract(project_dir)
+        except Exception as e:
+            found = ({"error": "{}: {}".format(e.__class__.__name__, e)}, [])
+            stats["errors"] += 1
+        if found is None:
+            # not a project; remembered (so it isn't parsed again) but hidden
+            found = ({"error": "no [project] table"}, [])
+        row.update(found[0])
+        row.update(
+            path=project_dir,
+            mtime_ns=key[0],
+            size=key[1],
+            manifest_mtime_ns=key[2],
+            manifest_size=key[3],
+            indexed=now,
+        )
+        rows.append(tuple(row[x] for x in COLUMNS))
+        deps.extend(found[1])
+        stats["updated" if project_dir in known else "added"] += 1
+
+    removed = [
+        (x,)
+        for x in known
+        if (x == root or x.startswith(root + os.sep)) and x not in seen
+    ]
+    stats["removed"] = len(removed)
+    with db:
+        changed = [(x[0],) for x in rows] + removed
+        db.executemany("DELETE FROM dependencies WHERE project = ?", changed)
+        db.executemany("DELETE FROM projects WHERE path = ?", removed)
+        db.executemany(
+            "INSERT OR REPLACE INTO projects ({}) VALUES ({})".format(
+                ", ".join(COLUMNS), ", ".join("?" * len(COLUMNS))
+            ),
+            rows,
+        )
+        db.executemany(
+            "INSERT INTO dependencies (project, grp, name, specifier, requirement) "
+            "VALUES (?, ?, ?, ?, ?)",
+            deps,
+        )
+    return stats
+
+
+def query(db, root=None, template=None, template_version=None, depends=None):
+    """Returns list of (project row, matching requirement or None)
+
+    depends: name of a package, optionally with the specifier
+    (click, click==8.0.3)"""
+    sql = "SELECT p.*, {} AS requirement FROM projects p"
+    where = ["p.error IS NULL"]
+    params = []
+    if depends:
+        req = requirements.Requirement(depends)
+        sql = sql.format("d.requirement") + (
+            " JOIN dependencies d ON d.project = p.path"
+        )
+        where.append("d.name = ?")
+        params.append(req.key)
+        if req.specifier or req.url:
+            where.append("d.specifier = ?")
+            params.append(req.specifier or "@" + req.url)
+    else:
+        sql = sql.format("NULL")
+    if root:
+        root = os.path.realpath(root)
+        where.append("(p.path = ? OR substr(p.path, 1, ?) = ?)")
+        params += [root, len(root) + 1, root + os.sep]
+    if template:
+        where.append("p.template = ?")
+        params.append(template)
+    if template_version:
+        where.append("substr(p.template_version, 1, ?) = ?")
+        params += [len(template_version), template_version]
+    sql += " WHERE " + " AND ".join(where) + " ORDER BY p.path"
+    return [(x, x["requirement"]) for x in db.execute(sql, params)]
+
+
+def template_versions(db, root=None):
+    """Returns list of (template, template version, number of projects),
+    the most common first"""
+    sql = (
+        "SELECT template, template_version, count(*) AS n FROM projects "
+        "WHERE error IS NULL {} GROUP BY template, template_version "
+        "ORDER BY template, n DESC"
+    )
+    params = []
+    if root:
+        root = os.path.realpath(root)
+        sql = sql.format("AND (path = ? OR substr(path, 1, ?) = ?)")
+        params = [root, len(root) + 1, root + os.sep]
+    else:
+        sql = sql.format("")
+    return [tuple(x) for x in db.execute(sql, params)]
@@ -0,0 +1,93 @@
+"""
+Checks of baked templates: leftover (unreplaced) template variables
+
+The template is baked into a temporary directory and every file of the
+output is scanned - in parallel, through memory maps and with a single
+precompiled pattern. Binary files (a null byte in the first block) are
+skipped.
+"""
+
+import mmap
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from acutter import render
+
+# {{ cookiecutter.x }} and {% ... cookiecutter.x ... %} (incl. whitespace control)
+PATTERN = re.compile(
+    rb"\{\{-?\s*cookiecutter\.[^}\n]*\}\}|\{%-?[^%\n]*\bcookiecutter\.[^%\n]*%\}"
+)
+BLOCK = 8192
+
+
+def scan_file(path):
+    """Returns list of (line number, line) with leftover variables"""
+    with open(path, "rb") as fi:
+        if b"\0" in fi.read(BLOCK):
+            return []
+        if os.fstat(fi.fileno()).st_size == 0:
+            return []
+        data = mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        out = []
+        lineno = 1
+        last = 0
+        for m in PATTERN.finditer(data):
+            start = m.start()
+            lineno += data[last:start].count(b"\n")
+            last = start
+            begin = data.rfind(b"\n", 0, start) + 1
+            end = data.find(b"\n", m.end())
+            line = data[begin : end if end >= 0 else len(data)]
+            if out and out[-1][0] == lineno:
+                continue
+            out.append((lineno, line.decode("utf-8", "replace").strip()))
+        return out
+    finally:
+        data.close()
+
+
+def scan_paths(paths, jobs=None):
+    """Scans the files in parallel; returns sorted list of
+    (path, line number, line). Variables left in the file names are
+    reported with line number 0"""
+    problems = []
+    for path in paths:
+        if PATTERN.search(os.fsencode(path)):
+            problems.append((path, 0, os.path.basename(path)))
+
+    with ThreadPoolExecutor(
+        max_workers=jobs or min(32, (os.cpu_count() or 1) + 4)
+    ) as executor:
+        for path, found in zip(paths, executor.map(scan_file, paths)):
+            problems.extend((path, lineno, line) for lineno, line in found)
+    return sorted(problems)
+
+
+def bake(templatedir, output_dir, extra_context=None):
+    """Renders the template (with its default answers); returns project dir"""
+    context = {"project_name": "lint-project"}
+    context.update(extra_context or {})
+    project_dir, _, _, _ = render.render_project(
+        templatedir, render.build_context(templatedir, context), output_dir
+    )
+    return project_dir
+
+
+def lint_template(templatedir, extra_context=None, jobs=None):
+    """Bakes the template into a temporary directory and scans the output;
+    returns list of (path relative to the project, line number, line)"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        project_dir = bake(templatedir, tmpdir, extra_context)
+        paths = [
+            os.path.join(dirpath, name)
+            for dirpath, _, files in os.walk(project_dir)
+            for name in files
+            if name != render.MANIFEST
+        ]
+        return [
+            (os.path.relpath(path, project_dir), lineno, line)
+            for path, lineno, line in scan_paths(paths, jobs)
+        ]
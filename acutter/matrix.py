@@ -0,0 +1,108 @@
+"""
+Bakes a template with every combination of its choices
+
+Choice variables (lists inside cookiecutter.json) and y/n flags are
+enumerated (or a random sample of their combinations is taken) and every
+combination is rendered - in memory, on a pool of processes. Every worker
+keeps one renderer (i.e. one jinja environment with compiled templates) for
+all combinations it renders. Hooks are rendered and compiled, not run.
+"""
+
+import itertools
+import json
+import os
+import random
+import time
+
+from acutter import bundle, lint, render
+
+FLAGS = ("y", "n")
+
+_renderer = None
+
+
+def choice_variables(templatedir):
+    """{name: [options]} of the variables that offer a choice"""
+    source = bundle.open_source(templatedir)
+    config = json.loads(source.read("cookiecutter.json").decode("utf-8"))
+    out = {}
+    for name, value in config.items():
+        if name.startswith("_"):
+            continue
+        if isinstance(value, list) and len(value) > 1:
+            out[name] = list(value)
+        elif value in FLAGS:
+            out[name] = list(FLAGS)
+    return out
+
+
+def combinations(variables, sample=None, seed=0):
+    """List of dicts {name: option}; all of them or a sample of the given size"""
+    names = sorted(variables)
+    out = [
+        dict(zip(names, values))
+        for values in itertools.product(*[variables[x] for x in names])
+    ]
+    if sample is not None and sample < len(out):
+        out = random.Random(seed).sample(out, sample)
+    return out
+
+
+def _init_worker(templatedir):
+    global _renderer
+    context = render.build_context(templatedir, {"project_name": "matrix-project"})
+    _renderer = render.Renderer(templatedir, context)
+
+
+def bake(combination):
+    """Renders the template with the given answers (in memory); returns
+    tuple (combination, error or None, duration, number of files)"""
+    start = time.time()
+    renderer = _renderer
+    extra = {"project_name": "matrix-project"}
+    extra.update(combination)
+    count = 0
+    try:
+        renderer.context = render.build_context(renderer.source, extra)
+        for relpath in renderer.iter_files():
+            path = renderer.render_path(relpath)
+            content = renderer.render(relpath)
+            count += 1
+            if lint.PATTERN.search(path.encode("utf-8")) or (
+                b"\0" not in content[: lint.BLOCK] and lint.PATTERN.search(content)
+            ):
+                raise Exception("Unreplaced variable in {}".format(path))
+        bake_hooks(renderer)
+    except Exception as e:
+        error = "{}: {}".format(e.__class__.__name__, e)
+        return combination, error, time.time() - start, count
+    return combination, None, time.time() - start, count
+
+
+def bake_hooks(renderer):
+    """Renders the hooks and compiles the python ones"""
+    if not renderer.source.isdir("hooks"):
+        return
+    for name in renderer.source.listdir("hooks"):
+        if name.endswith("~") or name == "__pycache__":
+            continue
+        template = renderer.env.get_template("hooks/" + name)
+        script = template.render(**renderer.context)
+        if name.endswith(".py"):
+            compile(script, os.path.join("hooks", name), "exec")
+
+
+def bake_matrix(templatedir, combos, jobs=None):
+    """Bakes all combinations; returns list of bake() results (in order)"""
+    jobs = jobs or os.cpu_count() or 1
+    if jobs <= 1:
+        _init_worker(templatedir)
+        return [bake(x) for x in combos]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_worker, initargs=(templatedir,)
+    ) as executor:
+        chunksize = max(1, len(combos) // (jobs * 4))
+        return list(executor.map(bake, combos, chunksize=chunksize))
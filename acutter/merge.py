@@ -0,0 +1,194 @@
+"""
+Merging of the old (project) and the new (template) pyproject.toml
+
+Kept outside of acutter.cli so that `toml` is only imported by the commands
+that need it.
+"""
+
+from collections import OrderedDict
+
+import toml
+from toml import TomlArraySeparatorEncoder, TomlEncoder
+
+from acutter.requirements import parse_requirements
+from acutter.tomlpatch import PatchError, patch_arrays
+
+
+def dependency_lists(data):
+    """Paths of all dependency lists inside the pyproject data:
+    project.dependencies and every project.optional-dependencies group"""
+    project = data.get("project", {})
+    out = []
+    if "dependencies" in project:
+        out.append(("project", "dependencies"))
+    for group in project.get("optional-dependencies", {}):
+        out.append(("project", "optional-dependencies", group))
+    return out
+
+
+def get_path(data, path):
+    for key in path:
+        data = data[key]
+    return data
+
+
+def set_path(data, path, value):
+    for key in path[:-1]:
+        data = data.setdefault(key, OrderedDict())
+    data[path[-1]] = value
+
+
+def merge_requirements(old, new):
+    """Merges two lists of requirements (strings)
+
+    Packages of the template (new) are kept only if the project (old) has
+    them as well (otherwise we assume a developer removed them); packages of
+    the project which are missing from the template are appended. Packages
+    are indexed by their normalized name and markers.
+    """
+    oldreqs = list(parse_requirements(old))
+    newreqs = list(parse_requirements(new))
+
+    oldkeys = set(x.key for x in oldreqs)
+    newvariants = set(x.variant for x in newreqs)
+
+    merged = [str(x) for x in newreqs if x.key in oldkeys]
+    merged.extend(str(x) for x in oldreqs if x.variant not in newvariants)
+    return merged
+
+
+def merge_old_new(oldtoml, inputfile):
+    """
+    Newly generated toml has overwritten things that we want to preserve
+    (such as dependencies); in this function we try to put back the old
+    and keep the new
+
+    Only the arrays that changed are rewritten (in place), the rest of the
+    file - comments included - stays as it was rendered
+    """
+
+    with open(inputfile, "r") as fi:
+        text = fi.read()
+    text, count = merge_text(oldtoml, text)
+    # only if changed, to preserve potential comments otherwise
+    if count:
+        with open(inputfile, "w") as fo:
+            fo.write(text)
+    return count
+
+
+def merge_text(oldtoml, text):
+    """Does the job of merge_old_new() in memory; `text` is the newly
+    generated toml. Returns tuple (merged text, number of changed arrays)"""
+    newtoml = toml.loads(text, _dict=OrderedDict)
+
+    updates = OrderedDict()
+    for path in dependency_lists(oldtoml):
+        old = get_path(oldtoml, path)
+        try:
+            new = get_path(newtoml, path)
+        except KeyError:
+            # e.g. optional-dependencies group that exists only in the project
+            set_path(newtoml, path, list(old))
+            updates[path] = list(old)
+            continue
+
+        merged = merge_requirements(old, new)
+        if merged != new:
+            new.clear()
+            new.extend(merged)
+            updates[path] = merged
+
+    # keep values from the original
+    for path in (
+        ("xsetup", "entry_points", "console_scripts"),
+        ("xsetup", "console_scripts"),
+    ):
+        try:
+            old = get_path(oldtoml, path)
+            new = get_path(newtoml, path)
+            if str(old) != str(new):
+                new.clear()
+                new.extend(old)
+                updates[path] = list(old)
+        except KeyError:
+            pass
+
+    if updates:
+        try:
+            text = patch_arrays(text, updates)
+        except PatchError:
+            text = dumps(newtoml, CustomEncoder())
+    return text, len(updates)
+
+
+class CustomEncoder(TomlArraySeparatorEncoder):
+    def __init__(self, _dict=OrderedDict, preserve=True, separator=",\n"):
+        super(CustomEncoder, self).__init__(_dict, preserve)
+        if separator.strip() == "":
+            separator = "," + separator
+        elif separator.strip(" \t\n\r,"):
+            raise ValueError("Invalid separator for arrays")
+        self.separator = separator
+
+    def dump_list(self, v):
+        t = []
+        retval = "[\n"
+        for u in v:
+            t.append(self.dump_value(u))
+        while t != []:
+            s = []
+            for u in t:
+                if isinstance(u, list):
+                    for r in u:
+                        s.append(r)
+                else:
+                    retval += "    " + str(u) + self.separator
+            t = s
+        retval += "]\n"
+        return retval
+
+
+def dumps(o, encoder=None, prefix=""):
+    """Modified version of toml.dumps()
+    https://github.com/uiri/toml/blob/59d83d0d51a976f11a74991fa7d220fc630d8bae/toml/encoder.py#L34
+
+    In here we dump the sections in order; the original logic of the toml.dumps()
+    is rather convoluted - instead of recursively build the sections, from bottom up,
+    it collects sections and those that are new, are processed last. Our version
+    may not be the best either - but we'll dump sections on the first encounter
+    """
+
+    retval = ""
+    if encoder is None:
+        encoder = TomlEncoder(o.__class__)
+    addtoretval, sections = encoder.dump_sections(o, "")
+    if prefix and addtoretval:
+        retval += "[{}]\n{}".format(prefix, addtoretval)
+    else:
+        retval += addtoretval
+    outer_objs = [id(o)]
+
+    section_ids = [id(section) for section in sections.values()]
+    for outer_obj in outer_objs:
+        if outer_obj in section_ids:
+            raise ValueError("Circular reference detected")
+    outer_objs += section_ids
+
+    for section in sections:
+        addtoretval, addtosections = encoder.dump_sections(sections[section], section)
+
+        if addtoretval or (not addtoretval and not addtosections):
+            if retval and retval[-2:] != "\n\n":
+                retval += "\n"
+            retval += "[" + (prefix and prefix + "." or "") + section + "]\n"
+            if addtoretval:
+                retval += addtoretval
+        for s in addtosections:
+            if prefix:
+                p = prefix + "." + section + "." + s
+            else:
+                p = section + "." + s
+            retval += dumps(addtosections[s], encoder=encoder, prefix=p)
+
+    return retval
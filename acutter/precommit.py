@@ -0,0 +1,122 @@
+"""
+Pre-warmed pre-commit hook environments
+
+The first commit in a new project stalls while pre-commit builds the hook
+environments (black, isort, flake8...). We build them ahead of time - in
+the background, while the virtualenv is being built. The environments live
+in pre-commit's own (machine-wide) store; we record which configurations
+were already installed, keyed by the whole hooks config (revisions,
+additional_dependencies, language_version...), so that it happens only once
+per template version. A record is trusted only while pre-commit's store
+still has the repositories (i.e. until `pre-commit clean`).
+
+Pre-warming is an optimization: callers should treat failures (e.g. no
+network) as warnings.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+
+from acutter import runner
+from acutter.utils import get_cache_dir
+
+REPO_RE = re.compile(r"^\s*-?\s*repo:\s*['\"]?([^'\"\s]+)")
+REV_RE = re.compile(r"^\s*rev:\s*['\"]?([^'\"\s]+)")
+
+
+def config_revisions(config):
+    """List of (repo, rev) of the hooks inside .pre-commit-config.yaml"""
+    revisions = []
+    repo = None
+    with open(config, "r") as fi:
+        for line in fi:
+            m = REPO_RE.match(line)
+            if m:
+                repo = m.group(1)
+                continue
+            m = REV_RE.match(line)
+            if m and repo:
+                revisions.append((repo, m.group(1)))
+                repo = None
+    return revisions
+
+
+def environments_key(config):
+    """Key of the hook environments: hash of the whole config"""
+    with open(config, "rb") as fi:
+        return hashlib.sha256(fi.read()).hexdigest()
+
+
+def marker_path(key):
+    return get_cache_dir("pre-commit", "{}.json".format(key))
+
+
+def store_dir():
+    """pre-commit's store (see pre-commit's store.py)"""
+    return os.environ.get("PRE_COMMIT_HOME") or os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+        "pre-commit",
+    )
+
+
+def store_has(revisions):
+    """True when pre-commit's store has all the repositories (at the given
+    revisions); repositories with additional dependencies are stored as
+    <repo>:<dependencies>"""
+    db = os.path.join(store_dir(), "db.db")
+    if not os.path.exists(db):
+        return False
+    try:
+        conn = sqlite3.connect("file:{}?mode=ro".format(db), uri=True)
+        try:
+            rows = conn.execute("SELECT repo, ref, path FROM repos").fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+    installed = [(repo, ref) for repo, ref, path in rows if os.path.isdir(path)]
+    return all(
+        any(
+            ref == rev and (name == repo or name.startswith(repo + ":"))
+            for name, ref in installed
+        )
+        for repo, rev in revisions
+    )
+
+
+def is_warm(config):
+    return os.path.exists(marker_path(environments_key(config))) and store_has(
+        config_revisions(config)
+    )
+
+
+def prewarm(config):
+    """Installs environments of all hooks of the config (unless that was
+    done before); returns True when the environments are ready. Raises
+    CalledProcessError, TimeoutExpired or OSError when the install fails"""
+    if not os.path.exists(config) or not shutil.which("pre-commit"):
+        return False
+
+    if is_warm(config):
+        return True
+
+    # pre-commit insists on running inside a git repository
+    with tempfile.TemporaryDirectory() as tmpdir:
+        runner.run(["git", "init", "-q"], cwd=tmpdir, capture_output=True)
+        runner.run(
+            ["pre-commit", "install-hooks", "--config", os.path.abspath(config)],
+            cwd=tmpdir,
+            capture_output=True,
+        )
+
+    revisions = config_revisions(config)
+    marker = marker_path(environments_key(config))
+    os.makedirs(os.path.dirname(marker), exist_ok=True)
+    with open(marker, "w") as fo:
+        json.dump({"revisions": revisions}, fo)
+    return True
@@ -0,0 +1,384 @@
+"""
+Renders cookiecutter templates file by file
+
+cookiecutter() always renders (and rewrites) the whole template; in here we
+do the same job but one file at a time, which lets us skip the files that
+would come out unchanged. What was rendered (and from what) is recorded in a
+manifest stored inside the project.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import warnings
+from collections import OrderedDict
+
+import jinja2
+from cookiecutter.config import get_user_config
+from cookiecutter.environment import StrictEnvironment
+from cookiecutter.generate import apply_overwrites_to_context, is_copy_only_path
+from cookiecutter.hooks import run_script_with_context
+from cookiecutter.prompt import prompt_for_config
+
+from acutter import bundle, threeway, trace
+from acutter.utils import get_cache_dir
+
+MANIFEST = ".acutter-manifest.json"
+MANIFEST_VERSION = 1
+
+
+class TemplateBytecodeCache(jinja2.FileSystemBytecodeCache):
+    """Persistent cache of compiled templates; keyed by the template path,
+    its mtime, jinja version and the extensions of the environment (jinja
+    additionally verifies the checksum of the source)"""
+
+    def __init__(self, directory=None, salt=""):
+        directory = directory or get_cache_dir("bytecode")
+        os.makedirs(directory, exist_ok=True)
+        super(TemplateBytecodeCache, self).__init__(directory)
+        self.salt = salt
+        self.hits = 0
+        self.misses = 0
+
+    def get_cache_key(self, name, filename=None):
+        try:
+            mtime = os.stat(filename).st_mtime_ns
+        except (TypeError, OSError):
+            mtime = 0
+        key = "|".join(
+            [jinja2.__version__, self.salt, filename or name, str(mtime), name]
+        )
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def load_bytecode(self, bucket):
+        super(TemplateBytecodeCache, self).load_bytecode(bucket)
+        if bucket.code is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+
+def clear_bytecode_cache(directory=None):
+    """Removes all compiled templates; returns number of removed entries"""
+    directory = directory or get_cache_dir("bytecode")
+    if not os.path.exists(directory):
+        return 0
+    removed = len(os.listdir(directory))
+    shutil.rmtree(directory)
+    return removed
+
+
+def build_context(templatedir, extra_context=None, no_input=True):
+    """Equivalent of what cookiecutter() does before rendering: read
+    cookiecutter.json, apply the user's defaults (default_context of
+    ~/.cookiecutterrc), extra_context and ask for (or render) the remaining
+    values"""
+    source = bundle.open_source(templatedir)
+    config = json.loads(
+        source.read("cookiecutter.json").decode("utf-8"), object_pairs_hook=OrderedDict
+    )
+    default_context = get_user_config()["default_context"]
+    if default_context:
+        try:
+            apply_overwrites_to_context(config, dict(default_context))
+        except ValueError as error:
+            warnings.warn("Invalid default received: {}".format(error))
+    if extra_context:
+        apply_overwrites_to_context(config, extra_context)
+    context = OrderedDict(cookiecutter=config)
+    context["cookiecutter"] = prompt_for_config(context, no_input)
+    context["cookiecutter"]["_template"] = source.path
+    return context
+
+
+def context_hash(context):
+    data = {k: v for k, v in context["cookiecutter"].items() if k != "_template"}
+    return hashlib.sha256(
+        json.dumps(data, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def file_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def find_project_template(templatedir):
+    """The (only) folder inside the template which holds the project"""
+    source = bundle.open_source(templatedir)
+    for name in source.listdir():
+        if (
+            "cookiecutter" in name
+            and "{{" in name
+            and "}}" in name
+            and source.isdir(name)
+        ):
+            return name
+    raise Exception("Project template not found inside: {}".format(source.path))
+
+
+def load_manifest(project_dir):
+    path = os.path.join(project_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as fi:
+        manifest = json.load(fi)
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest
+
+
+def save_manifest(project_dir, manifest):
+    manifest["version"] = MANIFEST_VERSION
+    with open(os.path.join(project_dir, MANIFEST), "w") as fo:
+        json.dump(manifest, fo, indent=2, sort_keys=True)
+        fo.write("\n")
+
+
+class Renderer(object):
+    """Renders single files of a template with the given context"""
+
+    def __init__(self, templatedir, context, bytecode_cache=True):
+        self.source = bundle.open_source(templatedir)
+        self.templatedir = self.source.path
+        self.context = context
+        self.env = StrictEnvironment(
+            context=context,
+            keep_trailing_newline=True,
+            loader=self.source.loader(),
+        )
+        if bytecode_cache:
+            self.env.bytecode_cache = TemplateBytecodeCache(
+                salt=",".join(sorted(self.env.extensions))
+            )
+        self.project_template = find_project_template(self.source)
+        # compiled templates of the paths, binary flags of the files
+        self._paths = {}
+        self._binary = {}
+
+    def iter_files(self):
+        """Yields paths of all template files (relative to the templatedir)"""
+        return self.source.iter_files(self.project_template)
+
+    def render_path(self, relpath):
+        """Output path (relative to the output dir) of a template file"""
+        if "{" not in relpath:
+            return relpath
+        if relpath not in self._paths:
+            self._paths[relpath] = self.env.from_string(relpath)
+        return self._paths[relpath].render(**self.context)
+
+    def forget(self, relpath):
+        """Drops what is cached about a (changed) template file"""
+        self._binary.pop(relpath, None)
+
+    def read_source(self, relpath):
+        return self.source.read(relpath)
+
+    def source_mode(self, relpath):
+        return self.source.mode(relpath)
+
+    def copied(self, relpath):
+        """Whether the file is copied as it is (binary or copy-only)"""
+        if relpath not in self._binary:
+            self._binary[relpath] = self.source.is_binary(relpath)
+        return self._binary[relpath] or is_copy_only_path(relpath, self.context)
+
+    def compile(self):
+        """Compiles the paths and templates of all files ahead of rendering"""
+        for relpath in self.iter_files():
+            self.render_path(relpath)
+            if not self.copied(relpath):
+                self.env.get_template(relpath.replace(os.sep, "/"))
+
+    def render(self, relpath, source=None):
+        """Returns rendered content (bytes) of a template file"""
+        if source is None:
+            source = self.read_source(relpath)
+        if self.copied(relpath):
+            return source
+
+        firstline = source.split(b"\n", 1)[0]
+        newline = "\r\n" if firstline.endswith(b"\r") else "\n"
+
+        template = self.env.get_template(relpath.replace(os.sep, "/"))
+        output = template.render(**self.context)
+        if newline != "\n":
+            output = output.replace("\n", newline)
+        return output.encode("utf-8")
+
+    def cache_stats(self):
+        cache = self.env.bytecode_cache
+        if cache is None:
+            return {"hits": 0, "misses": 0}
+        return {"hits": cache.hits, "misses": cache.misses}
+
+    def run_hook(self, hook_name, project_dir, context=None):
+        """Runs the hook (if the template has it) with the given context
+        (default: the one of the renderer)"""
+        if not self.source.isdir("hooks"):
+            return
+        for name in self.source.listdir("hooks"):
+            if os.path.splitext(name)[0] == hook_name and not name.endswith("~"):
+                with trace.span(hook_name, "hook", script=name), self.source.extract(
+                    os.path.join("hooks", name)
+                ) as script:
+                    run_script_with_context(
+                        script, project_dir, context or self.context
+                    )
+
+
+def render_files(templatedir, context, names):
+    """Renders (in memory) only the given files; names are paths relative
+    to the project root, e.g. ["pyproject.toml"]
+
+    Returns dict: {name: rendered content}
+    """
+    renderer = Renderer(templatedir, context)
+    out = {}
+    with trace.span("render {}".format(", ".join(names)), "render"):
+        for relpath in renderer.iter_files():
+            name = renderer.render_path(relpath).split(os.sep, 1)[1]
+            if name in names:
+                out[name] = renderer.render(relpath)
+    return out
+
+
+def iter_rendered(renderer, output_dir, manifest=None):
+    """Renders the files of the template one by one
+
+    Yields tuples (template path, manifest entry, content); content is None
+    when neither the template source nor the context changed since the
+    manifest was written (and the output file exists)
+    """
+    manifest = manifest or {}
+    same_context = manifest.get("context") == context_hash(renderer.context)
+    old_files = manifest.get("files", {})
+
+    for relpath in renderer.iter_files():
+        source = renderer.read_source(relpath)
+        shash = file_hash(relpath.encode("utf-8") + source)
+        outpath = renderer.render_path(relpath)
+
+        old = old_files.get(relpath)
+        if (
+            same_context
+            and old
+            and old["source"] == shash
+            and old["path"] == outpath
+            and os.path.exists(os.path.join(output_dir, outpath))
+        ):
+            yield relpath, old, None
+            continue
+
+        content = renderer.render(relpath, source)
+        entry = {"source": shash, "path": outpath, "output": file_hash(content)}
+        yield relpath, entry, content
+
+
+def template_version(files):
+    """Identifies the version of the template from its files (manifest
+    entries of the render)"""
+    data = sorted((relpath, x["source"]) for relpath, x in files.items())
+    return file_hash(json.dumps(data).encode("utf-8"))
+
+
+def render_project(
+    templatedir,
+    context,
+    output_dir,
+    manifest=None,
+    three_way=False,
+    renderer=None,
+    post_hook=True,
+    keep_base=False,
+    full=False,
+):
+    """Renders the template into output_dir; files whose template source and
+    context didn't change since the manifest was written are not rendered,
+    and files whose rendered content is identical are not written. The new
+    manifest is saved into the project (before the post-gen hook runs).
+    With `full`, all files are rendered (the manifest still gives the bases
+    of the three-way merge).
+
+    With `three_way`, changes of the template (since the render recorded in
+    the manifest) are merged into the files instead of overwriting them; see
+    acutter.threeway. With `keep_base`, the rendered files are stored as the
+    base of the next three-way update (the default with `three_way`)
+
+    Returns tuple: (project_dir, new manifest, list of written files, stats);
+    stats are those of the compiled templates cache (with `three_way` also
+    lists of "merged", "conflicts" and "unmerged" files)
+
+    A `renderer` (of the same template) can be shared by many renders;
+    without `post_hook`, running the post-gen hook is left to the caller
+    """
+
+    if renderer is None:
+        renderer = Renderer(templatedir, context)
+    renderer.context = context
+    project_dir = os.path.join(
+        output_dir, renderer.render_path(renderer.project_template)
+    )
+    os.makedirs(project_dir, exist_ok=True)
+    renderer.run_hook("pre_gen_project", project_dir)
+
+    keep_base = keep_base or three_way
+    old_files = (manifest or {}).get("files", {})
+    files = {}
+    written = []
+    merged = []
+    conflicts = []
+    unmerged = []
+    with trace.span("render", "render") as info:
+        for relpath, entry, content in iter_rendered(
+            renderer, output_dir, None if full else manifest
+        ):
+            files[relpath] = entry
+            if content is None:
+                continue
+            if keep_base:
+                threeway.store(entry["output"], content)
+
+            target = os.path.join(output_dir, entry["path"])
+            current = None
+            if os.path.exists(target):
+                with open(target, "rb") as fi:
+                    current = fi.read()
+            if three_way:
+                name = os.path.relpath(target, project_dir).replace(os.sep, "/")
+                content, status = threeway.apply(
+                    name, current, old_files.get(relpath), entry, content
+                )
+                if status == "merged":
+                    merged.append(target)
+                elif status == "conflict":
+                    conflicts.append(target)
+                elif status == "unmerged":
+                    unmerged.append(target)
+                if content is None:
+                    continue
+            if current == content:
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as fo:
+                fo.write(content)
+            os.chmod(target, renderer.source_mode(relpath))
+            written.append(target)
+        info["files"] = len(files)
+        info["written"] = len(written)
+
+    new_manifest = {
+        "template": renderer.source.name,
+        "template_version": template_version(files),
+        "context": context_hash(context),
+        "files": files,
+    }
+    save_manifest(project_dir, new_manifest)
+
+    if post_hook:
+        renderer.run_hook("post_gen_project", project_dir)
+    stats = renderer.cache_stats()
+    if three_way:
+        stats.update(merged=merged, conflicts=conflicts, unmerged=unmerged)
+    return project_dir, new_manifest, written, stats
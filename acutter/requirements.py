@@ -0,0 +1,78 @@
+"""
+Lightweight parser of PEP 508 requirement strings
+
+We only need to know the (normalized) name and the markers of a requirement
+to merge dependency lists; the original text is kept as it was written.
+"""
+
+import re
+from functools import lru_cache
+
+REQUIREMENT_RE = re.compile(
+    r"""
+    (?P<name>[A-Za-z0-9](?:[A-Za-z0-9._-]*[A-Za-z0-9])?)\s*
+    (?:\[(?P<extras>[^\]]*)\]\s*)?
+    (?:
+        # marker after an url has to be separated by whitespace
+        @\s*(?P<url>\S+)(?:\s+;\s*(?P<umarker>.*))?
+        |
+        (?P<spec>[^;@]*)(?:;(?P<marker>.*))?
+    )$
+    """,
+    re.VERBOSE,
+)
+SPECIFIER_STRIP = str.maketrans("", "", " \t()")
+NORMALIZE_RE = re.compile(r"[-_.]+")
+
+
+def canonical_name(name):
+    """PEP 503 normalized name: lowercase, runs of -_. replaced by -"""
+    return NORMALIZE_RE.sub("-", name).lower()
+
+
+@lru_cache(maxsize=1024)
+def normalize_marker(marker):
+    if not marker:
+        return None
+    marker = re.sub(r"\s*(===|[<>=!~]=?)\s*", r" \1 ", marker.replace("'", '"'))
+    return re.sub(r"\s+", " ", marker).strip()
+
+
+class Requirement(object):
+    __slots__ = ("name", "key", "extras", "specifier", "url", "marker", "line")
+
+    def __init__(self, line):
+        self.line = line.strip()
+        m = REQUIREMENT_RE.match(self.line)
+        if not m:
+            raise ValueError("Invalid requirement: {!r}".format(line))
+        self.name = m.group("name")
+        self.key = canonical_name(self.name)
+        extras = m.group("extras")
+        self.extras = (
+            tuple(sorted(x.strip() for x in extras.split(",") if x.strip()))
+            if extras
+            else ()
+        )
+        self.url = m.group("url")
+        self.specifier = (m.group("spec") or "").translate(SPECIFIER_STRIP)
+        self.marker = normalize_marker(m.group("umarker") or m.group("marker"))
+
+    @property
+    def variant(self):
+        """Index key: the same package may be listed once per marker"""
+        return (self.key, self.marker)
+
+    def __str__(self):
+        return self.line
+
+    def __repr__(self):
+        return "Requirement({!r})".format(self.line)
+
+
+def parse_requirements(lines):
+    """Yields Requirement for every (non-empty, non-comment) line"""
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield Requirement(line)
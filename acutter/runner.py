@@ -0,0 +1,185 @@
+"""
+Runner of external commands (pip, git, pre-commit...)
+
+Commands run as asyncio subprocesses: many of them can run at once (capped
+by a semaphore), their output is streamed live - prefixed with the name of
+the task when several run together - and every command has a timeout, so
+that a hung pip or git doesn't stall acutter forever.
+
+Checks whether a tool is installed are cached by the resolved path of the
+tool; a tool is spawned (`tool -h`) only the first time.
+"""
+
+import asyncio
+import os
+import shutil
+import signal
+import subprocess
+import sys
+
+from acutter import trace
+
+TIMEOUT_ENV = "ACUTTER_COMMAND_TIMEOUT"
+# seconds; a single pip install of a project with all its extras can be slow
+DEFAULT_TIMEOUT = 30 * 60
+PROBE_TIMEOUT = 60
+CHUNK = 64 * 1024
+
+_probed = set()
+
+
+def default_timeout():
+    value = os.environ.get(TIMEOUT_ENV)
+    if not value:
+        return DEFAULT_TIMEOUT
+    try:
+        timeout = float(value)
+    except ValueError:
+        timeout = 0
+    if timeout <= 0:
+        raise Exception(
+            "{} must be a (positive) number of seconds, got: {!r}".format(
+                TIMEOUT_ENV, value
+            )
+        )
+    return timeout
+
+
+def _write(line, prefix):
+    text = line.decode("utf-8", "replace")
+    sys.stdout.write("[{}] {}".format(prefix, text) if prefix else text)
+    sys.stdout.flush()
+
+
+async def _pump(reader, prefix, capture, output):
+    # read in chunks: lines (e.g. progress bars) may be longer than any limit
+    # of readline()
+    pending = b""
+    while True:
+        chunk = await reader.read(CHUNK)
+        if not chunk:
+            if pending and not capture:
+                _write(pending + b"\n", prefix)
+            return
+        output.append(chunk)
+        if capture:
+            continue
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            _write(line + b"\n", prefix)
+
+
+async def _kill(proc):
+    """Kills the process together with its children (its process group)"""
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except ProcessLookupError:
+        pass
+    await proc.wait()
+
+
+async def run_async(
+    args, cwd=None, prefix=None, timeout=None, capture_output=False, semaphore=None
+):
+    """Runs the command; raises CalledProcessError (non-zero exit status)
+    or TimeoutExpired. Returns CompletedProcess (stdout holds the combined
+    output, stderr included)
+
+    The command runs in its own session; on timeout (or interrupt) the
+    whole process group is killed, not only the command itself"""
+    timeout = timeout or default_timeout()
+    if semaphore is not None:
+        async with semaphore:
+            return await run_async(args, cwd, prefix, timeout, capture_output)
+
+    output = []
+    with trace.command(args, cwd=cwd) as info:
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            cwd=cwd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+
+        async def communicate():
+            await _pump(proc.stdout, prefix, capture_output, output)
+            return await proc.wait()
+
+        try:
+            await asyncio.wait_for(communicate(), timeout)
+        except asyncio.TimeoutError:
+            await _kill(proc)
+            info["exit_status"] = "timeout"
+            raise subprocess.TimeoutExpired(args, timeout, output=b"".join(output))
+        except BaseException:
+            # e.g. Ctrl+C: the new session doesn't get the terminal's SIGINT
+            await _kill(proc)
+            raise
+
+        stdout = b"".join(output)
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, args, output=stdout)
+        return subprocess.CompletedProcess(args, proc.returncode, stdout=stdout)
+
+
+def run(args, cwd=None, prefix=None, timeout=None, capture_output=False):
+    """Blocking version of run_async()"""
+    return asyncio.run(run_async(args, cwd, prefix, timeout, capture_output))
+
+
+def run_many(commands, limit=4, timeout=None):
+    """Runs the commands concurrently, at most `limit` at a time
+
+    commands: list of (prefix, args, cwd)
+    Returns list of CompletedProcess or exceptions (in the same order)
+    """
+
+    async def main():
+        semaphore = asyncio.Semaphore(limit)
+        return await asyncio.gather(
+            *[
+                run_async(args, cwd, prefix, timeout, semaphore=semaphore)
+                for prefix, args, cwd in commands
+            ],
+            return_exceptions=True,
+        )
+
+    return asyncio.run(main())
+
+
+def resolve(cmd, cwd=None):
+    """Real path of the executable (None when there is none)"""
+    if os.sep in cmd or (os.altsep and os.altsep in cmd):
+        path = os.path.join(cwd or ".", cmd)
+        if not (os.path.isfile(path) and os.access(path, os.X_OK)):
+            return None
+    else:
+        path = shutil.which(cmd)
+        if path is None:
+            return None
+    return os.path.realpath(path)
+
+
+def command_exists(cmd, cwd=None):
+    """True when the command is installed (and runs)"""
+    path = resolve(cmd, cwd)
+    if path is None:
+        return False
+    if path not in _probed:
+        try:
+            run([cmd, "-h"], cwd=cwd, timeout=PROBE_TIMEOUT, capture_output=True)
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError):
+            return False
+        # only tools that work are remembered
+        _probed.add(path)
+    return True
+
+
+def clear_probes():
+    _probed.clear()
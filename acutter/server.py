@@ -0,0 +1,224 @@
+"""
+Render daemon (acutter serve)
+
+Keeps templates loaded and compiled in memory and renders/updates projects
+on request, so that a request costs only the rendering itself. Jobs are
+accepted over local HTTP (or HTTP over a unix socket) as JSON:
+
+    POST /render  {"folder": "/abs/path", "template": "python_package",
+                   "context": {...}, "force": false}
+    POST /update  {"folder": "/abs/path", "template": "python_package",
+                   "force": false, "full": false}
+    GET  /health
+
+and run on a bounded pool of workers; when all workers are busy and the
+queue is full, the request is refused (HTTP 503). Only the templates loaded
+at start can be used (templates run their hooks), and only requests with
+Content-Type: application/json are accepted (so that a web page can't post
+jobs cross-site). By default the server listens on a unix socket that only
+its owner can connect to.
+"""
+
+import json
+import os
+import queue
+import socketserver
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from acutter import cli, render
+
+
+class Busy(Exception):
+    pass
+
+
+class UnknownTemplate(ValueError):
+    pass
+
+
+class RendererPool(object):
+    """Idle renderers per template; a renderer is used by one job at a time.
+    Only preloaded templates are served"""
+
+    def __init__(self):
+        self.idle = {}
+        # opened templates (a bundle is mapped once, shared by its renderers)
+        self.sources = {}
+        self.lock = threading.Lock()
+
+    def preload(self, template):
+        with self.lock:
+            if template not in self.sources:
+                self.sources[template] = cli.get_templatedir(template)
+            self.idle.setdefault(template, queue.LifoQueue())
+        with self.get(template) as renderer:
+            renderer.compile()
+
+    def check(self, template):
+        with self.lock:
+            if template not in self.idle:
+                raise UnknownTemplate("Unknown template: {}".format(template))
+
+    @contextmanager
+    def get(self, template):
+        self.check(template)
+        with self.lock:
+            renderers = self.idle[template]
+        try:
+            renderer = renderers.get_nowait()
+        except queue.Empty:
+            source = self.sources[template]
+            renderer = render.Renderer(source, render.build_context(source))
+        try:
+            yield renderer
+        finally:
+            renderers.put(renderer)
+
+    def templates(self):
+        with self.lock:
+            return sorted(self.idle)
+
+
+class Service(object):
+    def __init__(self, jobs=4, queued=None):
+        self.executor = ThreadPoolExecutor(max_workers=jobs)
+        self.slots = threading.BoundedSemaphore(
+            jobs + (jobs * 4 if queued is None else queued)
+        )
+        self.renderers = RendererPool()
+
+    def submit(self, job, params):
+        if not self.slots.acquire(blocking=False):
+            raise Busy("All workers are busy, try again later")
+        try:
+            future = self.executor.submit(getattr(self, job), params)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future.result()
+
+    def render(self, params):
+        folder = _folder(params)
+        template = params.get("template", "python_package")
+        start = time.time()
+        with self.renderers.get(template) as renderer:
+            project_dir, _ = cli.render_new_project(
+                folder,
+                params.get("context", {}),
+                renderer.source,
+                force=params.get("force", False),
+                renderer=renderer,
+            )
+        return {"project_dir": project_dir, "duration": time.time() - start}
+
+    def update(self, params):
+        folder = _folder(params)
+        template = params.get("template", "python_package")
+        start = time.time()
+        with self.renderers.get(template) as renderer:
+            project_dir = cli.update_project(
+                folder,
+                template=template,
+                force=params.get("force", False),
+                full=params.get("full", False),
+                verbose=False,
+                renderer=renderer,
+            )
+        return {"project_dir": project_dir, "duration": time.time() - start}
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+def _folder(params):
+    folder = params.get("folder")
+    if not folder or not os.path.isabs(folder):
+        raise ValueError("folder (absolute path) is required")
+    return folder
+
+
+class Handler(BaseHTTPRequestHandler):
+    JOBS = {"/render": "render", "/update": "update"}
+
+    def reply(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self.reply(404, {"error": "Unknown path: {}".format(self.path)})
+        service = self.server.service
+        self.reply(200, {"status": "ok", "templates": service.renderers.templates()})
+
+    def do_POST(self):
+        job = self.JOBS.get(self.path)
+        if job is None:
+            return self.reply(404, {"error": "Unknown path: {}".format(self.path)})
+        content_type = self.headers.get("Content-Type") or ""
+        if content_type.split(";")[0].strip().lower() != "application/json":
+            return self.reply(415, {"error": "Expected Content-Type: application/json"})
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            params = json.loads(self.rfile.read(length).decode("utf-8") or "{}")
+            if not isinstance(params, dict):
+                raise ValueError("Expected a JSON object")
+            _folder(params)
+            self.server.service.renderers.check(
+                params.get("template", "python_package")
+            )
+        except ValueError as e:
+            return self.reply(400, {"error": str(e)})
+
+        try:
+            result = self.server.service.submit(job, params)
+        except Busy as e:
+            return self.reply(503, {"error": str(e)})
+        except Exception as e:
+            return self.reply(500, {"error": "{}: {}".format(e.__class__.__name__, e)})
+        self.reply(200, result)
+
+    def address_string(self):
+        # unix sockets have no client address
+        return self.client_address[0] if self.client_address else "unix"
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service, host="127.0.0.1", port=8642, socket_path=None):
+    """HTTP server on the unix socket (if given; readable and writable only
+    by the owner) or on host:port"""
+    if socket_path:
+        try:
+            mode = os.lstat(socket_path).st_mode
+        except FileNotFoundError:
+            mode = None
+        if mode is not None:
+            if not stat.S_ISSOCK(mode):
+                raise Exception(
+                    "{} exists and is not a socket, refusing to replace it".format(
+                        socket_path
+                    )
+                )
+            os.unlink(socket_path)
+        umask = os.umask(0o177)
+        try:
+            server = UnixHTTPServer(socket_path, Handler)
+        finally:
+            os.umask(umask)
+        os.chmod(socket_path, 0o600)
+    else:
+        server = ThreadingHTTPServer((host, port), Handler)
+    server.service = service
+    return server
@@ -0,0 +1,172 @@
+"""
+Three-way merge of template updates
+
+Every rendered file is kept in a content-addressed store (inside the cache);
+the manifest of the project records the template version, the context and
+the hash of every rendered file - i.e. it points at the render the project
+was last updated from (the base). On the next update, the base, the new
+render and the file in the working tree are merged (git merge-file), so
+that only the changes of the template get applied and local changes stay.
+
+Projects rendered from the same template version with the same context
+share the same base; it is never rendered again. Bases are stored only by
+renders whose manifest serves as a base (creates and three-way updates);
+bases unused for RENDERS_MAX_AGE are pruned by `cache clear`. A file whose
+base is missing (another machine, a pruned cache) is updated only when it
+is unchanged since the last update (its hash is in the manifest); local
+changes are never overwritten without a base.
+"""
+
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from acutter import trace
+from acutter.utils import get_cache_dir
+
+# files merged by other means (see acutter.merge)
+SKIP = ("pyproject.toml",)
+# seconds; stored renders unused for longer are pruned (see prune)
+RENDERS_MAX_AGE = 90 * 24 * 3600
+
+
+def blob_path(digest):
+    return get_cache_dir("renders", digest[:2], digest)
+
+
+def _touch(path):
+    """Marks the stored render as used (see prune); False if there is none"""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def store(digest, content):
+    path = blob_path(digest)
+    if _touch(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = "{}.tmp-{}".format(path, os.getpid())
+    with open(tmp, "wb") as fo:
+        fo.write(content)
+    os.replace(tmp, path)
+
+
+def load(digest, touch=True):
+    """Content of the stored render (marked as used, unless not `touch`)"""
+    path = blob_path(digest)
+    if not (_touch(path) if touch else os.path.exists(path)):
+        return None
+    with open(path, "rb") as fi:
+        return fi.read()
+
+
+def _blobs():
+    root = get_cache_dir("renders")
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            yield os.path.join(dirpath, name)
+
+
+def stats(max_age=RENDERS_MAX_AGE):
+    """Tuple (number of stored renders, their size, how many of them are
+    unused for longer than max_age)"""
+    count = size = old = 0
+    cutoff = time.time() - max_age
+    for path in _blobs():
+        st = os.stat(path)
+        count += 1
+        size += st.st_size
+        if st.st_mtime < cutoff:
+            old += 1
+    return count, size, old
+
+
+def prune(max_age=RENDERS_MAX_AGE):
+    """Removes stored renders unused for longer than max_age (seconds);
+    returns how many were removed"""
+    removed = 0
+    cutoff = time.time() - max_age
+    for path in list(_blobs()):
+        try:
+            if os.stat(path).st_mtime < cutoff:
+                os.remove(path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def clear():
+    """Removes all stored renders; returns how many files were removed"""
+    root = get_cache_dir("renders")
+    if not os.path.exists(root):
+        return 0
+    removed = sum(len(files) for _, _, files in os.walk(root))
+    shutil.rmtree(root)
+    return removed
+
+
+def merge(current, base, new, name="file"):
+    """Merges changes between base and new into current (all bytes); without
+    a base, new replaces current
+
+    Returns tuple (content, status); content is None when current should be
+    kept. Status is one of: "updated", "kept", "merged", "conflict"
+    """
+    if base is None or current == base:
+        return new, "updated"
+    if new == base:
+        return None, "kept"
+    if b"\0" in current or b"\0" in base or b"\0" in new or not shutil.which("git"):
+        return None, "conflict"
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = []
+        for label, content in (("current", current), ("base", base), ("new", new)):
+            paths.append(os.path.join(tmpdir, label))
+            with open(paths[-1], "wb") as fo:
+                fo.write(content)
+        args = ["git", "merge-file", "-p"]
+        for label in ("working tree", "last update", "template"):
+            args += ["-L", "{} ({})".format(name, label)]
+        with trace.command(args + ["current", "base", "new"]) as info:
+            result = subprocess.run(args + paths, stdout=subprocess.PIPE)
+            info["exit_status"] = result.returncode
+    if result.returncode < 0 or result.returncode > 127:
+        raise Exception("git merge-file failed for {}".format(name))
+    return result.stdout, "conflict" if result.returncode else "merged"
+
+
+def apply(name, current, old, entry, content, dry_run=False):
+    """What should be written into the project file `name`
+
+    current: its content in the working tree (None if it doesn't exist)
+    old, entry: manifest entries of the last and of the new render
+    content: the new render
+
+    Returns tuple (content or None, status); status "unmerged" means the
+    file has local changes and its base isn't stored - it is kept as it is.
+    With `dry_run` nothing is merged (no git, no temporary files) nor marked
+    as used; a file that needs a merge gets status "merge" (content None)
+    """
+    if current is None:
+        return content, "updated"
+    if current == content:
+        return None, "kept"
+    base = None
+    if old and old["path"] == entry["path"] and name not in SKIP:
+        if hashlib.sha256(current).hexdigest() == old["output"]:
+            # not changed since the last update
+            return content, "updated"
+        base = load(old["output"], touch=not dry_run)
+        if base is None:
+            return None, "unmerged"
+        if dry_run and base not in (current, content):
+            return None, "merge"
+    return merge(current, base, content, name)
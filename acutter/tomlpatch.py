@@ -0,0 +1,294 @@
+"""
+In-place patching of arrays inside a TOML document
+
+Instead of re-serializing the whole document (which drops comments and
+reorders sections), we locate the text spans of the arrays that changed and
+rewrite only those; everything else stays byte-identical.
+"""
+
+import json
+import re
+
+BARE_KEY_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+# next character that is significant inside an array/inline table
+SPECIAL_RE = re.compile(r"[\"'#\[\]{}]")
+BASIC_STRING_RE = re.compile(r'"(?:[^"\\\n]|\\.)*"')
+LITERAL_STRING_RE = re.compile(r"'[^'\n]*'")
+TRAILING_COMMENT_RE = re.compile(r"[ \t]*(#[^\n]*)?")
+# strings, comments and line breaks inside an array of strings
+ARRAY_TOKEN_RE = re.compile(r'"(?:[^"\\\n]|\\.)*"|\'[^\'\n]*\'|#[^\n]*|\n')
+
+
+class PatchError(Exception):
+    pass
+
+
+def _skip_string(text, i):
+    """i points at the opening quote; returns index after the closing one"""
+    for quote in ('"""', "'''"):
+        if text.startswith(quote, i):
+            end = i + 3
+            while True:
+                end = text.find(quote, end)
+                if end < 0:
+                    raise PatchError("Unterminated string at {}".format(i))
+                if quote == '"""' and _escaped(text, end):
+                    end += 1
+                    continue
+                # closing quotes may be followed by (up to two) more quotes
+                end += 3
+                while end < len(text) and text[end] == quote[0]:
+                    end += 1
+                return end
+    m = (BASIC_STRING_RE if text[i] == '"' else LITERAL_STRING_RE).match(text, i)
+    if not m:
+        raise PatchError("Unterminated string at {}".format(i))
+    return m.end()
+
+
+def _escaped(text, i):
+    backslashes = 0
+    while i - backslashes - 1 >= 0 and text[i - backslashes - 1] == "\\":
+        backslashes += 1
+    return backslashes % 2 == 1
+
+
+def _skip_comment(text, i):
+    end = text.find("\n", i)
+    return len(text) if end < 0 else end
+
+
+def _skip_value(text, i):
+    """Returns the index right after the value that starts at i"""
+    c = text[i]
+    if c in "\"'":
+        return _skip_string(text, i)
+    if c in "[{":
+        closing = {"[": "]", "{": "}"}
+        stack = [closing[c]]
+        i += 1
+        while stack:
+            m = SPECIAL_RE.search(text, i)
+            if not m:
+                raise PatchError("Unterminated array/table")
+            i = m.start()
+            c = text[i]
+            if c in "\"'":
+                i = _skip_string(text, i)
+                continue
+            if c == "#":
+                i = _skip_comment(text, i)
+                continue
+            if c in "[{":
+                stack.append(closing[c])
+            elif c == stack[-1]:
+                stack.pop()
+            i += 1
+        return i
+    # numbers, booleans, dates: till the end of line (or comment)
+    end = i
+    while end < len(text) and text[end] not in "#\n":
+        end += 1
+    while end > i and text[end - 1] in " \t\r":
+        end -= 1
+    return end
+
+
+KEY_PART_RE = re.compile(r'\s*("(?:[^"\\]|\\.)*"|\'[^\']*\'|[A-Za-z0-9_-]+)\s*(\.|$)')
+
+
+def _parse_key(raw):
+    """Parts of a (dotted) key; raises PatchError when it isn't one"""
+    parts = []
+    i = 0
+    while True:
+        m = KEY_PART_RE.match(raw, i)
+        if not m or m.end() == i:
+            raise PatchError("Invalid key: {!r}".format(raw))
+        part = m.group(1)
+        if part[0] == '"':
+            try:
+                part = json.loads(part)
+            except ValueError:
+                raise PatchError("Invalid key: {!r}".format(raw))
+        elif part[0] == "'":
+            part = part[1:-1]
+        parts.append(part)
+        i = m.end()
+        if not m.group(2):
+            return tuple(parts)
+
+
+def _find_outside_strings(text, i, char):
+    """Index of `char` (on the same line), skipping quoted parts"""
+    while i < len(text):
+        c = text[i]
+        if c == char:
+            return i
+        if c == "\n":
+            break
+        if c in "\"'":
+            i = _skip_string(text, i)
+            continue
+        i += 1
+    raise PatchError("Expected {!r} at {}".format(char, i))
+
+
+def scan(text):
+    """Scans the document; returns tuple (values, tables)
+
+    values: {(table..., key): (start, end)} span of every value
+    tables: {(table...): end} where the last statement of a table ends
+
+    Raises PatchError for anything it can't parse
+    """
+    try:
+        return _scan(text)
+    except PatchError:
+        raise
+    except (ValueError, IndexError) as e:
+        raise PatchError("Cannot parse the document: {}".format(e))
+
+
+def _scan(text):
+    values = {}
+    tables = {(): 0}
+    table = ()
+    i = 0
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if c in " \t\r\n":
+            i += 1
+        elif c == "#":
+            i = _skip_comment(text, i)
+        elif c == "[":
+            double = text.startswith("[[", i)
+            start = i + (2 if double else 1)
+            end = _find_outside_strings(text, start, "]")
+            if double and not text.startswith("]]", end):
+                raise PatchError("Unterminated table header at {}".format(i))
+            table = _parse_key(text[start:end])
+            i = end + (2 if double else 1)
+            tables[table] = i
+        else:
+            eq = _find_outside_strings(text, i, "=")
+            key = _parse_key(text[i:eq])
+            start = eq + 1
+            while start < n and text[start] in " \t":
+                start += 1
+            if start >= n or text[start] in "\r\n#":
+                raise PatchError("Missing value at {}".format(eq))
+            end = _skip_value(text, start)
+            values[table + key] = (start, end)
+            tables[table] = end
+            i = end
+    return values, tables
+
+
+def format_string(value, quote='"'):
+    if quote == "'" and "'" not in value and "\n" not in value:
+        return "'{}'".format(value)
+    return json.dumps(value)
+
+
+def _array_items(original):
+    """Strings of the original array and their comments
+
+    Returns tuple (items, comments): items maps each value to
+    [token, leading comment lines, trailing comment on its line]; comments
+    are the ones after the last element
+    """
+    items = {}
+    comments = []
+    line = last_line = 0
+    last = None
+    for m in ARRAY_TOKEN_RE.finditer(original):
+        token = m.group(0)
+        if token == "\n":
+            line += 1
+        elif token[0] == "#":
+            if last is not None and line == last_line and not last[2]:
+                gap = m.start()
+                while gap > 0 and original[gap - 1] in " \t":
+                    gap -= 1
+                last[2] = original[gap : m.start()] + token
+            else:
+                comments.append(token)
+        else:
+            value = json.loads(token) if token[0] == '"' else token[1:-1]
+            last = items.setdefault(value, [token, [], ""])
+            last[1].extend(comments)
+            comments = []
+            last_line = line
+    return items, comments
+
+
+def format_array(values, original=""):
+    """Formats list of strings in the style of the original array: same
+    quotes, layout and indentation
+
+    Comments of the original array stay with the element that follows them
+    (or the one on their line); comment lines above a removed element move to
+    the next element that is kept, a comment on its line is dropped with it"""
+    items, comments = _array_items(original)
+    carry = []
+    for value, item in items.items():
+        if value in values:
+            item[1][:0] = carry
+            carry = []
+        else:
+            carry.extend(item[1])
+    comments[:0] = carry
+
+    quote = "'" if original.lstrip("[ \t\r\n").startswith("'") else '"'
+    tokens = [items[x][0] if x in items else format_string(x, quote) for x in values]
+
+    if original and "\n" not in original:
+        return "[" + ", ".join(tokens) + "]"
+
+    m = re.search(r"\n([ \t]+)\S", original)
+    indent = m.group(1) if m else "    "
+    lines = ["["]
+    for value, token in zip(values, tokens):
+        leading, trailing = items.pop(value, (None, [], ""))[1:]
+        lines.extend(indent + x for x in leading)
+        lines.append(indent + token + "," + trailing)
+    lines.extend(indent + x for x in comments)
+    lines.append("]")
+    return "\n".join(lines)
+
+
+def patch_arrays(text, updates):
+    """Rewrites the given arrays in a single pass
+
+    updates: {(table..., key): list of strings}
+    Arrays that don't exist are appended at the end of their table; raises
+    PatchError when that table doesn't exist either (or the value is not
+    an array)
+    """
+    values, tables = scan(text)
+    edits = []
+    for path, value in updates.items():
+        path = tuple(path)
+        if path in values:
+            start, end = values[path]
+            if text[start] != "[":
+                raise PatchError("{} is not an array".format(".".join(path)))
+            edits.append((start, end, format_array(value, text[start:end])))
+        elif path[:-1] in tables and path[:-1]:
+            key = path[-1] if BARE_KEY_RE.match(path[-1]) else json.dumps(path[-1])
+            # after the comment on the line of the last statement, if any
+            pos = TRAILING_COMMENT_RE.match(text, tables[path[:-1]]).end()
+            edits.append((pos, pos, "\n{} = {}".format(key, format_array(value))))
+        else:
+            raise PatchError("Table {} not found".format(".".join(path[:-1])))
+
+    out = []
+    last = 0
+    for start, end, replacement in sorted(edits):
+        out.append(text[last:start])
+        out.append(replacement)
+        last = end
+    out.append(text[last:])
+    return "".join(out)
@@ -0,0 +1,172 @@
+"""
+Timeline of where acutter spends its time
+
+Phases (rendering, hooks, merging...) and every subprocess are recorded as
+spans. The timeline can be saved in the Chrome trace-event format (open it
+in chrome://tracing or https://ui.perfetto.dev) and summarized in a table.
+
+Spans recorded by other processes (the post-gen hook, workers of
+update-all) are appended to a file whose path is passed to them in an
+environment variable; they are merged into the timeline at the end.
+"""
+
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+EVENTS_ENV = "ACUTTER_TRACE_EVENTS"
+
+_recorder = None
+
+
+class Recorder(object):
+    def __init__(self):
+        self.pid = os.getpid()
+        self.start = time.time()
+        self.events = []
+        self.lock = threading.Lock()
+
+    def add(self, event):
+        with self.lock:
+            self.events.append(event)
+
+
+def enable():
+    """Starts recording; returns the recorder"""
+    global _recorder
+    _recorder = Recorder()
+    fd, path = tempfile.mkstemp(prefix="acutter-trace-", suffix=".jsonl")
+    os.close(fd)
+    os.environ[EVENTS_ENV] = path
+    return _recorder
+
+
+def _record(event):
+    if _recorder is not None and _recorder.pid == os.getpid():
+        _recorder.add(event)
+        return
+    path = os.environ.get(EVENTS_ENV)
+    if path:
+        with open(path, "a") as fo:
+            fo.write(json.dumps(event) + "\n")
+
+
+@contextmanager
+def span(name, category="acutter", **args):
+    """Records duration of the block; the yielded dict can be used to add
+    more details (args) to the span"""
+    if _recorder is None and not os.environ.get(EVENTS_ENV):
+        yield args
+        return
+    start = time.time()
+    try:
+        yield args
+    finally:
+        _record(
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": int(start * 1e6),
+                "dur": int((time.time() - start) * 1e6),
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": args,
+            }
+        )
+
+
+def command_category(args):
+    program = os.path.basename(str(args[0]))
+    if program.startswith("pip") or "pip" in args[1:3]:
+        return "pip"
+    if program in ("git", "gh", "pre-commit", "virtualenv"):
+        return program
+    return "subprocess"
+
+
+@contextmanager
+def command(args, cwd=None):
+    """Span of a subprocess: records its command line and exit status"""
+    cmdline = " ".join(str(x) for x in args)
+    name = cmdline if len(cmdline) <= 80 else cmdline[:77] + "..."
+    with span(name, command_category(args), cmd=cmdline, cwd=cwd) as info:
+        try:
+            yield info
+        except subprocess.CalledProcessError as e:
+            info["exit_status"] = e.returncode
+            raise
+        except OSError as e:
+            info["exit_status"] = None
+            info["error"] = str(e)
+            raise
+        info.setdefault("exit_status", 0)
+
+
+def finish(recorder, name, path=None):
+    """Stops recording; collects spans of other processes, writes the trace
+    (when path is given) and prints the summary"""
+    global _recorder
+    end = time.time()
+    recorder.add(
+        {
+            "name": name,
+            "cat": "command",
+            "ph": "X",
+            "ts": int(recorder.start * 1e6),
+            "dur": int((end - recorder.start) * 1e6),
+            "pid": recorder.pid,
+            "tid": threading.get_ident(),
+            "args": {},
+        }
+    )
+    _recorder = None
+    events = list(recorder.events)
+    events_file = os.environ.pop(EVENTS_ENV, None)
+    if events_file and os.path.exists(events_file):
+        with open(events_file, "r") as fi:
+            events.extend(json.loads(line) for line in fi if line.strip())
+        os.unlink(events_file)
+    events.sort(key=lambda x: x["ts"])
+
+    if path:
+        with open(path, "w") as fo:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fo)
+    print_summary(events, end - recorder.start)
+    if path:
+        print("Trace written into: {}".format(path))
+    return events
+
+
+def summarize(events):
+    """{category: (count, total seconds)}; spans of the same category that
+    overlap (e.g. parallel pip runs) are all counted"""
+    out = OrderedDict()
+    for event in events:
+        if event["cat"] == "command":
+            continue
+        count, total = out.get(event["cat"], (0, 0.0))
+        out[event["cat"]] = (count + 1, total + event["dur"] / 1e6)
+    return out
+
+
+def print_summary(events, wall, slowest=5):
+    print("Timings (total {:.2f}s):".format(wall))
+    for category, (count, total) in sorted(
+        summarize(events).items(), key=lambda x: -x[1][1]
+    ):
+        print("    {:<20} {:>5}x {:>10.2f}s".format(category, count, total))
+    commands = [x for x in events if "cmd" in x["args"]]
+    if commands:
+        print("Slowest commands:")
+        for event in sorted(commands, key=lambda x: -x["dur"])[:slowest]:
+            print(
+                "    {:>8.2f}s  [exit {}]  {}".format(
+                    event["dur"] / 1e6, event["args"].get("exit_status"), event["name"]
+                )
+            )
@@ -0,0 +1,31 @@
+import os
+
+
+def get_cache_dir(*parts):
+    """acutter's cache lives in $ACUTTER_CACHE_DIR (or ~/.cache/acutter)"""
+    root = os.environ.get("ACUTTER_CACHE_DIR") or os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "acutter"
+    )
+    return os.path.join(root, *parts)
+
+
+def unified_diff(name, old, new):
+    """Yields lines of a (git style) unified diff of two versions of a file;
+    old and new are bytes, old is None when the file doesn't exist yet"""
+    import difflib
+
+    fromfile = "a/" + name if old is not None else "/dev/null"
+    old = old or b""
+    try:
+        if b"\0" in old or b"\0" in new:
+            raise UnicodeDecodeError("binary", b"", 0, 0, "binary")
+        oldlines = old.decode("utf-8").splitlines(True)
+        newlines = new.decode("utf-8").splitlines(True)
+    except UnicodeDecodeError:
+        yield "Binary files {} and b/{} differ\n".format(fromfile, name)
+        return
+
+    for line in difflib.unified_diff(oldlines, newlines, fromfile, "b/" + name):
+        if not line.endswith("\n"):
+            line += "\n\\ No newline at end of file\n"
+        yield line
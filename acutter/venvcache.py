@@ -0,0 +1,217 @@
+"""
+Cache of built virtualenvs
+
+Projects generated from the same template share the same set of
+dependencies; instead of building every .venv from scratch we build it once,
+keep a snapshot (keyed by a hash of the dependency set and the python
+version) and clone it into new projects. Paths inside the clone are fixed up
+afterwards. Both the snapshot and the clones are copies (reflinks where the
+file system supports them), so that changes inside one venv (pip rewriting
+RECORD, .pyc files, patched site-packages) don't leak into the others.
+
+The key holds the declared requirements, not what they resolved to; so that
+unpinned (or transitive) dependencies pick up new releases, snapshots expire
+after MAX_AGE. What a snapshot resolved to is recorded in it ("freeze").
+
+Snapshots never contain the project itself; it is installed (editable,
+without dependencies) into the clone.
+"""
+
+import hashlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+
+import toml
+
+from acutter.utils import get_cache_dir
+
+SNAPSHOT_INFO = ".acutter-snapshot.json"
+# extras installed into the project's virtualenv (cached or not)
+EXTRAS = ("dev", "docs")
+# seconds; older snapshots are built again
+MAX_AGE = 7 * 24 * 3600
+
+
+def snapshot_dir(*parts):
+    return get_cache_dir("venvs", *parts)
+
+
+def enabled():
+    return not os.environ.get("ACUTTER_NO_VENV_CACHE")
+
+
+def dependency_set(project_dir=".", extras=EXTRAS):
+    """Sorted list of the dependencies of the project (incl. the extras)"""
+    data = toml.load(os.path.join(project_dir, "pyproject.toml"))
+    project = data.get("project", {})
+    deps = set(project.get("dependencies", []))
+    groups = project.get("optional-dependencies", {})
+    for extra in extras:
+        deps.update(groups.get(extra, []))
+    return sorted(deps)
+
+
+def editable_target(extras=EXTRAS):
+    """What pip installs without the cache, e.g. .[dev,docs]"""
+    return ".[{}]".format(",".join(extras)) if extras else "."
+
+
+def environment_key(deps):
+    virtualenv = shutil.which("virtualenv") or "virtualenv"
+    data = {
+        "dependencies": deps,
+        "python": "{}.{}".format(*sys.version_info[:2]),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "virtualenv": os.path.realpath(virtualenv),
+    }
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def lookup(key, max_age=MAX_AGE):
+    """Location of the snapshot; None when there is none or it expired"""
+    path = snapshot_dir(key)
+    try:
+        created = os.stat(os.path.join(path, SNAPSHOT_INFO)).st_mtime
+    except OSError:
+        return None
+    if time.time() - created > max_age:
+        return None
+    return path
+
+
+def _copytree(src, dst):
+    """Copies the tree (symlinks as they are); with GNU cp, files are
+    reflinked on file systems which support it (btrfs, xfs...)"""
+    os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+    if sys.platform.startswith("linux") and shutil.which("cp"):
+        try:
+            subprocess.run(
+                ["cp", "-a", "--reflink=auto", src, dst],
+                check=True,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            return
+        except subprocess.CalledProcessError:
+            if os.path.exists(dst):
+                shutil.rmtree(dst)
+    shutil.copytree(src, dst, symlinks=True)
+
+
+def _fix_paths(venv, old_prefixes):
+    """Scripts and config files of a virtualenv contain its absolute path
+    (either as it was given, or resolved - e.g. /private/tmp vs /tmp)"""
+    # the longest first, one may contain the other
+    olds = sorted(set(x.encode("utf-8") for x in old_prefixes), key=len, reverse=True)
+    new = os.path.abspath(venv).encode("utf-8")
+    candidates = [os.path.join(venv, "pyvenv.cfg")]
+    for dirname in ("bin", "Scripts"):
+        bindir = os.path.join(venv, dirname)
+        if os.path.isdir(bindir):
+            candidates.extend(os.path.join(bindir, x) for x in os.listdir(bindir))
+
+    for path in candidates:
+        if os.path.islink(path) or not os.path.isfile(path):
+            continue
+        with open(path, "rb") as fi:
+            content = fi.read()
+        if not any(x in content for x in olds) or b"\0" in content[:1024]:
+            continue
+        for old in olds:
+            content = content.replace(old, new)
+        mode = os.stat(path).st_mode
+        # the file may share its blocks with the snapshot; write a new one
+        os.unlink(path)
+        with open(path, "wb") as fo:
+            fo.write(content)
+        os.chmod(path, mode)
+
+
+def clone(snapshot, venv):
+    """Clones the snapshot into `venv` (which must not exist)"""
+    with open(os.path.join(snapshot, SNAPSHOT_INFO), "r") as fi:
+        info = json.load(fi)
+    _copytree(snapshot, venv)
+    os.remove(os.path.join(venv, SNAPSHOT_INFO))
+    prefixes = [
+        info["prefix"],
+        info.get("realpath") or os.path.realpath(info["prefix"]),
+    ]
+    _fix_paths(venv, prefixes)
+
+
+def freeze(venv):
+    """What the dependencies of the venv resolved to (pip freeze)"""
+    try:
+        result = subprocess.run(
+            [os.path.join(venv, "bin", "python"), "-m", "pip", "freeze"],
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        )
+    except (subprocess.CalledProcessError, OSError):
+        return None
+    return result.stdout.splitlines()
+
+
+def publish(venv, key, deps):
+    """Stores the (freshly built) venv in the cache (replacing an expired
+    snapshot); returns its location"""
+    if not os.path.isdir(venv):
+        return None
+    target = snapshot_dir(key)
+    if lookup(key):
+        return target
+    tmp = "{}.tmp-{}".format(target, os.getpid())
+    if os.path.exists(tmp):
+        shutil.rmtree(tmp)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    # a copy: the venv stays in use (and may be changed in place)
+    _copytree(venv, tmp)
+    with open(os.path.join(tmp, SNAPSHOT_INFO), "w") as fo:
+        json.dump(
+            {
+                "prefix": os.path.abspath(venv),
+                "realpath": os.path.realpath(venv),
+                "dependencies": deps,
+                "freeze": freeze(venv),
+            },
+            fo,
+        )
+    if os.path.exists(target):
+        # expired; clones made from it are copies, it can go
+        expired = "{}.old-{}".format(target, os.getpid())
+        try:
+            os.rename(target, expired)
+            shutil.rmtree(expired)
+        except OSError:
+            pass
+    try:
+        os.rename(tmp, target)
+    except OSError:
+        # somebody else published the same environment meanwhile
+        shutil.rmtree(tmp)
+    return target
+
+
+def list_snapshots():
+    root = snapshot_dir()
+    if not os.path.isdir(root):
+        return []
+    return sorted(x for x in os.listdir(root) if lookup(x, max_age=float("inf")))
+
+
+def clear():
+    """Removes all snapshots; returns how many were removed"""
+    removed = len(list_snapshots())
+    root = snapshot_dir()
+    if os.path.exists(root):
+        shutil.rmtree(root)
+    return removed
@@ -0,0 +1,72 @@
+"""
+Polling file watcher (no dependencies, works everywhere)
+
+Snapshots of a tree are compared every `interval` seconds; a change is
+reported once the tree has been quiet for one interval, so that an editor
+saving several files (or writing one in chunks) triggers a single rebuild.
+"""
+
+import os
+import time
+
+# directories that are never watched (besides the hidden ones, unless asked)
+SKIP_DIRS = {".git", "__pycache__", "node_modules", "build", "dist"}
+
+
+def _skip_dir(name, hidden):
+    return name in SKIP_DIRS or (not hidden and name.startswith("."))
+
+
+def _skip_file(name, hidden):
+    return name.endswith(("~", ".pyc", ".swp")) or (not hidden and name.startswith("."))
+
+
+def snapshot(paths, hidden=False):
+    """Returns {path: (mtime_ns, size)} of all files below the paths;
+    hidden files and directories are included only with `hidden`"""
+    out = {}
+    for root in paths:
+        if os.path.isfile(root):
+            st = os.stat(root)
+            out[root] = (st.st_mtime_ns, st.st_size)
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [x for x in dirnames if not _skip_dir(x, hidden)]
+            for name in filenames:
+                if _skip_file(name, hidden):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                out[path] = (st.st_mtime_ns, st.st_size)
+    return out
+
+
+def changes(old, new):
+    """Set of paths added, modified or removed between two snapshots"""
+    return {x for x in old.keys() | new.keys() if old.get(x) != new.get(x)}
+
+
+def watch(paths, interval=0.5, state=None, hidden=False):
+    """Yields sets of changed paths (forever); `state` is the snapshot to
+    start from (by default, the current state of the paths)"""
+    state = snapshot(paths, hidden) if state is None else state
+    while True:
+        time.sleep(interval)
+        current = snapshot(paths, hidden)
+        changed = changes(state, current)
+        if not changed:
+            continue
+        # wait till the writes settle
+        while True:
+            time.sleep(interval)
+            settled = snapshot(paths, hidden)
+            if settled == current:
+                break
+            current = settled
+        changed = changes(state, current)
+        state = current
+        if changed:
+            yield changed
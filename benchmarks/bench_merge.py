@@ -0,0 +1,81 @@
+"""
+Micro-benchmark of the dependency merge (merge_requirements/merge_old_new)
+
+Usage: python benchmarks/bench_merge.py [--entries 1000] [--groups 10]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import timeit
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from acutter.merge import dumps, merge_old_new, merge_requirements  # noqa: E402
+
+MARKERS = ["", "; python_version < '3.8'", "; sys_platform == 'win32'"]
+
+
+def synthetic_requirements(n, seed=0):
+    rnd = random.Random(seed)
+    out = []
+    for i in range(n):
+        name = "package{}_{}".format(rnd.choice(["", "-", ".", "_"]), i)
+        spec = "=={}.{}.{}".format(rnd.randint(0, 9), rnd.randint(0, 20), i % 7)
+        out.append(name + spec + rnd.choice(MARKERS))
+    return out
+
+
+def synthetic_pyproject(entries, groups, seed=0):
+    project = OrderedDict()
+    project["name"] = "bench"
+    project["dependencies"] = synthetic_requirements(entries, seed)
+    project["optional-dependencies"] = OrderedDict(
+        ("group{}".format(i), synthetic_requirements(entries, seed + i + 1))
+        for i in range(groups)
+    )
+    return OrderedDict(project=project)
+
+
+def bench(label, func, number):
+    best = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print("{:<40} {:>10.3f} ms".format(label, best * 1000))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=1000)
+    parser.add_argument("--groups", type=int, default=10)
+    parser.add_argument("--number", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    old = synthetic_requirements(args.entries, seed=1)
+    new = synthetic_requirements(args.entries, seed=2)
+    bench(
+        "merge_requirements ({} entries)".format(args.entries),
+        lambda: merge_requirements(old, new),
+        args.number,
+    )
+
+    oldtoml = synthetic_pyproject(args.entries, args.groups, seed=1)
+    newtext = dumps(synthetic_pyproject(args.entries, args.groups, seed=2))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        inputfile = os.path.join(tmpdir, "pyproject.toml")
+
+        def run():
+            with open(inputfile, "w") as fo:
+                fo.write(newtext)
+            merge_old_new(oldtoml, inputfile)
+
+        bench(
+            "merge_old_new ({} x {} groups)".format(args.entries, args.groups + 1),
+            run,
+            args.number,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Benchmark suite of acutter's hot paths
+
+Times create, update, provision, get_project_context, merge_old_new and
+dumps() against synthetic projects of increasing size (number of template
+files, dependencies, depth of TOML tables). Runs offline; results are
+stored as JSON and can be compared with results of a previous run.
+
+Usage:
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --compare results.json --threshold 1.25
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_merge import synthetic_pyproject  # noqa: E402
+
+from acutter import cli, render  # noqa: E402
+from acutter.merge import dumps, merge_old_new  # noqa: E402
+
+SOURCE_TEMPLATE = cli.get_templatedir("python_package")
+
+SIZES = {
+    "files": [0, 100, 1000],
+    "dependencies": [10, 100, 1000],
+    "depth": [2, 8, 32],
+}
+QUICK_SIZES = {"files": [0, 50], "dependencies": [10, 100], "depth": [2, 8]}
+
+
+def make_template(workdir, extra_files):
+    """Copy of python_package with `extra_files` additional template files"""
+    templates = os.path.join(workdir, "templates")
+    templatedir = os.path.join(templates, "bench_{}".format(extra_files))
+    if not os.path.exists(templatedir):
+        shutil.copytree(SOURCE_TEMPLATE, templatedir)
+        project = os.path.join(templatedir, render.find_project_template(templatedir))
+        for i in range(extra_files):
+            folder = os.path.join(
+                project, "{{cookiecutter.package_name}}", "m%d" % (i // 50)
+            )
+            os.makedirs(folder, exist_ok=True)
+            with open(os.path.join(folder, "f{}.py".format(i)), "w") as fo:
+                fo.write(
+                    '"""{{ cookiecutter.project_short_description }}"""\n'
+                    "NAME = '{{ cookiecutter.package_name }}'\n"
+                    "VERSION = '{{ cookiecutter.version }}'\n" * 5
+                )
+    return templates, os.path.basename(templatedir)
+
+
+def deep_table(depth, width=5):
+    root = OrderedDict()
+    node = root
+    for level in range(depth):
+        for i in range(width):
+            node["key{}".format(i)] = "value {} {}".format(level, i)
+        node["list"] = ["item{}".format(i) for i in range(width)]
+        node = node.setdefault("level{}".format(level), OrderedDict())
+    return OrderedDict(tool=root)
+
+
+@contextlib.contextmanager
+def quiet():
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def measure(func, setup=None, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        with quiet():
+            func(state) if setup else func()
+        timings.append(time.perf_counter() - start)
+    return {
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "repeat": repeat,
+    }
+
+
+def bench_templates(workdir, sizes, repeat):
+    results = OrderedDict()
+    counter = [0]
+
+    for files in sizes["files"]:
+        templates, name = make_template(workdir, files)
+        cli.TEMPLATEDIR = templates
+        templatedir = cli.get_templatedir(name)
+
+        def new_project():
+            counter[0] += 1
+            outdir = os.path.join(workdir, "out", str(counter[0]))
+            context = render.build_context(
+                templatedir, {"project_name": "bench-project"}
+            )
+            return context, outdir
+
+        results["create[files={}]".format(files)] = measure(
+            lambda state: render.render_project(templatedir, state[0], state[1]),
+            setup=new_project,
+            repeat=repeat,
+        )
+
+        with quiet():
+            context, outdir = new_project()
+            project, _, _, _ = render.render_project(templatedir, context, outdir)
+        inputfile = os.path.join(project, "pyproject.toml")
+
+        results["update[files={}]".format(files)] = measure(
+            lambda: cli.update_project(
+                project, template=name, force=True, verbose=False
+            ),
+            repeat=repeat,
+        )
+        results["update-full[files={}]".format(files)] = measure(
+            lambda: cli.update_project(
+                project, template=name, force=True, verbose=False, full=True
+            ),
+            repeat=repeat,
+        )
+        results["provision[files={}]".format(files)] = measure(
+            lambda: render.render_files(
+                templatedir,
+                render.build_context(templatedir, {"project_name": "legacy"}),
+                ["pyproject.toml"],
+            ),
+            repeat=repeat,
+        )
+        results["get_project_context[files={}]".format(files)] = measure(
+            lambda: cli.get_project_context(inputfile, templatedir, verbose=False),
+            repeat=repeat,
+        )
+    return results
+
+
+def bench_toml(workdir, sizes, repeat):
+    results = OrderedDict()
+    for entries in sizes["dependencies"]:
+        oldtoml = synthetic_pyproject(entries, 10, seed=1)
+        newtext = dumps(synthetic_pyproject(entries, 10, seed=2))
+        inputfile = os.path.join(workdir, "merge-{}.toml".format(entries))
+
+        def setup():
+            with open(inputfile, "w") as fo:
+                fo.write(newtext)
+
+        results["merge_old_new[dependencies={}]".format(entries)] = measure(
+            lambda state: merge_old_new(oldtoml, inputfile),
+            setup=setup,
+            repeat=repeat,
+        )
+        data = synthetic_pyproject(entries, 10)
+        results["dumps[dependencies={}]".format(entries)] = measure(
+            lambda: dumps(data), repeat=repeat
+        )
+
+    for depth in sizes["depth"]:
+        data = deep_table(depth)
+        results["dumps[depth={}]".format(depth)] = measure(
+            lambda: dumps(data), repeat=repeat
+        )
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Prints comparison with the baseline; returns list of regressions"""
+    regressions = []
+    for name, value in results.items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        ratio = value["min"] / old["min"] if old["min"] else 1.0
+        flag = ""
+        if ratio > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print("{:<45} {:>8.2f}x{}".format(name, ratio, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--output", help="Write results into this JSON file")
+    parser.add_argument("--compare", help="Compare with results of a previous run")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--quick", action="store_true", help="Smaller sizes")
+    args = parser.parse_args(argv)
+
+    sizes = QUICK_SIZES if args.quick else SIZES
+    workdir = tempfile.mkdtemp(prefix="acutter-bench-")
+    cache = os.environ.get("ACUTTER_CACHE_DIR")
+    os.environ["ACUTTER_CACHE_DIR"] = os.path.join(workdir, "cache")
+    try:
+        results = OrderedDict()
+        results.update(bench_templates(workdir, sizes, args.repeat))
+        results.update(bench_toml(workdir, sizes, args.repeat))
+    finally:
+        shutil.rmtree(workdir)
+        if cache is None:
+            del os.environ["ACUTTER_CACHE_DIR"]
+        else:
+            os.environ["ACUTTER_CACHE_DIR"] = cache
+
+    for name, value in results.items():
+        print(
+            "{:<45} {:>10.2f} ms (median {:.2f} ms)".format(
+                name, value["min"] * 1000, value["median"] * 1000
+            )
+        )
+
+    data = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+            "sizes": sizes,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as fo:
+            json.dump(data, fo, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r") as fi:
+            baseline = json.load(fi)
+        print("-" * 80)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
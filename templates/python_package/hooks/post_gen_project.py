@@ -1,10 +1,132 @@
+import contextlib
+import io
 import os
 import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 
+# name and output of the task that runs in the current thread (see run_tasks)
+_task = threading.local()
+_lock = threading.Lock()
+
+
+class TaskOutput(io.TextIOBase):
+    """Stand-in for sys.stdout: writes of a task are streamed line by line,
+    prefixed with the name of the task, and kept in its own buffer"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, data):
+        buffer = getattr(_task, "output", None)
+        if buffer is None:
+            return self.stream.write(data)
+        buffer.write(data)
+        lines = (_task.pending + data).split("\n")
+        _task.pending = lines.pop()
+        self._emit(lines)
+        return len(data)
+
+    def finish(self):
+        """Writes out the last (unterminated) line of the current task"""
+        if _task.pending:
+            self._emit([_task.pending])
+            _task.pending = ""
+
+    def _emit(self, lines):
+        if not lines:
+            return
+        with _lock:
+            for line in lines:
+                self.stream.write("[{}] {}\n".format(_task.name, line))
+            self.stream.flush()
+
+    def flush(self):
+        self.stream.flush()
+
+
+# seconds; without acutter, a command is stopped after that (acutter's runner
+# reads ACUTTER_COMMAND_TIMEOUT itself)
+COMMAND_TIMEOUT = 30 * 60
+PROBE_TIMEOUT = 60
+
+# commands known to work (when acutter's runner isn't available)
+_probed = set()
+
+
+def traced(name):
+    """Span of a task in the timeline of `acutter --trace` (needs acutter)"""
+    try:
+        from acutter import trace
+    except ImportError:
+        return contextlib.nullcontext()
+    return trace.span(name, "hook task")
+
+
+def load_runner():
+    """Runner of commands (live output, timeouts, cached probes) is
+    available when acutter is installed"""
+    try:
+        from acutter import runner
+    except ImportError:
+        return None
+    return runner
+
+
+def command_timeout():
+    try:
+        return float(os.environ.get("ACUTTER_COMMAND_TIMEOUT") or COMMAND_TIMEOUT)
+    except ValueError:
+        return COMMAND_TIMEOUT
+
 
 def run_cmd(args, **kwargs):
-    return subprocess.run(args, check=True, **kwargs)
+    if getattr(_task, "output", None) is not None and not kwargs.get("capture_output"):
+        print("$ {}".format(" ".join(args)))
+    runner = load_runner()
+    if runner is not None:
+        return runner.run(args, **kwargs)
+    return _run_cmd(args, **kwargs)
+
+
+def _run_cmd(args, timeout=None, **kwargs):
+    timeout = timeout or command_timeout()
+    if (
+        getattr(_task, "output", None) is None
+        or "capture_output" in kwargs
+        or "stdout" in kwargs
+    ):
+        return subprocess.run(args, check=True, timeout=timeout, **kwargs)
+
+    # inside a task: the output is streamed (see TaskOutput) as it comes
+    expired = threading.Event()
+    with subprocess.Popen(
+        args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True,
+        **kwargs,
+    ) as proc:
+
+        def kill():
+            expired.set()
+            proc.kill()
+
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+        try:
+            for line in proc.stdout:
+                sys.stdout.write(line)
+        finally:
+            timer.cancel()
+    if expired.is_set():
+        raise subprocess.TimeoutExpired(args, timeout)
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, args)
+    return subprocess.CompletedProcess(args, proc.returncode)
 
 
 def run_pip(args):
@@ -14,11 +136,21 @@ def run_pip(args):
 
 
 def check_command_exists(cmd):
-    try:
-        run_cmd([cmd, "-h"], capture_output=True)
-    except (subprocess.CalledProcessError, FileNotFoundError):
+    runner = load_runner()
+    exists = runner.command_exists(cmd) if runner is not None else _probe(cmd)
+    if not exists:
         print(f"{cmd} command is not installed")
-        return False
+    return exists
+
+
+def _probe(cmd):
+    """Whether `cmd -h` works; spawned only once per command"""
+    if cmd not in _probed:
+        try:
+            _run_cmd([cmd, "-h"], capture_output=True, timeout=PROBE_TIMEOUT)
+        except (subprocess.SubprocessError, OSError):
+            return False
+        _probed.add(cmd)
     return True
 
 
@@ -26,10 +158,13 @@ def install_virtualenv():
     if not check_command_exists("virtualenv"):
         return
 
-    run_cmd(["virtualenv", ".venv"])
-
-    run_pip(["install", "-e", ".[dev]"])
-    run_pip(["install", ".[docs]"])
+    venvcache = load_venvcache()
+    if venvcache is not None:
+        install_cached_virtualenv(venvcache)
+    else:
+        run_cmd(["virtualenv", ".venv"])
+        # one resolver pass for the project and all its extras
+        run_pip(["install", "-e", ".[dev,docs]"])
 
     print(
         """Virtualenv created inside {folder}/.venv
@@ -38,14 +173,39 @@ def install_virtualenv():
 
     cd {folder}
     source .venv/bin/activate
-    pip install -e .[dev]
-    pip install .[docs]
+    pip install -e .[dev,docs]
     """.format(
             folder=os.path.abspath(".")
         )
     )
 
 
+def load_venvcache():
+    """Cache of built virtualenvs is available when acutter is installed"""
+    try:
+        from acutter import venvcache
+    except ImportError:
+        return None
+    return venvcache if venvcache.enabled() else None
+
+
+def install_cached_virtualenv(venvcache):
+    deps = venvcache.dependency_set(".")
+    key = venvcache.environment_key(deps)
+
+    snapshot = venvcache.lookup(key)
+    if snapshot:
+        print("Cloning cached virtualenv {}".format(key[:12]))
+        venvcache.clone(snapshot, ".venv")
+    else:
+        run_cmd(["virtualenv", ".venv"])
+        if deps:
+            run_pip(["install"] + deps)
+        venvcache.publish(".venv", key, deps)
+
+    run_pip(["install", "-e", ".", "--no-deps"])
+
+
 def initial_commit():
     # Init local repo
     run_cmd(["git", "init"])
@@ -117,6 +277,98 @@ def setup_pre_commit():
         run_cmd(["pre-commit", "install"])
 
 
+def prewarm_pre_commit():
+    """Build pre-commit hook environments ahead of the first commit; they are
+    shared by all projects with the same hooks (needs acutter)"""
+    try:
+        from acutter import precommit
+    except ImportError:
+        return
+    # only an optimization: a failure (e.g. no network) mustn't fail the task
+    try:
+        ready = precommit.prewarm(".pre-commit-config.yaml")
+    except (subprocess.SubprocessError, OSError) as e:
+        print("Warning: pre-commit hook environments were not installed: {}".format(e))
+        return
+    if not ready:
+        print("pre-commit command is not installed")
+
+
+def run_tasks(tasks, max_workers=4):
+    """Runs tasks concurrently, each one as soon as its dependencies finished
+
+    tasks: list of (name, function, [names of dependencies]); dependencies
+    which are not in the list are ignored. When a task fails, tasks that
+    depend on it are skipped. Output of every task is streamed as it comes,
+    every line prefixed with the name of the task.
+
+    Returns {name: (status, output, duration)}; status is one of
+    "ok", "failed", "skipped"
+    """
+    names = set(x[0] for x in tasks)
+    pending = {
+        name: (func, [d for d in deps if d in names]) for name, func, deps in tasks
+    }
+    results = {}
+
+    stdout = sys.stdout
+    output = TaskOutput(stdout)
+
+    def execute(name, func):
+        _task.name = name
+        _task.output = io.StringIO()
+        _task.pending = ""
+        start = time.time()
+        try:
+            with traced(name):
+                func()
+            status = "ok"
+        except Exception as e:
+            print("{}: {}".format(e.__class__.__name__, e))
+            status = "failed"
+        finally:
+            output.finish()
+            text = _task.output.getvalue()
+            _task.output = None
+        return status, text, time.time() - start
+
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            running = {}
+            while pending or running:
+                for name, (func, deps) in list(pending.items()):
+                    if any(results[d][0] != "ok" for d in deps if d in results):
+                        results[name] = ("skipped", "", 0.0)
+                        del pending[name]
+                    elif all(d in results for d in deps):
+                        running[executor.submit(execute, name, func)] = name
+                        del pending[name]
+                if not running:
+                    if pending:
+                        raise Exception(
+                            "Cyclic dependencies: {}".format(sorted(pending))
+                        )
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+    finally:
+        sys.stdout = stdout
+    return {name: results[name] for name, _, _ in tasks}
+
+
+def print_task_results(results):
+    """Prints status of every task (their output was streamed already);
+    returns number of tasks that failed"""
+    failed = 0
+    for name, (status, _, duration) in results.items():
+        print("==== {} [{}, {:.1f}s] ====".format(name, status, duration))
+        if status != "ok":
+            failed += 1
+    return failed
+
+
 def main():
 
     package_name = "{{ cookiecutter.package_name }}"
@@ -124,17 +376,27 @@ def main():
     if not os.path.exists(init_file):
         Path(init_file).touch()
 
+    # independent steps run concurrently (e.g. pre-commit hook environments
+    # are built while the virtualenv is being installed); total time is close
+    # to the longest chain (virtualenv -> pre-commit)
+    tasks = []
     if "{{ cookiecutter.run_virtualenv_install }}" == "y":
-        install_virtualenv()
+        tasks.append(("virtualenv", install_virtualenv, []))
 
     if "{{ cookiecutter.initial_commit }}" == "y":
-        initial_commit()
+        tasks.append(("initial_commit", initial_commit, []))
 
     if "{{ cookiecutter.setup_github }}" == "y":
-        setup_github()
+        tasks.append(("setup_github", setup_github, []))
 
     if "{{ cookiecutter.setup_pre_commit }}" == "y":
-        setup_pre_commit()
+        tasks.append(("pre_commit_environments", prewarm_pre_commit, []))
+        tasks.append(
+            ("setup_pre_commit", setup_pre_commit, ["virtualenv", "initial_commit"])
+        )
+
+    if tasks and print_task_results(run_tasks(tasks)):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+
+from click.testing import CliRunner
+
+from {{ cookiecutter.package_name }} import cli
+
+# cumulative import time of {{ cookiecutter.package_name }}.cli (microseconds)
+IMPORT_BUDGET = 200000
+HEAVY_MODULES = ("lvtn_utils",)
+
+
+def test_cold_startup():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            "from {{ cookiecutter.package_name }}.cli import cli",
+        ],
+        cwd=root,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    imported = {}
+    for line in result.stderr.splitlines()[1:]:
+        _, cumulative, name = line.split("|")
+        imported[name.strip()] = int(cumulative)
+
+    assert not [x for x in imported if x.split(".")[0] in HEAVY_MODULES]
+    assert not [x for x in imported if ".commands." in x]
+    assert imported["{{ cookiecutter.package_name }}.cli"] < IMPORT_BUDGET
+
+
+def test_hello():
+    result = CliRunner().invoke(cli.cli, ["hello"])
+    assert result.exit_code == 0
+    assert result.output == "Hello World!\n"
+
+
+def test_help():
+    result = CliRunner().invoke(cli.cli, ["--help"])
+    assert result.exit_code == 0
+    assert "hello" in result.output
@@ -1,26 +1,41 @@
+import importlib
+
 import click
 
-try:
-    import lvtn_utils as utils
+# subcommands are imported only when they are run (or their help is shown);
+# `{{ cookiecutter.package_name }} --help` must stay fast. A command lives in
+# its own module inside {{ cookiecutter.package_name }}/commands (exposing
+# `command`) and keeps its heavy imports inside the function
+COMMANDS = {
+    "hello": "{{ cookiecutter.package_name }}.commands.hello",
+}
 
-    config = utils.load_config()
-    logger = utils.setup_logging("{{cookiecutter.package_name}}.cli")
-except ImportError:
-    import logging
+# these names are still reachable as attributes of this module
+LAZY_ATTRIBUTES = ("config", "logger")
 
-    config = {}
-    logger = logging.getLogger("{{cookiecutter.package_name}}.cli")
 
+def __getattr__(name):
+    if name in LAZY_ATTRIBUTES:
+        from {{ cookiecutter.package_name }} import config
+
+        return config.get_config() if name == "config" else config.get_logger()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
-@click.group()
-def cli():
-    pass
 
+class LazyGroup(click.Group):
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(COMMANDS))
 
-@cli.command()
-def hello():
-    """Will greet"""
-    print("Hello World!")
+    def get_command(self, ctx, name):
+        if name in COMMANDS and name not in self.commands:
+            module = importlib.import_module(COMMANDS[name])
+            self.add_command(module.command, name)
+        return super().get_command(ctx, name)
+
+
+@click.group(cls=LazyGroup)
+def cli():
+    pass
 
 
 if __name__ == "__main__":
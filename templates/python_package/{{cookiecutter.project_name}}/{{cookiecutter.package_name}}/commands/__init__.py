@@ -0,0 +1 @@
+"""Subcommands of the cli (see cli.COMMANDS), one module each"""
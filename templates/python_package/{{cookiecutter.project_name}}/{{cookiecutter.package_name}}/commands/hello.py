@@ -0,0 +1,7 @@
+import click
+
+
+@click.command()
+def command():
+    """Will greet"""
+    print("Hello World!")
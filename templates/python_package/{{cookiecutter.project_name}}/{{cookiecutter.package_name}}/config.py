@@ -0,0 +1,25 @@
+"""
+Configuration and logging; loaded on first use (not at import), once
+"""
+
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def get_config():
+    try:
+        import lvtn_utils as utils
+    except ImportError:
+        return {}
+    return utils.load_config()
+
+
+@lru_cache(maxsize=None)
+def get_logger(name="{{ cookiecutter.package_name }}.cli"):
+    try:
+        import lvtn_utils as utils
+    except ImportError:
+        import logging
+
+        return logging.getLogger(name)
+    return utils.setup_logging(name)
@@ -0,0 +1,12 @@
+import os
+import sys
+
+# hooks of the template are tested as the "hooks" package
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "templates",
+        "python_package",
+    ),
+)
@@ -1,9 +1,9 @@
 import os
-import re
 from pathlib import Path
 
 import pytest
-from binaryornot.check import is_binary
+
+from acutter.lint import scan_paths
 
 
 @pytest.fixture
@@ -19,20 +19,13 @@ def base_context():
     }
 
 
-RE_OBJ = re.compile(r"{{(\s?cookiecutter)[.](.*?)}}")
-
-
 def check_paths(paths):
     """Method to check all paths have correct substitutions."""
     # Assert that no match is found in any of the files
-    for path in paths:
-        if is_binary(str(path)):
-            continue
-
-        with path.open() as fd:
-            content = fd.read()
-            match = RE_OBJ.search(content)
-            assert match is None, f"cookiecutter variable not replaced in {path}"
+    problems = scan_paths([str(path) for path in paths])
+    assert not problems, "cookiecutter variable not replaced in {}".format(
+        ", ".join("{}:{}".format(path, lineno) for path, lineno, _ in problems)
+    )
 
 
 def test_generate_project(
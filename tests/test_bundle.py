@@ -0,0 +1,100 @@
+import filecmp
+
+import pytest
+from click.testing import CliRunner
+
+from acutter import bundle, cli, render
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("ACUTTER_CACHE_DIR", str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def packed(tmp_path):
+    output = str(tmp_path / "python_package.acutter")
+    result = CliRunner().invoke(
+        cli.cli, ["pack-template", "python_package", "--output", output]
+    )
+    assert result.exit_code == 0, result.output
+    return output
+
+
+def test_bundle_source(packed):
+    templatedir = cli.get_templatedir("python_package")
+    directory = bundle.DirectorySource(templatedir)
+    source = bundle.open_source(packed)
+
+    assert source.name == "python_package"
+    assert source.listdir() == [
+        "cookiecutter.json",
+        "hooks",
+        "{{cookiecutter.project_name}}",
+    ]
+    assert render.find_project_template(source) == "{{cookiecutter.project_name}}"
+    for relpath in directory.iter_files():
+        if "__pycache__" in relpath:
+            continue
+        assert source.read(relpath) == directory.read(relpath)
+        assert source.mode(relpath) == directory.mode(relpath)
+    assert cli.get_templatedir(packed).path == packed
+
+
+def test_render_from_bundle(tmp_path, packed):
+    templatedir = cli.get_templatedir("python_package")
+    extra = {"project_name": "bundled-project"}
+
+    from_dir, _, _, _ = render.render_project(
+        templatedir,
+        render.build_context(templatedir, extra),
+        str(tmp_path / "dir"),
+    )
+    from_bundle, manifest, _, _ = render.render_project(
+        packed, render.build_context(packed, extra), str(tmp_path / "bundle")
+    )
+
+    assert manifest["template"] == "python_package"
+    comparison = filecmp.dircmp(from_dir, from_bundle)
+    assert not comparison.diff_files
+    assert not comparison.left_only and not comparison.right_only
+
+
+def test_stale_bundle(tmp_path):
+    import shutil
+
+    templatedir = tmp_path / "template"
+    shutil.copytree(cli.get_templatedir("python_package"), str(templatedir))
+    packed = str(tmp_path / "template.acutter")
+    bundle.pack(str(templatedir), packed)
+    source = cli.get_templatedir(packed)
+    assert source.stale_source() is None
+    assert bundle.changed_files(source) == []
+
+    # only the thorough check notices edits
+    config = templatedir / "cookiecutter.json"
+    config.write_text(config.read_text().replace("0.0.1", "0.0.2"))
+    assert bundle.changed_files(source) == ["cookiecutter.json"]
+    assert cli.get_templatedir(packed).path == packed
+
+    # an added (or removed) file of the top level is noticed when it's used
+    (templatedir / "NEW.md").write_text("new\n")
+    assert bundle.Bundle(packed).stale_source() == str(templatedir)
+    assert cli.get_templatedir(packed) == str(templatedir)
+
+    bundle.pack(str(templatedir), packed)
+    assert "0.0.2" in cli.get_templatedir(packed).read("cookiecutter.json").decode()
+
+
+def test_bundle_opened_once(tmp_path, packed, mocker):
+    source = cli.get_templatedir(packed)
+    opened = mocker.spy(bundle.Bundle, "__init__")
+
+    render.render_project(
+        source,
+        render.build_context(source, {"project_name": "once"}),
+        str(tmp_path),
+        post_hook=False,
+    )
+
+    assert opened.call_count == 0
@@ -0,0 +1,383 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+from click.testing import CliRunner
+from cookiecutter.main import cookiecutter
+
+from acutter import cli, render
+
+# cumulative import time of acutter.cli (microseconds)
+IMPORT_BUDGET = 250000
+HEAVY_MODULES = ("cookiecutter", "jinja2", "pkg_resources", "toml", "slugify")
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "cache"
+    monkeypatch.setenv("ACUTTER_CACHE_DIR", str(directory))
+    return directory
+
+
+@pytest.fixture
+def make_project(tmp_path):
+    def _make(name):
+        return cookiecutter(
+            cli.get_templatedir("python_package"),
+            no_input=True,
+            extra_context={"project_name": name},
+            output_dir=str(tmp_path),
+        )
+
+    return _make
+
+
+def test_collect_folders(tmp_path):
+    for name in ("one", "two", "three"):
+        (tmp_path / name).mkdir()
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text("# comment\n\n{}\n".format(tmp_path / "three"))
+
+    folders = cli.collect_folders(
+        [str(tmp_path / "t*"), str(tmp_path / "one")], str(manifest)
+    )
+
+    assert folders == [
+        str(tmp_path / "three"),
+        str(tmp_path / "two"),
+        str(tmp_path / "one"),
+    ]
+
+
+def test_update_all(tmp_path, make_project, mocker):
+    first = make_project("first-project")
+    second = make_project("second-project")
+    os.remove(os.path.join(first, "README.md"))
+    broken = tmp_path / "broken"
+    broken.mkdir()
+    renderer = mocker.spy(render, "Renderer")
+
+    result = CliRunner().invoke(
+        cli.cli, ["update-all", "--jobs", "1", first, second, str(broken)]
+    )
+
+    # one renderer (jinja environment) for all projects of the worker
+    assert renderer.call_count == 1
+    assert "OK     {}".format(first) in result.output
+    assert "OK     {}".format(second) in result.output
+    assert "FAILED {}".format(broken) in result.output
+    assert "Updated: 2, failed: 1" in result.output
+    assert result.exit_code != 0
+    assert os.path.exists(os.path.join(first, "README.md"))
+
+
+def test_update_uses_manifest(make_project):
+    project = make_project("manifest-project")
+    readme = os.path.join(project, "README.md")
+
+    cli.update_project(project, verbose=False)
+    manifest = render.load_manifest(project)
+    assert "README.md" in [
+        os.path.basename(x["path"]) for x in manifest["files"].values()
+    ]
+
+    with open(readme, "a") as fo:
+        fo.write("local change\n")
+    mtimes = {
+        x["path"]: os.stat(os.path.join(project, "..", x["path"])).st_mtime_ns
+        for x in manifest["files"].values()
+    }
+
+    # nothing changed in the template, nothing gets rendered or written
+    cli.update_project(project, verbose=False)
+    for path, mtime in mtimes.items():
+        assert os.stat(os.path.join(project, "..", path)).st_mtime_ns == mtime
+    with open(readme) as fi:
+        assert fi.read().endswith("local change\n")
+
+    # full update renders every file again; local changes are still merged
+    cli.update_project(project, verbose=False, full=True)
+    with open(readme) as fi:
+        assert fi.read().endswith("local change\n")
+    cli.update_project(project, verbose=False, full=True, three_way=False)
+    with open(readme) as fi:
+        assert not fi.read().endswith("local change\n")
+
+
+def test_provision(tmp_path):
+    folder = tmp_path / "legacy-project"
+    folder.mkdir()
+
+    result = CliRunner().invoke(cli.cli, ["provision", str(folder)], input="\n" * 30)
+
+    assert result.exit_code == 0, result.output
+    assert os.listdir(str(folder)) == ["pyproject.toml"]
+    content = (folder / "pyproject.toml").read_text()
+    assert 'name = "legacy_project"' in content
+    assert "cookiecutter" not in content
+
+
+def test_bytecode_cache(tmp_path, cache_dir):
+    templatedir = cli.get_templatedir("python_package")
+    context = render.build_context(templatedir, {"project_name": "cached"})
+
+    _, _, _, stats = render.render_project(templatedir, context, str(tmp_path / "a"))
+    assert stats["hits"] == 0
+    assert stats["misses"] > 0
+
+    _, _, _, stats2 = render.render_project(templatedir, context, str(tmp_path / "b"))
+    assert stats2 == {"hits": stats["misses"], "misses": 0}
+
+    result = CliRunner().invoke(cli.cli, ["cache", "clear"])
+    assert "Removed {} compiled template(s)".format(stats["misses"]) in result.output
+    assert not (cache_dir / "bytecode").exists()
+
+
+def test_cold_startup():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "acutter.cli", "--help"],
+        cwd=root,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert "update-all" in result.stdout
+
+    imported = []
+    total = 0
+    for line in result.stderr.splitlines()[1:]:
+        _, cumulative, name = line.split("|")
+        imported.append(name.strip())
+        # nested imports are indented (and counted in their parent's time)
+        if not name.startswith("   "):
+            total += int(cumulative)
+
+    assert not [x for x in imported if x.split(".")[0] in HEAVY_MODULES]
+    assert total < IMPORT_BUDGET
+
+
+def test_install_virtualenv(mocker, tmp_path):
+    mocker.patch("acutter.runner.command_exists", return_value=True)
+    runner_run = mocker.patch("acutter.runner.run")
+    prewarm = mocker.patch("acutter.precommit.prewarm")
+
+    cli.install_virtualenv(str(tmp_path), cache=False)
+
+    pip_calls = [
+        x
+        for x in runner_run.call_args_list
+        if x.args[0][:3] == [".venv/bin/python", "-m", "pip"]
+    ]
+    assert len(pip_calls) == 1
+    assert pip_calls[0].args[0][3:] == ["install", "-e", ".[dev,docs]"]
+    runner_run.assert_any_call(
+        ["virtualenv", ".venv"],
+        cwd=str(tmp_path),
+        prefix=None,
+        timeout=None,
+        capture_output=False,
+    )
+    prewarm.assert_called_once_with(str(tmp_path / ".pre-commit-config.yaml"))
+
+
+def test_update_dry_run(make_project):
+    project = make_project("dry-project")
+    cli.update_project(project, verbose=False)
+    readme = os.path.join(project, "README.md")
+    with open(readme, "a") as fo:
+        fo.write("local change\n")
+    os.remove(os.path.join(project, "LICENSE"))
+    before = {
+        name: os.stat(os.path.join(project, name)).st_mtime_ns
+        for name in os.listdir(project)
+    }
+
+    result = CliRunner().invoke(
+        cli.cli,
+        ["update", "--dry-run", "--full", "--overwrite", project],
+        catch_exceptions=False,
+    )
+
+    assert result.exit_code == 0, result.output
+    assert "--- a/README.md\n+++ b/README.md\n" in result.output
+    assert "-local change\n" in result.output
+    assert "--- /dev/null\n+++ b/LICENSE\n" in result.output
+    assert "2 file(s) would be updated" in result.output
+    assert before == {
+        name: os.stat(os.path.join(project, name)).st_mtime_ns
+        for name in os.listdir(project)
+    }
+
+
+def test_update_three_way(make_project):
+    project = make_project("three-way-project")
+    cli.update_project(project, verbose=False)
+    readme = os.path.join(project, "README.md")
+    with open(readme, "rb") as fi:
+        rendered = fi.read()
+
+    # the project was rendered from an older template (base), which had
+    # one more line; then README.md got changed locally
+    base = rendered + b"removed by template\n"
+    manifest = render.load_manifest(project)
+    for entry in manifest["files"].values():
+        if entry["path"].endswith("README.md"):
+            entry["output"] = render.file_hash(base)
+            render.threeway.store(entry["output"], base)
+    manifest["context"] = "older"
+    render.save_manifest(project, manifest)
+    with open(readme, "wb") as fo:
+        fo.write(b"local change\n" + base)
+
+    cli.update_project(project, verbose=False)
+
+    with open(readme, "rb") as fi:
+        assert fi.read() == b"local change\n" + rendered
+
+    # the base is gone (e.g. another machine): the local change is kept
+    with open(readme, "wb") as fo:
+        fo.write(b"local change\n" + base)
+    manifest = render.load_manifest(project)
+    for entry in manifest["files"].values():
+        if entry["path"].endswith("README.md"):
+            entry["output"] = render.file_hash(base)
+    manifest["context"] = "older"
+    render.save_manifest(project, manifest)
+    render.threeway.clear()
+
+    cli.update_project(project, verbose=False)
+
+    with open(readme, "rb") as fi:
+        assert fi.read() == b"local change\n" + base
+
+
+def test_update_dry_run_merge(make_project, cache_dir, mocker):
+    project = make_project("dry-merge-project")
+    cli.update_project(project, verbose=False)
+    readme = os.path.join(project, "README.md")
+    with open(readme, "rb") as fi:
+        rendered = fi.read()
+    base = rendered + b"removed by template\n"
+    manifest = render.load_manifest(project)
+    for entry in manifest["files"].values():
+        if entry["path"].endswith("README.md"):
+            entry["output"] = render.file_hash(base)
+            render.threeway.store(entry["output"], base)
+    manifest["context"] = "older"
+    render.save_manifest(project, manifest)
+    with open(readme, "wb") as fo:
+        fo.write(b"local change\n" + base)
+    shutil.rmtree(str(cache_dir / "bytecode"))
+    mocker.patch("tempfile.TemporaryDirectory", side_effect=AssertionError)
+
+    result = CliRunner(mix_stderr=False).invoke(
+        cli.cli, ["update", "--dry-run", project], catch_exceptions=False
+    )
+
+    assert result.exit_code == 0, result.output
+    assert "README.md: has local changes" in result.stderr
+    assert "-removed by template\n" in result.stderr
+    assert "+++ b/README.md" not in result.stdout
+    assert "1 file(s) would be updated" in result.stdout
+    assert not (cache_dir / "bytecode").exists()
+
+
+def test_create_from_manifest(tmp_path):
+    answers = {"run_virtualenv_install": "n", "initial_commit": "n"}
+    answers["setup_pre_commit"] = "n"
+    (tmp_path / "exists").mkdir()
+    rows = [
+        dict(answers, folder=str(tmp_path / "first-project")),
+        dict(answers, folder=str(tmp_path / "exists")),
+        dict(answers, folder=str(tmp_path / "second"), version="1.2.3"),
+    ]
+    manifest = tmp_path / "projects.json"
+    manifest.write_text(json.dumps(rows))
+    csv_manifest = tmp_path / "projects.csv"
+    csv_manifest.write_text(
+        "folder,private_or_public,run_virtualenv_install,initial_commit,setup_pre_commit\n"
+        "{},private,n,n,n\n".format(tmp_path / "third")
+    )
+
+    result = CliRunner().invoke(cli.cli, ["create", "--from", str(manifest)])
+
+    assert "OK     {}".format(tmp_path / "first-project") in result.output
+    assert "OK     {}".format(tmp_path / "second") in result.output
+    assert "FAILED {}".format(tmp_path / "exists") in result.output
+    assert "Created: 2, failed: 1" in result.output
+    assert result.exit_code != 0
+    content = (tmp_path / "second" / "pyproject.toml").read_text()
+    assert 'version = "1.2.3"' in content
+    assert (tmp_path / "first-project" / "first_project" / "__init__.py").exists()
+
+    result = CliRunner().invoke(cli.cli, ["create", "--from", str(csv_manifest)])
+    assert result.exit_code == 0, result.output
+    assert (tmp_path / "third" / "pyproject.toml").exists()
+
+    rows = [
+        dict(answers, folder=str(tmp_path / "dup")),
+        dict(answers, folder=str(tmp_path / "x" / ".." / "dup"), version="2"),
+    ]
+    manifest.write_text(json.dumps(rows))
+    result = CliRunner().invoke(cli.cli, ["create", "--from", str(manifest)])
+    assert result.exit_code != 0
+    assert "Listed more than once: {}".format(tmp_path / "dup") in str(result.exception)
+    assert not (tmp_path / "dup").exists()
+
+
+def test_docs(mocker, tmp_path, monkeypatch):
+    runner_run = mocker.patch("acutter.runner.run")
+    monkeypatch.chdir(tmp_path)
+
+    result = CliRunner().invoke(cli.cli, ["docs"])
+    assert result.exit_code != 0
+    assert "root directory of a project" in str(result.exception)
+
+    (tmp_path / "pyproject.toml").write_text("")
+    result = CliRunner().invoke(cli.cli, ["docs", "-j", "2"], catch_exceptions=False)
+    assert result.exit_code == 0, result.output
+    args = runner_run.call_args.args[0]
+    assert args == ["sphinx-build", "-j", "2", "-d", cli.DOCTREES, "docs", ".docs"]
+
+
+def test_docs_watch_paths(tmp_path):
+    docs = str(tmp_path / "docs")
+    assert cli.docs_watch_paths(str(tmp_path)) == [docs]
+
+    (tmp_path / "my_package").mkdir()
+    (tmp_path / "pyproject.toml").write_text('[project]\nname = "my-package"\n')
+    package = str(tmp_path / "my_package")
+    assert cli.docs_watch_paths(str(tmp_path)) == [docs, package]
+
+    (tmp_path / "pyproject.toml").write_text(
+        "[project]\n"
+        'name = "other"\n'
+        'repository = "https://github.com/someone/my-package"\n'
+        'packages = ["my_package"]\n'
+    )
+    assert cli.docs_watch_paths(str(tmp_path)) == [docs, package]
+
+
+def test_build_context_user_defaults(tmp_path, monkeypatch):
+    config = tmp_path / "cookiecutterrc"
+    config.write_text(
+        "default_context:\n"
+        '    full_name: "Jeanne Deau"\n'
+        '    email: "jeanne.deau@example.fr"\n'
+        '    open_source_license: "no such license"\n'
+    )
+    monkeypatch.setenv("COOKIECUTTER_CONFIG", str(config))
+    templatedir = cli.get_templatedir("python_package")
+
+    with pytest.warns(UserWarning, match="Invalid default"):
+        context = render.build_context(
+            templatedir, {"project_name": "defaults", "email": "other@example.fr"}
+        )
+
+    assert context["cookiecutter"]["full_name"] == "Jeanne Deau"
+    # extra context wins over the user's defaults
+    assert context["cookiecutter"]["email"] == "other@example.fr"
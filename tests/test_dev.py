@@ -0,0 +1,78 @@
+import json
+import os
+
+import pytest
+
+from acutter import dev
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("ACUTTER_CACHE_DIR", str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def template(tmp_path):
+    root = tmp_path / "template"
+    project = root / "{{cookiecutter.name}}"
+    (project / "pkg").mkdir(parents=True)
+    (root / "hooks").mkdir()
+    (root / "cookiecutter.json").write_text(json.dumps({"name": "sample"}))
+    (project / "README.md").write_text("# {{ cookiecutter.name }}\n")
+    (project / "pkg" / "__init__.py").write_text("NAME = '{{ cookiecutter.name }}'\n")
+    # every run of the hook is logged
+    (root / "hooks" / "post_gen_project.py").write_text(
+        "with open('hook.log', 'a') as fo:\n    fo.write('ran\\n')\n"
+    )
+    return root
+
+
+def hook_runs(project_dir):
+    with open(os.path.join(project_dir, "hook.log")) as fi:
+        return len(fi.readlines())
+
+
+def test_partial_render(template, tmp_path):
+    output = tmp_path / "output"
+    renderer, project_dir, written = dev.render_all(str(template), str(output), {})
+    assert len(written) == 2
+    assert hook_runs(project_dir) == 1
+
+    readme = template / "{{cookiecutter.name}}" / "README.md"
+    readme.write_text("# {{ cookiecutter.name }} changed\n")
+    renderer, result = dev.apply_changes(renderer, str(output), {}, [str(readme)])
+    assert result == {
+        "written": [os.path.join(project_dir, "README.md")],
+        "removed": [],
+        "hook": False,
+    }
+    with open(os.path.join(project_dir, "README.md")) as fi:
+        assert fi.read() == "# sample changed\n"
+    assert hook_runs(project_dir) == 1
+
+    os.remove(readme)
+    renderer, result = dev.apply_changes(renderer, str(output), {}, [str(readme)])
+    assert result["removed"] == [os.path.join(project_dir, "README.md")]
+    with open(os.path.join(project_dir, ".acutter-manifest.json")) as fi:
+        assert list(json.load(fi)["files"]) == [
+            os.path.join("{{cookiecutter.name}}", "pkg", "__init__.py")
+        ]
+
+    hook = template / "hooks" / "post_gen_project.py"
+    hook.write_text(hook.read_text() + "# changed\n")
+    renderer, result = dev.apply_changes(renderer, str(output), {}, [str(hook)])
+    assert result == {"written": [], "removed": [], "hook": True}
+    assert hook_runs(project_dir) == 2
+
+
+def test_config_change_renders_everything(template, tmp_path):
+    output = tmp_path / "output"
+    renderer, project_dir, _ = dev.render_all(str(template), str(output), {})
+
+    config = template / "cookiecutter.json"
+    config.write_text(json.dumps({"name": "sample", "extra": "x"}))
+    new, result = dev.apply_changes(renderer, str(output), {}, [str(config)])
+    assert new is not renderer
+    assert "extra" in new.context["cookiecutter"]
+    assert result["hook"]
+    assert hook_runs(project_dir) == 2
@@ -2,15 +2,43 @@ from subprocess import CalledProcessError
 
 import pytest
 
+from acutter import runner
+from hooks import post_gen_project
 from hooks.post_gen_project import (
+    COMMAND_TIMEOUT,
+    PROBE_TIMEOUT,
     check_command_exists,
     initial_commit,
     install_virtualenv,
+    prewarm_pre_commit,
+    run_cmd,
+    run_tasks,
     setup_github,
     setup_pre_commit,
 )
 
 
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("ACUTTER_CACHE_DIR", str(tmp_path / "cache"))
+
+
+@pytest.fixture(autouse=True)
+def probes():
+    post_gen_project._probed.clear()
+    runner.clear_probes()
+    yield
+    post_gen_project._probed.clear()
+    runner.clear_probes()
+
+
+@pytest.fixture
+def subprocess_run(mocker):
+    """Commands run without acutter's runner (acutter isn't installed)"""
+    mocker.patch("hooks.post_gen_project.load_runner", return_value=None)
+    return mocker.patch("subprocess.run")
+
+
 @pytest.mark.parametrize(
     "side_effect",
     [
@@ -18,52 +46,92 @@ from hooks.post_gen_project import (
         CalledProcessError(1, ""),
     ],
 )
-def test_check_command_exists(mocker, side_effect):
-    subprocess_run = mocker.patch("subprocess.run", side_effect=side_effect)
+def test_check_command_exists(subprocess_run, side_effect):
+    subprocess_run.side_effect = side_effect
 
     assert check_command_exists("something") is False
 
-    subprocess_run.assert_any_call(["something", "-h"], check=True, capture_output=True)
+    subprocess_run.assert_any_call(
+        ["something", "-h"], check=True, timeout=PROBE_TIMEOUT, capture_output=True
+    )
+
+
+def test_check_command_exists_probes_once(subprocess_run):
+    assert check_command_exists("something") is True
+    assert check_command_exists("something") is True
+
+    assert subprocess_run.call_count == 1
+
+
+def test_commands_use_acutter_runner(mocker):
+    runner_run = mocker.patch("acutter.runner.run")
+    command_exists = mocker.patch("acutter.runner.command_exists", return_value=True)
+
+    setup_pre_commit()
+
+    command_exists.assert_called_once_with(".venv/bin/pre-commit")
+    runner_run.assert_called_once_with([".venv/bin/pre-commit", "install"])
+
+
+def test_command_timeout(mocker, monkeypatch):
+    mocker.patch("hooks.post_gen_project.load_runner", return_value=None)
+    monkeypatch.setenv("ACUTTER_COMMAND_TIMEOUT", "0.5")
+
+    def hang():
+        run_cmd(["sleep", "30"])
+
+    results = run_tasks([("hang", hang, [])])
+
+    status, output, duration = results["hang"]
+    assert status == "failed"
+    assert "TimeoutExpired" in output
+    assert duration < 10
 
 
-def test_run_virtualenv_install(mocker):
-    subprocess_run = mocker.patch("subprocess.run")
+def test_run_virtualenv_install(subprocess_run):
 
     install_virtualenv()
 
-    subprocess_run.assert_any_call(["virtualenv", ".venv"], check=True)
+    subprocess_run.assert_any_call(
+        ["virtualenv", ".venv"], check=True, timeout=COMMAND_TIMEOUT
+    )
 
 
-def test_initial_commit(mocker):
-    subprocess_run = mocker.patch("subprocess.run")
+def test_initial_commit(subprocess_run):
 
     initial_commit()
 
-    subprocess_run.assert_any_call(["git", "init"], check=True)
-    subprocess_run.assert_any_call(["git", "add", "."], check=True)
+    subprocess_run.assert_any_call(["git", "init"], check=True, timeout=COMMAND_TIMEOUT)
+    subprocess_run.assert_any_call(
+        ["git", "add", "."], check=True, timeout=COMMAND_TIMEOUT
+    )
     subprocess_run.assert_any_call(
-        ["git", "commit", "-m", "'feat: initial commit'"], check=True
+        ["git", "commit", "-m", "'feat: initial commit'"],
+        check=True,
+        timeout=COMMAND_TIMEOUT,
     )
 
 
-def test_setup_github(mocker):
-    subprocess_run = mocker.patch("subprocess.run")
+def test_setup_github(subprocess_run):
 
     setup_github()
 
-    subprocess_run.assert_any_call(["gh", "-h"], check=True, capture_output=True)
+    subprocess_run.assert_any_call(
+        ["gh", "-h"], check=True, timeout=PROBE_TIMEOUT, capture_output=True
+    )
     subprocess_run.assert_any_call(
         [
             "gh",
             "repo",
             "create",
-            "{{ cookiecutter.github_username }}/{{ cookiecutter.project_slug }}",
+            "{{ cookiecutter.github_username }}/{{ cookiecutter.project_name }}",
             "-d",
             "{{ cookiecutter.project_short_description }}",
-            "--public",
+            "--{{cookiecutter.private_or_public}}",
             "--disable-wiki",
         ],
         check=True,
+        timeout=COMMAND_TIMEOUT,
     )
     subprocess_run.assert_any_call(
         [
@@ -73,9 +141,10 @@ def test_setup_github(mocker):
             "PYPI_TOKEN",
             "-b'changeme'",
             "-R",
-            "{{ cookiecutter.github_username }}/{{ cookiecutter.project_slug }}",
+            "{{ cookiecutter.github_username }}/{{ cookiecutter.project_name }}",
         ],
         check=True,
+        timeout=COMMAND_TIMEOUT,
     )
     subprocess_run.assert_any_call(
         [
@@ -85,18 +154,79 @@ def test_setup_github(mocker):
             "GH_PAT",
             "-b'changeme'",
             "-R",
-            "{{ cookiecutter.github_username }}/{{ cookiecutter.project_slug }}",
+            "{{ cookiecutter.github_username }}/{{ cookiecutter.project_name }}",
         ],
         check=True,
+        timeout=COMMAND_TIMEOUT,
     )
 
 
-def test_setup_pre_commit(mocker):
-    subprocess_run = mocker.patch("subprocess.run")
+def test_setup_pre_commit(subprocess_run):
+    def run(args, **kwargs):
+        # there is no .venv
+        if args[0].startswith(".venv/"):
+            raise FileNotFoundError()
+
+    subprocess_run.side_effect = run
 
     setup_pre_commit()
 
     subprocess_run.assert_any_call(
-        ["pre-commit", "-h"], check=True, capture_output=True
+        ["pre-commit", "-h"], check=True, timeout=PROBE_TIMEOUT, capture_output=True
     )
-    subprocess_run.assert_any_call(["pre-commit", "install"], check=True)
+    subprocess_run.assert_any_call(
+        ["pre-commit", "install"], check=True, timeout=COMMAND_TIMEOUT
+    )
+
+
+def test_run_tasks(capsys):
+    order = []
+
+    def step(name, fail=False):
+        def run():
+            order.append(name)
+            print("running {}".format(name))
+            if fail:
+                raise Exception("{} failed".format(name))
+            run_cmd(["echo", name])
+
+        return run
+
+    results = run_tasks(
+        [
+            ("pre_commit", step("pre_commit"), ["venv", "git"]),
+            ("venv", step("venv"), []),
+            ("git", step("git"), ["missing"]),
+            ("github", step("github", fail=True), []),
+            ("after_github", step("after_github"), ["github"]),
+        ]
+    )
+
+    assert order.index("pre_commit") > max(order.index("venv"), order.index("git"))
+    assert "after_github" not in order
+    assert [(k, v[0]) for k, v in results.items()] == [
+        ("pre_commit", "ok"),
+        ("venv", "ok"),
+        ("git", "ok"),
+        ("github", "failed"),
+        ("after_github", "skipped"),
+    ]
+    assert results["venv"][1] == "running venv\n$ echo venv\nvenv\n"
+    assert results["github"][1] == "running github\nException: github failed\n"
+
+    # streamed as it comes, every line prefixed with the task
+    out = capsys.readouterr().out.splitlines()
+    assert out.index("[venv] running venv") < out.index("[venv] venv")
+    assert "[github] Exception: github failed" in out
+
+
+def test_prewarm_pre_commit_failure(mocker, capsys):
+    mocker.patch(
+        "acutter.precommit.prewarm",
+        side_effect=CalledProcessError(1, ["pre-commit", "install-hooks"]),
+    )
+
+    # only a warning, the task (and create) doesn't fail
+    prewarm_pre_commit()
+
+    assert "Warning: pre-commit hook environments" in capsys.readouterr().out
@@ -0,0 +1,90 @@
+import os
+
+from acutter import index
+
+PYPROJECT = """
+[project]
+name = "{name}"
+version = "0.1.0"
+description = "Project {name}"
+repository = "https://github.com/someone/{name}"
+packages = ["{name}"]
+dependencies = [
+    'click=={click}',
+    "lvtn_utils@ git+https://github.com/adsabs/lvtn-utils@main#egg=lvtn_utils",
+]
+
+[[project.authors]]
+name = "Jeanne Deau"
+email = "jeanne.deau@example.fr"
+
+[project.optional-dependencies]
+dev = ['pytest==6.2.5']
+
+[tool.acutter]
+template = "python_package"
+"""
+
+
+def write_project(root, name, click="8.0.3"):
+    folder = root / name
+    folder.mkdir(parents=True, exist_ok=True)
+    (folder / "pyproject.toml").write_text(PYPROJECT.format(name=name, click=click))
+    return folder
+
+
+def test_scan_and_query(tmp_path):
+    root = tmp_path / "projects"
+    write_project(root, "alpha")
+    write_project(root, "beta", click="8.1.0")
+    write_project(root / ".hidden", "gamma")
+    (root / "broken").mkdir()
+    (root / "broken" / "pyproject.toml").write_text("[project\n")
+    db = index.connect(str(tmp_path / "index.sqlite"))
+
+    stats = index.scan(db, str(root))
+    assert stats == dict(added=3, updated=0, unchanged=0, removed=0, errors=1)
+
+    rows = index.query(db, depends="click==8.0.3")
+    assert [(x["name"], req) for x, req in rows] == [("alpha", "click==8.0.3")]
+    assert rows[0][0]["package_name"] == "alpha"
+    assert rows[0][0]["email"] == "jeanne.deau@example.fr"
+    assert len(index.query(db, depends="Click")) == 2
+    assert len(index.query(db, depends="lvtn-utils")) == 2
+    assert len(index.query(db, depends="pytest==6.2.5")) == 2
+    assert len(index.query(db, template="python_package")) == 2
+    assert index.template_versions(db) == [("python_package", None, 2)]
+
+    # only changed projects are parsed again
+    write_project(root, "beta", click="8.0.3")
+    os.utime(root / "beta" / "pyproject.toml", ns=(1, 1))
+    (root / "alpha" / "pyproject.toml").unlink()
+    stats = index.scan(db, str(root))
+    assert stats == dict(added=0, updated=1, unchanged=1, removed=1, errors=0)
+    rows = index.query(db, depends="click==8.0.3")
+    assert [x["name"] for x, _ in rows] == ["beta"]
+    db.close()
+
+
+def test_cli_index(tmp_path, capsys):
+    from click.testing import CliRunner
+
+    from acutter import cli
+
+    write_project(tmp_path / "projects", "alpha")
+    args = [
+        "index",
+        str(tmp_path / "projects"),
+        "--db",
+        str(tmp_path / "index.sqlite"),
+        "--depends",
+        "click==8.0.3",
+    ]
+    result = CliRunner().invoke(cli.cli, args, catch_exceptions=False)
+    assert result.exit_code == 0, result.output
+    assert "added: 1" in result.output
+    assert "1 project(s)" in result.output
+
+    result = CliRunner().invoke(cli.cli, args + ["--no-scan"], catch_exceptions=False)
+    assert "Indexed" not in result.output
+    assert "1 project(s)" in result.output
@@ -0,0 +1,50 @@
+import os
+import shutil
+
+from click.testing import CliRunner
+
+from acutter import cli, lint
+
+
+def test_scan_file(tmp_path):
+    text = tmp_path / "text.md"
+    text.write_text(
+        "fine\n{{ cookiecutter.project_name }} and {{cookiecutter.email}}\n"
+        "{{ secrets.TOKEN }}\n{%- if cookiecutter.setup_github == 'y' %}\n"
+    )
+    binary = tmp_path / "image.png"
+    binary.write_bytes(b"\x89PNG\0{{ cookiecutter.project_name }}")
+    empty = tmp_path / "empty.txt"
+    empty.write_text("")
+
+    assert lint.scan_file(str(text)) == [
+        (2, "{{ cookiecutter.project_name }} and {{cookiecutter.email}}"),
+        (4, "{%- if cookiecutter.setup_github == 'y' %}"),
+    ]
+    assert lint.scan_file(str(binary)) == []
+    assert lint.scan_file(str(empty)) == []
+
+
+def test_lint_template(tmp_path, monkeypatch):
+    monkeypatch.setenv("ACUTTER_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(cli, "TEMPLATEDIR", str(tmp_path / "templates"))
+    templatedir = tmp_path / "templates" / "broken"
+    shutil.copytree(
+        os.path.join(
+            os.path.dirname(cli.__file__), "..", "templates", "python_package"
+        ),
+        str(templatedir),
+    )
+    project = templatedir / "{{cookiecutter.project_name}}"
+    (project / "broken.txt").write_text(
+        "ok\n{% raw %}{{ cookiecutter.version }}{% endraw %}\n"
+    )
+
+    result = CliRunner().invoke(cli.cli, ["lint-template", "broken"])
+    assert result.exit_code != 0
+    assert "broken.txt:2: {{ cookiecutter.version }}" in result.output
+    assert "1 unreplaced variable(s) in 1 file(s)" in str(result.exception)
+
+    (project / "broken.txt").unlink()
+    result = CliRunner().invoke(cli.cli, ["lint-template", "broken"])
+    assert result.exit_code == 0, result.output
@@ -0,0 +1,55 @@
+import os
+import shutil
+
+from click.testing import CliRunner
+
+from acutter import cli, matrix
+
+
+def test_combinations():
+    variables = matrix.choice_variables(cli.get_templatedir("python_package"))
+
+    assert variables["private_or_public"] == ["public", "private"]
+    assert variables["setup_github"] == ["y", "n"]
+    assert "github_username" not in variables
+    assert len(variables["open_source_license"]) == 4
+
+    combos = matrix.combinations(variables)
+    assert len(combos) == 2 * 4 * 2**4
+    assert matrix.combinations(variables, sample=5, seed=1) == matrix.combinations(
+        variables, sample=5, seed=1
+    )
+    assert len(matrix.combinations(variables, sample=5)) == 5
+
+
+def test_bake_matrix(tmp_path, monkeypatch):
+    monkeypatch.setenv("ACUTTER_CACHE_DIR", str(tmp_path / "cache"))
+    result = CliRunner().invoke(
+        cli.cli, ["bake-matrix", "--sample", "4", "--jobs", "2"]
+    )
+    assert result.exit_code == 0, result.output
+    assert "Baked: 4, failed: 0" in result.output
+
+    # a hook that doesn't compile with some of the answers
+    templatedir = tmp_path / "broken"
+    shutil.copytree(cli.get_templatedir("python_package"), str(templatedir))
+    hook = templatedir / "hooks" / "post_gen_project.py"
+    hook.write_text(
+        "{% if cookiecutter.setup_github == 'y' %}def broken(:{% endif %}\n"
+        + hook.read_text()
+    )
+    combos = [{"setup_github": "y"}, {"setup_github": "n"}]
+    results = matrix.bake_matrix(str(templatedir), combos, jobs=1)
+
+    assert results[0][0] == {"setup_github": "y"}
+    assert results[0][1].startswith("SyntaxError")
+    assert results[1][1] is None
+    assert results[1][3] == len(
+        [
+            x
+            for _, _, files in os.walk(
+                str(templatedir / "{{cookiecutter.project_name}}")
+            )
+            for x in files
+        ]
+    )
@@ -0,0 +1,122 @@
+from collections import OrderedDict
+
+import pytest
+import toml
+
+from acutter.merge import merge_old_new, merge_requirements, merge_text
+from acutter.requirements import Requirement, canonical_name
+
+
+@pytest.mark.parametrize(
+    "line,key,extras,specifier,url,marker",
+    [
+        ("click==8.0.3", "click", (), "==8.0.3", None, None),
+        (
+            "Foo_Bar.baz[x, a] >= 1.0 ; python_version<'3.8'",
+            "foo-bar-baz",
+            ("a", "x"),
+            ">=1.0",
+            None,
+            'python_version < "3.8"',
+        ),
+        (
+            "lvtn_utils@ git+https://github.com/adsabs/lvtn-utils@main#egg=lvtn_utils",
+            "lvtn-utils",
+            (),
+            "",
+            "git+https://github.com/adsabs/lvtn-utils@main#egg=lvtn_utils",
+            None,
+        ),
+        ("pkg (>=1, <2)", "pkg", (), ">=1,<2", None, None),
+    ],
+)
+def test_requirement(line, key, extras, specifier, url, marker):
+    req = Requirement(line)
+
+    assert req.key == key
+    assert req.extras == extras
+    assert req.specifier == specifier
+    assert req.url == url
+    assert req.marker == marker
+    assert str(req) == line
+
+
+def test_canonical_name():
+    assert canonical_name("Sphinx_RTD.theme") == "sphinx-rtd-theme"
+
+
+def test_merge_requirements():
+    old = [
+        "Click==7.0",
+        "requests",
+        "numpy; python_version < '3.8'",
+        "# a comment",
+    ]
+    new = ["click==8.0.3", "lvtn_utils", "numpy==1.22"]
+
+    assert merge_requirements(old, new) == [
+        "click==8.0.3",
+        "numpy==1.22",
+        "requests",
+        "numpy; python_version < '3.8'",
+    ]
+
+
+def test_merge_old_new(tmp_path):
+    oldtoml = OrderedDict(
+        project=OrderedDict(
+            dependencies=["click==7.0", "requests"],
+            **{
+                "optional-dependencies": OrderedDict(
+                    dev=["pytest==6.0"], test=["hypothesis"]
+                )
+            }
+        )
+    )
+    inputfile = tmp_path / "pyproject.toml"
+    inputfile.write_text(
+        "[project]\n"
+        'dependencies = ["click==8.0.3", "lvtn_utils"]\n'
+        "[project.optional-dependencies]\n"
+        'dev = ["pytest==6.2.5", "black==22.3.0"]\n'
+        'docs = ["Sphinx==4.3.1"]\n'
+    )
+
+    merge_old_new(oldtoml, str(inputfile))
+
+    project = toml.load(str(inputfile))["project"]
+    assert project["dependencies"] == ["click==8.0.3", "requests"]
+    assert project["optional-dependencies"] == {
+        "dev": ["pytest==6.2.5"],
+        "docs": ["Sphinx==4.3.1"],
+        "test": ["hypothesis"],
+    }
+
+
+def test_merge_text_unusual_keys():
+    oldtoml = OrderedDict(
+        project=OrderedDict(
+            dependencies=["requests"],
+            **{"optional-dependencies": OrderedDict([("a=b", ["hypothesis"])])}
+        )
+    )
+    text = (
+        "[project]\n"
+        'dependencies = ["click==8.0.3"]\n'
+        "[project.optional-dependencies]\n"
+        '"a=b" = ["pytest==6.2.5"]\n'
+    )
+
+    merged, count = merge_text(oldtoml, text)
+    assert count == 2
+    assert toml.loads(merged)["project"]["optional-dependencies"][
+        "a=b"
+    ] == merge_requirements(["hypothesis"], ["pytest==6.2.5"])
+
+    # the patcher can't read the document: the whole toml is dumped instead
+    merged, count = merge_text(oldtoml, text + '"\\U0001F600" = ["x"]\n')
+    project = toml.loads(merged)["project"]
+    assert project["dependencies"] == merge_requirements(["requests"], ["click==8.0.3"])
+    assert project["optional-dependencies"]["a=b"] == merge_requirements(
+        ["hypothesis"], ["pytest==6.2.5"]
+    )
@@ -0,0 +1,90 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+from acutter import precommit
+
+TEMPLATE_CONFIG = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "templates",
+    "python_package",
+    "{{cookiecutter.project_name}}",
+    ".pre-commit-config.yaml",
+)
+
+
+def test_config_revisions():
+    revisions = precommit.config_revisions(TEMPLATE_CONFIG)
+
+    assert ("https://github.com/psf/black", "22.3.0") in revisions
+    assert ("https://github.com/jorisroovers/gitlint", "v0.17.0") in revisions
+    assert len(revisions) == 6
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """pre-commit's store; install-hooks (mocked) fills its db"""
+    monkeypatch.setenv("ACUTTER_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("PRE_COMMIT_HOME", str(tmp_path / "store"))
+
+    def install(config):
+        os.makedirs(str(tmp_path / "store"), exist_ok=True)
+        conn = sqlite3.connect(str(tmp_path / "store" / "db.db"))
+        conn.execute("CREATE TABLE IF NOT EXISTS repos (repo, ref, path)")
+        for repo, rev in precommit.config_revisions(config):
+            path = tmp_path / "store" / "repo{}".format(abs(hash(repo)))
+            path.mkdir(exist_ok=True)
+            conn.execute(
+                "INSERT INTO repos VALUES (?, ?, ?)", (repo + ":dep", rev, str(path))
+            )
+        conn.commit()
+        conn.close()
+
+    return install
+
+
+def test_prewarm_once(mocker, store):
+    mocker.patch("shutil.which", return_value="/usr/bin/pre-commit")
+
+    def run(args, **kwargs):
+        if args[:2] == ["pre-commit", "install-hooks"]:
+            store(args[-1])
+
+    runner_run = mocker.patch("acutter.runner.run", side_effect=run)
+
+    assert not precommit.is_warm(TEMPLATE_CONFIG)
+    assert precommit.prewarm(TEMPLATE_CONFIG)
+    assert precommit.is_warm(TEMPLATE_CONFIG)
+    assert precommit.prewarm(TEMPLATE_CONFIG)
+
+    commands = [x.args[0] for x in runner_run.call_args_list]
+    assert commands == [
+        ["git", "init", "-q"],
+        ["pre-commit", "install-hooks", "--config", TEMPLATE_CONFIG],
+    ]
+
+
+def test_warm_key(tmp_path, store):
+    config = tmp_path / ".pre-commit-config.yaml"
+    with open(TEMPLATE_CONFIG) as fi:
+        config.write_text(fi.read())
+    store(str(config))
+    marker = precommit.marker_path(precommit.environments_key(str(config)))
+    os.makedirs(os.path.dirname(marker))
+    with open(marker, "w") as fo:
+        fo.write("{}")
+    assert precommit.is_warm(str(config))
+
+    # other hook settings, other environments
+    config.write_text(
+        config.read_text() + "        additional_dependencies: [flake8-bugbear]\n"
+    )
+    assert not precommit.is_warm(str(config))
+
+    # pre-commit clean
+    shutil.rmtree(str(tmp_path / "store"))
+    config.write_text(config.read_text().rsplit("        additional", 1)[0])
+    assert os.path.exists(marker)
+    assert not precommit.is_warm(str(config))
@@ -0,0 +1,121 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from acutter import runner
+
+
+@pytest.fixture(autouse=True)
+def probes():
+    runner.clear_probes()
+    yield
+    runner.clear_probes()
+
+
+def python(code):
+    return [sys.executable, "-c", code]
+
+
+def test_run_capture():
+    result = runner.run(
+        python("import sys; print('out'); print('err', file=sys.stderr)"),
+        capture_output=True,
+    )
+    assert result.returncode == 0
+    assert result.stdout.splitlines() == [b"out", b"err"]
+
+
+def test_run_streams_prefixed_output(capsys):
+    runner.run(python("print('one'); print('two')"), prefix="task")
+    assert capsys.readouterr().out == "[task] one\n[task] two\n"
+
+
+def test_run_error():
+    with pytest.raises(subprocess.CalledProcessError) as exc:
+        runner.run(python("print('boom'); raise SystemExit(3)"), capture_output=True)
+    assert exc.value.returncode == 3
+    assert exc.value.output == b"boom\n"
+
+
+def test_run_timeout():
+    start = time.time()
+    with pytest.raises(subprocess.TimeoutExpired):
+        runner.run(python("import time; time.sleep(30)"), timeout=0.5)
+    assert time.time() - start < 10
+
+
+def test_run_many():
+    start = time.time()
+    results = runner.run_many(
+        [
+            ("a", python("import time; time.sleep(1)"), None),
+            ("b", python("import time; time.sleep(1)"), None),
+            ("c", python("raise SystemExit(1)"), None),
+        ]
+    )
+    # the sleeps overlap
+    assert time.time() - start < 1.9
+    assert results[0].returncode == 0
+    assert results[1].returncode == 0
+    assert isinstance(results[2], subprocess.CalledProcessError)
+
+
+def test_command_exists_is_cached(tmp_path):
+    log = tmp_path / "calls.log"
+    tool = tmp_path / "tool"
+    tool.write_text('#!/bin/sh\necho "$@" >> {}\n'.format(log))
+    os.chmod(tool, 0o755)
+
+    assert runner.command_exists("./tool", cwd=str(tmp_path))
+    assert runner.command_exists(str(tool))
+    assert log.read_text() == "-h\n"
+    assert not runner.command_exists("./missing", cwd=str(tmp_path))
+    assert not runner.command_exists("acutter-no-such-command")
+
+
+def test_run_long_lines(capsys):
+    code = "import sys; sys.stdout.write('x' * 200000 + '\\nend')"
+    result = runner.run(python(code), capture_output=True)
+    assert result.stdout == b"x" * 200000 + b"\nend"
+
+    runner.run(python(code), prefix="long")
+    assert capsys.readouterr().out == "[long] {}\n[long] end\n".format("x" * 200000)
+
+
+def test_bad_timeout(monkeypatch):
+    monkeypatch.setenv("ACUTTER_COMMAND_TIMEOUT", "soon")
+    with pytest.raises(Exception, match="ACUTTER_COMMAND_TIMEOUT"):
+        runner.run(python("pass"))
+    monkeypatch.setenv("ACUTTER_COMMAND_TIMEOUT", "2.5")
+    assert runner.default_timeout() == 2.5
+
+
+def alive(pid):
+    try:
+        with open("/proc/{}/stat".format(pid)) as fi:
+            # zombies (not reaped yet) are dead too
+            return fi.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="needs /proc")
+def test_timeout_kills_children(tmp_path):
+    pidfile = tmp_path / "pid"
+    code = (
+        "import subprocess, sys, time;"
+        "p = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)']);"
+        "open({!r}, 'w').write(str(p.pid));"
+        "time.sleep(60)"
+    ).format(str(pidfile))
+    with pytest.raises(subprocess.TimeoutExpired):
+        runner.run(python(code), timeout=2)
+
+    pid = int(pidfile.read_text())
+    deadline = time.time() + 5
+    while alive(pid) and time.time() < deadline:
+        time.sleep(0.05)
+    assert not alive(pid)
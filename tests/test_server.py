@@ -0,0 +1,141 @@
+import http.client
+import json
+import os
+import stat
+import threading
+
+import pytest
+
+from acutter import server
+
+ANSWERS = {
+    "run_virtualenv_install": "n",
+    "initial_commit": "n",
+    "setup_pre_commit": "n",
+}
+
+
+@pytest.fixture
+def address(tmp_path, monkeypatch):
+    monkeypatch.setenv("ACUTTER_CACHE_DIR", str(tmp_path / "cache"))
+    service = server.Service(jobs=2)
+    service.renderers.preload("python_package")
+    httpd = server.make_server(service, port=0)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.server_address[:2]
+    httpd.shutdown()
+    httpd.server_close()
+    service.shutdown()
+
+
+def request(address, method, path, data=None, content_type="application/json"):
+    connection = http.client.HTTPConnection(*address)
+    body = json.dumps(data) if data is not None else None
+    headers = {"Content-Type": content_type} if body is not None else {}
+    connection.request(method, path, body=body, headers=headers)
+    response = connection.getresponse()
+    return response.status, json.loads(response.read().decode("utf-8"))
+
+
+def test_render_and_update(address, tmp_path):
+    assert request(address, "GET", "/health") == (
+        200,
+        {"status": "ok", "templates": ["python_package"]},
+    )
+
+    folder = str(tmp_path / "served-project")
+    status, result = request(
+        address, "POST", "/render", {"folder": folder, "context": ANSWERS}
+    )
+    assert status == 200, result
+    assert result["project_dir"] == folder
+    assert os.path.exists(os.path.join(folder, "pyproject.toml"))
+
+    status, result = request(address, "POST", "/render", {"folder": folder})
+    assert status == 500
+    assert "already exists" in result["error"]
+
+    status, result = request(address, "POST", "/update", {"folder": folder})
+    assert status == 200, result
+    assert result["project_dir"] == folder
+
+    assert request(address, "POST", "/render", {"folder": "relative"})[0] == 400
+    assert request(address, "POST", "/unknown", {})[0] == 404
+
+
+def test_refused_requests(address, tmp_path):
+    folder = str(tmp_path / "refused")
+    # only preloaded templates, hooks of other templates would run
+    for template in ("other", str(tmp_path)):
+        status, result = request(
+            address, "POST", "/render", {"folder": folder, "template": template}
+        )
+        assert status == 400
+        assert "Unknown template" in result["error"]
+    # simple (cross-site) requests of browsers
+    status, _ = request(
+        address,
+        "POST",
+        "/render",
+        {"folder": folder},
+        content_type="application/x-www-form-urlencoded",
+    )
+    assert status == 415
+    assert not os.path.exists(folder)
+
+
+def test_preload_compiles(tmp_path, monkeypatch, mocker):
+    monkeypatch.setenv("ACUTTER_CACHE_DIR", str(tmp_path / "cache"))
+    pool = server.RendererPool()
+
+    pool.preload("python_package")
+
+    with pool.get("python_package") as renderer:
+        files = [x for x in renderer.iter_files() if not renderer.copied(x)]
+        assert len(renderer.env.cache) == len(files)
+        compile_ = mocker.spy(renderer.env, "_compile")
+        for relpath in files:
+            renderer.render(relpath)
+        assert compile_.call_count == 0
+
+
+def test_unix_socket(tmp_path):
+    service = server.Service(jobs=1)
+    path = str(tmp_path / "serve.sock")
+    httpd = server.make_server(service, socket_path=path)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    httpd.server_close()
+    # stale socket is replaced
+    httpd = server.make_server(service, socket_path=path)
+    httpd.server_close()
+    os.unlink(path)
+
+    other = tmp_path / "file"
+    other.write_text("data")
+    with pytest.raises(Exception, match="not a socket"):
+        server.make_server(service, socket_path=str(other))
+    assert other.read_text() == "data"
+    service.shutdown()
+
+
+def test_busy(tmp_path, monkeypatch):
+    service = server.Service(jobs=1, queued=0)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow(params):
+        started.set()
+        release.wait(5)
+        return {}
+
+    monkeypatch.setattr(service, "render", slow, raising=False)
+    thread = threading.Thread(target=service.submit, args=("render", {}))
+    thread.start()
+    started.wait(5)
+    with pytest.raises(server.Busy):
+        service.submit("render", {})
+    release.set()
+    thread.join()
+    assert service.submit("render", {}) == {}
+    service.shutdown()
@@ -0,0 +1,73 @@
+import hashlib
+import os
+import time
+
+import pytest
+
+from acutter import threeway
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("ACUTTER_CACHE_DIR", str(tmp_path))
+
+
+BASE = b"one\ntwo\nthree\nfour\nfive\n"
+
+
+def test_store_and_load():
+    assert threeway.load("abcd") is None
+    threeway.store("abcd", BASE)
+    assert threeway.load("abcd") == BASE
+    assert threeway.clear() == 1
+    assert threeway.load("abcd") is None
+
+
+def test_merge():
+    local = BASE.replace(b"one", b"ONE")
+    template = BASE.replace(b"five", b"FIVE")
+
+    assert threeway.merge(BASE, BASE, template) == (template, "updated")
+    assert threeway.merge(local, None, template) == (template, "updated")
+    assert threeway.merge(local, BASE, BASE) == (None, "kept")
+    assert threeway.merge(local, BASE, template) == (
+        b"ONE\ntwo\nthree\nfour\nFIVE\n",
+        "merged",
+    )
+
+    content, status = threeway.merge(local, BASE, BASE.replace(b"one", b"1"), "x")
+    assert status == "conflict"
+    assert (
+        b"<<<<<<< x (working tree)\nONE\n=======\n1\n>>>>>>> x (template)\n" in content
+    )
+
+    assert threeway.merge(b"\0local", b"\0base", b"\0new") == (None, "conflict")
+
+
+def test_apply_without_base():
+    local = BASE.replace(b"one", b"ONE")
+    template = BASE.replace(b"five", b"FIVE")
+    old = {"path": "x", "output": hashlib.sha256(BASE).hexdigest()}
+    entry = {"path": "x", "output": hashlib.sha256(template).hexdigest()}
+
+    # the base isn't stored: an unchanged file is updated, a changed one kept
+    assert threeway.apply("x", BASE, old, entry, template) == (template, "updated")
+    assert threeway.apply("x", local, old, entry, template) == (None, "unmerged")
+
+    threeway.store(old["output"], BASE)
+    assert threeway.apply("x", local, old, entry, template) == (
+        b"ONE\ntwo\nthree\nfour\nFIVE\n",
+        "merged",
+    )
+
+
+def test_prune():
+    threeway.store("old", b"old\n")
+    threeway.store("new", b"new\n")
+    long_ago = time.time() - threeway.RENDERS_MAX_AGE - 60
+    os.utime(threeway.blob_path("old"), (long_ago, long_ago))
+
+    assert threeway.stats() == (2, 8, 1)
+    assert threeway.prune() == 1
+    assert threeway.load("old") is None
+    assert threeway.load("new") == b"new\n"
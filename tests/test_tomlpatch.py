@@ -0,0 +1,131 @@
+import pytest
+import toml
+
+from acutter.tomlpatch import PatchError, patch_arrays, scan
+
+DOCUMENT = """# top comment
+[project]
+name = "demo"  # trailing comment
+dependencies = [
+    'click==8.0.3',
+    "lvtn_utils",  # pinned below
+    # 'package @ git+https://github.com/org/pkg@[v1.1]#egg=pkg',
+]
+
+[project.optional-dependencies]
+dev = ['pytest==6.2.5', "black]==22.3.0"]
+
+[tool.acutter]
+template="python_package"
+
+[xsetup.entry_points]
+console_scripts = [
+    "demo=demo.cli:cli",
+]
+"""
+
+
+def test_scan():
+    values, tables = scan(DOCUMENT)
+
+    start, end = values[("project", "optional-dependencies", "dev")]
+    assert DOCUMENT[start:end] == "['pytest==6.2.5', \"black]==22.3.0\"]"
+    assert DOCUMENT[slice(*values[("project", "name")])] == '"demo"'
+    assert ("xsetup", "entry_points") in tables
+
+
+def test_patch_arrays_preserves_the_rest():
+    out = patch_arrays(
+        DOCUMENT,
+        {
+            ("project", "dependencies"): ["click==8.0.3", "requests"],
+            ("project", "optional-dependencies", "dev"): ["pytest==6.2.5"],
+            ("project", "optional-dependencies", "test"): ["hypothesis"],
+        },
+    )
+
+    data = toml.loads(out)
+    assert data["project"]["dependencies"] == ["click==8.0.3", "requests"]
+    assert data["project"]["optional-dependencies"] == {
+        "dev": ["pytest==6.2.5"],
+        "test": ["hypothesis"],
+    }
+    assert out.startswith('# top comment\n[project]\nname = "demo"  # trailing')
+    assert (
+        "    'click==8.0.3',\n    'requests',\n"
+        "    # 'package @ git+https://github.com/org/pkg@[v1.1]#egg=pkg',\n]" in out
+    )
+    assert "dev = ['pytest==6.2.5']\ntest = [" in out
+    assert out.endswith(DOCUMENT[DOCUMENT.index("\n[tool.acutter]") :])
+
+
+def test_patch_arrays_keeps_comments_with_their_elements():
+    text = """[project]
+name = "demo"  # trailing comment
+dependencies = [
+    # web
+    "flask",  # pinned below
+    "werkzeug==2.0.3",
+    # removed
+    "six",
+    # last
+]
+"""
+
+    out = patch_arrays(
+        text,
+        {
+            ("project", "dependencies"): ["werkzeug==2.0.3", "flask", "requests"],
+            ("project", "urls"): ["x"],
+        },
+    )
+
+    assert out == (
+        """[project]
+name = "demo"  # trailing comment
+dependencies = [
+    "werkzeug==2.0.3",
+    # web
+    "flask",  # pinned below
+    "requests",
+    # removed
+    # last
+]
+urls = [
+    "x",
+]
+"""
+    )
+
+    out = patch_arrays('[project]\nname = "demo"  # trailing\n', {("project", "y"): []})
+
+    assert out == '[project]\nname = "demo"  # trailing\ny = [\n]\n'
+
+
+def test_patch_arrays_missing_table():
+    with pytest.raises(PatchError):
+        patch_arrays(DOCUMENT, {("xsetup", "console_scripts"): ["a=b:c"]})
+
+
+def test_scan_quoted_keys():
+    text = '[project]\n"a=b" = ["x"]\n[tool."x]y"]\nk = 1\n'
+
+    values, tables = scan(text)
+
+    assert text[slice(*values[("project", "a=b")])] == '["x"]'
+    assert text[slice(*values[("tool", "x]y", "k")])] == "1"
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        # valid TOML, but the escape is unknown to json
+        '"\\U0001F600" = ["x"]\n',
+        "a b = 1\n",
+        "key =\n",
+        "[table\n",
+    ],
+)
+def test_scan_errors(text):
+    with pytest.raises(PatchError):
+        scan(text)
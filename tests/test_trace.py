@@ -0,0 +1,75 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from click.testing import CliRunner
+from cookiecutter.main import cookiecutter
+
+from acutter import cli, trace
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("ACUTTER_CACHE_DIR", str(tmp_path / "cache"))
+
+
+def test_disabled():
+    with trace.span("nothing", "render") as info:
+        info["files"] = 1
+    assert trace._recorder is None
+
+
+def test_spans_and_commands(tmp_path, capsys):
+    recorder = trace.enable()
+    with trace.span("render", "render"):
+        cli.run_cmd([sys.executable, "-c", "pass"])
+    with pytest.raises(subprocess.CalledProcessError):
+        cli.run_cmd(["git", "--no-such-option"], capture_output=True)
+    # spans of child processes end up in the timeline too
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "from acutter import trace\n"
+            "with trace.span('child', 'hook'):\n"
+            "    pass",
+        ],
+        check=True,
+    )
+
+    events = trace.finish(recorder, "acutter test", str(tmp_path / "trace.json"))
+
+    names = {x["name"]: x for x in events}
+    assert names["render"]["cat"] == "render"
+    assert names[sys.executable + " -c pass"]["args"]["exit_status"] == 0
+    assert names["git --no-such-option"]["cat"] == "git"
+    assert names["git --no-such-option"]["args"]["exit_status"] == 129
+    assert names["child"]["pid"] != names["render"]["pid"]
+    assert names["acutter test"]["cat"] == "command"
+
+    with open(str(tmp_path / "trace.json")) as fi:
+        assert json.load(fi)["traceEvents"] == events
+    output = capsys.readouterr().out
+    assert "Slowest commands:" in output
+    assert "[exit 129]  git --no-such-option" in output
+    assert trace.EVENTS_ENV not in os.environ
+
+
+def test_update_trace(tmp_path):
+    project = cookiecutter(
+        cli.get_templatedir("python_package"),
+        no_input=True,
+        extra_context={"project_name": "traced-project"},
+        output_dir=str(tmp_path),
+    )
+    tracefile = str(tmp_path / "trace.json")
+
+    result = CliRunner().invoke(cli.cli, ["--trace", tracefile, "update", project])
+
+    assert result.exit_code == 0, result.output
+    assert "Timings (total" in result.output
+    with open(tracefile) as fi:
+        categories = set(x["cat"] for x in json.load(fi)["traceEvents"])
+    assert {"command", "render", "hook", "merge"} <= categories
@@ -0,0 +1,102 @@
+import os
+import time
+
+from acutter import venvcache
+
+
+def make_venv(path):
+    os.makedirs(os.path.join(path, "bin"))
+    os.makedirs(os.path.join(path, "lib", "site-packages"))
+    with open(os.path.join(path, "bin", "activate"), "w") as fo:
+        fo.write('VIRTUAL_ENV="{}"\n'.format(path))
+    with open(os.path.join(path, "lib", "site-packages", "module.py"), "w") as fo:
+        fo.write("x = 1\n")
+    os.symlink("/usr/bin/python3", os.path.join(path, "bin", "python"))
+
+
+def test_dependency_set(tmp_path):
+    (tmp_path / "pyproject.toml").write_text(
+        "[project]\n"
+        'dependencies = ["click==8.0.3"]\n'
+        "[project.optional-dependencies]\n"
+        'dev = ["pytest==6.2.5", "click==8.0.3"]\n'
+        'docs = ["Sphinx==4.3.1"]\n'
+        'extra = ["requests"]\n'
+    )
+
+    # only the extras that get installed (venvcache.EXTRAS)
+    deps = venvcache.dependency_set(str(tmp_path))
+
+    assert deps == ["Sphinx==4.3.1", "click==8.0.3", "pytest==6.2.5"]
+    assert venvcache.editable_target() == ".[dev,docs]"
+    assert venvcache.environment_key(deps) == venvcache.environment_key(list(deps))
+    assert venvcache.environment_key(deps) != venvcache.environment_key(deps[1:])
+
+
+def test_publish_and_clone(tmp_path, monkeypatch):
+    monkeypatch.setenv("ACUTTER_CACHE_DIR", str(tmp_path / "cache"))
+    first = str(tmp_path / "first" / ".venv")
+    second = str(tmp_path / "second" / ".venv")
+    make_venv(first)
+
+    assert venvcache.lookup("abc") is None
+    snapshot = venvcache.publish(first, "abc", ["click==8.0.3"])
+    assert venvcache.lookup("abc") == snapshot
+    assert venvcache.list_snapshots() == ["abc"]
+
+    venvcache.clone(snapshot, second)
+
+    with open(os.path.join(second, "bin", "activate")) as fi:
+        assert fi.read() == 'VIRTUAL_ENV="{}"\n'.format(second)
+    with open(os.path.join(snapshot, "bin", "activate")) as fi:
+        assert fi.read() == 'VIRTUAL_ENV="{}"\n'.format(first)
+    assert os.readlink(os.path.join(second, "bin", "python")) == "/usr/bin/python3"
+    # the snapshot is a copy of the venv, clones are copies of the snapshot
+    module = os.path.join("lib", "site-packages", "module.py")
+    assert not os.path.samefile(
+        os.path.join(first, module), os.path.join(snapshot, module)
+    )
+    with open(os.path.join(second, module), "w") as fo:
+        fo.write("x = 2\n")
+    with open(os.path.join(snapshot, module)) as fi:
+        assert fi.read() == "x = 1\n"
+    assert not os.path.exists(os.path.join(second, venvcache.SNAPSHOT_INFO))
+
+    assert venvcache.clear() == 1
+    assert venvcache.lookup("abc") is None
+
+
+def test_clone_fixes_resolved_paths(tmp_path, monkeypatch):
+    monkeypatch.setenv("ACUTTER_CACHE_DIR", str(tmp_path / "cache"))
+    # e.g. /tmp -> /private/tmp on macOS
+    (tmp_path / "real").mkdir()
+    os.symlink(str(tmp_path / "real"), str(tmp_path / "link"))
+    first = str(tmp_path / "link" / ".venv")
+    make_venv(first)
+    with open(os.path.join(first, "bin", "tool"), "w") as fo:
+        fo.write("#!{}/bin/python\n".format(os.path.realpath(first)))
+
+    snapshot = venvcache.publish(first, "abc", [])
+    second = str(tmp_path / "second" / ".venv")
+    venvcache.clone(snapshot, second)
+
+    with open(os.path.join(second, "bin", "tool")) as fi:
+        assert fi.read() == "#!{}/bin/python\n".format(second)
+    with open(os.path.join(second, "bin", "activate")) as fi:
+        assert fi.read() == 'VIRTUAL_ENV="{}"\n'.format(second)
+
+
+def test_snapshot_expires(tmp_path, monkeypatch):
+    monkeypatch.setenv("ACUTTER_CACHE_DIR", str(tmp_path / "cache"))
+    first = str(tmp_path / "first" / ".venv")
+    make_venv(first)
+    snapshot = venvcache.publish(first, "abc", [])
+
+    long_ago = time.time() - venvcache.MAX_AGE - 60
+    os.utime(os.path.join(snapshot, venvcache.SNAPSHOT_INFO), (long_ago, long_ago))
+    assert venvcache.lookup("abc") is None
+    assert venvcache.list_snapshots() == ["abc"]
+
+    # built again: the expired snapshot is replaced
+    assert venvcache.publish(first, "abc", []) == snapshot
+    assert venvcache.lookup("abc") == snapshot
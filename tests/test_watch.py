@@ -0,0 +1,46 @@
+import os
+import threading
+import time
+
+from acutter import watch
+
+
+def test_snapshot_and_changes(tmp_path):
+    (tmp_path / "a.txt").write_text("a")
+    (tmp_path / ".hidden").mkdir()
+    (tmp_path / ".hidden" / "b.txt").write_text("b")
+    (tmp_path / "c.pyc").write_text("c")
+
+    old = watch.snapshot([str(tmp_path)])
+    assert list(old) == [str(tmp_path / "a.txt")]
+
+    (tmp_path / "a.txt").write_text("aa")
+    (tmp_path / "d.txt").write_text("d")
+    new = watch.snapshot([str(tmp_path)])
+    assert watch.changes(old, new) == {
+        str(tmp_path / "a.txt"),
+        str(tmp_path / "d.txt"),
+    }
+    os.remove(tmp_path / "d.txt")
+    assert watch.changes(new, watch.snapshot([str(tmp_path)])) == {
+        str(tmp_path / "d.txt")
+    }
+
+
+def test_watch(tmp_path):
+    (tmp_path / "a.txt").write_text("a")
+    events = watch.watch([str(tmp_path)], interval=0.05)
+
+    def edit():
+        time.sleep(0.2)
+        (tmp_path / "a.txt").write_text("changed")
+        (tmp_path / "b.txt").write_text("new")
+
+    thread = threading.Thread(target=edit)
+    thread.start()
+    changed = next(events)
+    thread.join()
+    # both writes are reported at once
+    if len(changed) == 1:
+        changed |= next(events)
+    assert changed == {str(tmp_path / "a.txt"), str(tmp_path / "b.txt")}